@@ -0,0 +1,435 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains a chunked binary container format for measurement data.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import json
+import os
+import shutil
+import struct
+import zlib
+import numpy as np
+
+from collections import OrderedDict
+
+
+def write_npy_header(fileobj, dtype, shape, header_size=128):
+    """ Write a .npy (format version 1.0) header of fixed size at the start of an open file.
+
+    The file position is moved to the end of the file afterwards, so data can be appended.
+
+    @param fileobj: binary file object opened for writing
+    @param dtype: numpy data type of the array
+    @param tuple shape: shape of the array
+    @param int header_size: total size of the header in bytes (multiple of 64)
+    """
+    shape_str = '({0},)'.format(shape[0]) if len(shape) == 1 else str(tuple(int(n) for n in shape))
+    header = "{{'descr': {0!r}, 'fortran_order': False, 'shape': {1}, }}".format(
+        np.dtype(dtype).str, shape_str)
+    header_length = header_size - 10
+    if len(header) + 1 > header_length:
+        raise ValueError('npy header of {0} bytes is too small for shape {1}.'
+                         ''.format(header_size, shape))
+    header = header.ljust(header_length - 1) + '\n'
+    fileobj.seek(0)
+    fileobj.write(b'\x93NUMPY\x01\x00')
+    fileobj.write(struct.pack('<H', header_length))
+    fileobj.write(header.encode('latin1'))
+    fileobj.seek(0, os.SEEK_END)
+    return
+
+
+def npy_header_size(dtype, shape):
+    """ Header size in bytes needed for an appendable .npy file with the given row shape.
+
+    Space for a first dimension of up to 15 digits is reserved.
+
+    @param dtype: numpy data type of the array
+    @param tuple shape: shape of the array, the first dimension is ignored
+
+    @return int: header size in bytes (multiple of 64)
+    """
+    longest_shape = (10 ** 15,) + tuple(shape[1:])
+    header = "{{'descr': {0!r}, 'fortran_order': False, 'shape': {1}, }}".format(
+        np.dtype(dtype).str, str(longest_shape))
+    return 64 * ((len(header) + 11) // 64 + 1)
+
+
+def _to_json(value):
+    """ Convert numpy types and other objects into something json can serialize. """
+    if isinstance(value, dict):
+        return OrderedDict((str(key), _to_json(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return [_to_json(item) for item in value]
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+class ContainerDataset:
+    """ A single dataset inside a DataContainer, appendable along its first axis.
+
+    Uncompressed datasets are stored as one .npy file and can be read as numpy.memmap.
+    Compressed datasets are stored in zlib compressed chunks of <chunk_rows> rows each. Reading a
+    slice only decompresses the chunks overlapping with it.
+    """
+
+    def __init__(self, container, name, directory, info):
+        """
+        @param DataContainer container: the container this dataset belongs to
+        @param str name: name of the dataset
+        @param str directory: directory holding the dataset files
+        @param dict info: dataset description as stored in the container index
+        """
+        self._container = container
+        self.name = name
+        self._directory = directory
+        self.dtype = np.dtype(info['dtype'])
+        self._row_shape = tuple(info['row_shape'])
+        self._rows = int(info['rows'])
+        self.compression = info['compression']
+        self.chunk_rows = int(info['chunk_rows'])
+        self.attrs = OrderedDict(info.get('attrs', dict()))
+        if self.compression is None and os.path.exists(self._npy_filename):
+            # the .npy header is updated on every append and is more reliable than the index
+            with open(self._npy_filename, 'rb') as file:
+                np.lib.format.read_magic(file)
+                self._rows = np.lib.format.read_array_header_1_0(file)[0][0]
+        # rows not yet written to disk (compressed datasets only)
+        self._pending = []
+        self._pending_rows = 0
+        # last decompressed chunk as (index, data) to speed up consecutive reads
+        self._chunk_cache = (None, None)
+
+    @property
+    def shape(self):
+        return (self._rows + self._pending_rows,) + self._row_shape
+
+    @property
+    def ndim(self):
+        return len(self._row_shape) + 1
+
+    def __len__(self):
+        return self.shape[0]
+
+    @property
+    def _npy_filename(self):
+        return os.path.join(self._directory, 'data.npy')
+
+    def _chunk_filename(self, index):
+        return os.path.join(self._directory, 'chunk_{0:08d}.z'.format(index))
+
+    def info(self):
+        """ Dataset description for the container index. """
+        info = OrderedDict()
+        info['dtype'] = self.dtype.str
+        info['row_shape'] = list(self._row_shape)
+        info['rows'] = self._rows
+        info['compression'] = self.compression
+        info['chunk_rows'] = self.chunk_rows
+        info['attrs'] = _to_json(self.attrs)
+        return info
+
+    def append(self, rows):
+        """ Append rows to the dataset.
+
+        @param rows: array-like with shape (n,) + row_shape or row_shape for a single row
+        """
+        self._container._check_writable()
+        rows = np.asarray(rows, dtype=self.dtype)
+        if rows.shape == self._row_shape:
+            rows = rows[np.newaxis]
+        if rows.shape[1:] != self._row_shape:
+            raise ValueError('Rows of shape {0} can not be appended to dataset "{1}" with rows of '
+                             'shape {2}.'.format(rows.shape[1:], self.name, self._row_shape))
+        if rows.shape[0] == 0:
+            return
+
+        if self.compression is None:
+            with open(self._npy_filename, 'r+b') as file:
+                file.seek(0, os.SEEK_END)
+                file.write(np.ascontiguousarray(rows).tobytes())
+                self._rows += rows.shape[0]
+                header_size = npy_header_size(self.dtype, self.shape)
+                write_npy_header(file, self.dtype, self.shape, header_size)
+            return
+
+        self._pending.append(rows)
+        self._pending_rows += rows.shape[0]
+        # write all chunks which are complete now
+        first_chunk_rows = self.chunk_rows - self._rows % self.chunk_rows
+        if self._pending_rows >= first_chunk_rows:
+            self.flush()
+        return
+
+    def flush(self):
+        """ Write pending rows of a compressed dataset to disk. The last chunk may be partial. """
+        if self._pending_rows == 0:
+            return
+        pending = np.concatenate(self._pending, axis=0)
+        self._pending = []
+        self._pending_rows = 0
+
+        # complete a partial last chunk first
+        offset = self._rows % self.chunk_rows
+        chunk_index = self._rows // self.chunk_rows
+        if offset > 0:
+            pending = np.concatenate((self._read_chunk(chunk_index), pending), axis=0)
+            self._rows -= offset
+        for start in range(0, pending.shape[0], self.chunk_rows):
+            chunk = np.ascontiguousarray(pending[start:start + self.chunk_rows])
+            with open(self._chunk_filename(chunk_index), 'wb') as file:
+                file.write(zlib.compress(chunk.tobytes(), 1))
+            self._rows += chunk.shape[0]
+            chunk_index += 1
+        self._chunk_cache = (None, None)
+        self._container._write_index()
+        return
+
+    def _read_chunk(self, index):
+        """ Decompress a single chunk of a compressed dataset. """
+        if self._chunk_cache[0] == index:
+            return self._chunk_cache[1]
+        with open(self._chunk_filename(index), 'rb') as file:
+            chunk = np.frombuffer(zlib.decompress(file.read()), dtype=self.dtype)
+        chunk = chunk.reshape((-1,) + self._row_shape)
+        self._chunk_cache = (index, chunk)
+        return chunk
+
+    def read(self, mmap=True):
+        """ Read the whole dataset.
+
+        @param bool mmap: return a read-only numpy.memmap for uncompressed datasets instead of
+                          loading the data into memory
+
+        @return numpy.ndarray: the dataset
+        """
+        return self[:] if not mmap or self.compression is not None else self._memmap()
+
+    def _memmap(self):
+        self.flush()
+        if self._rows == 0:
+            return np.empty((0,) + self._row_shape, dtype=self.dtype)
+        return np.load(self._npy_filename, mmap_mode='r')
+
+    def __getitem__(self, key):
+        """ Read part of the dataset with numpy indexing. Only the needed chunks are read. """
+        self.flush()
+        if self.compression is None:
+            return np.array(self._memmap()[key])
+
+        if not isinstance(key, tuple):
+            key = (key,)
+        row_key, other_key = key[0], key[1:]
+        if isinstance(row_key, slice):
+            start, stop, step = row_key.indices(self._rows)
+            row_indices = np.arange(start, stop, step)
+        else:
+            row_indices = np.arange(self._rows)[row_key]
+        scalar_row = np.ndim(row_indices) == 0
+        row_indices = np.atleast_1d(row_indices)
+
+        result = np.empty((row_indices.size,) + self._row_shape, dtype=self.dtype)
+        if row_indices.size > 0:
+            chunk_indices = row_indices // self.chunk_rows
+            for chunk_index in np.unique(chunk_indices):
+                mask = chunk_indices == chunk_index
+                chunk = self._read_chunk(int(chunk_index))
+                result[mask] = chunk[row_indices[mask] - chunk_index * self.chunk_rows]
+        if scalar_row:
+            result = result[0]
+        else:
+            # the rows are selected already, keep the first axis as it is
+            other_key = (slice(None),) + other_key
+        return result[other_key] if other_key else result
+
+
+class DataContainer:
+    """ Chunked binary container holding several named datasets plus metadata.
+
+    A container is a directory (by convention with the ending .qdc) with an index file
+    'container.json' that holds the container attributes (e.g. the parameter header of a
+    measurement) and a description and attributes of each dataset. Each dataset lives in its own
+    subdirectory, see ContainerDataset.
+
+    Datasets can be appended to along their first axis, so large measurements can be written row
+    by row while running. Reading is lazy: slicing a dataset only reads the needed parts and
+    uncompressed datasets can be opened as numpy.memmap.
+
+    Usage:
+        with DataContainer('scan.qdc', mode='w') as container:
+            container.attrs['parameters'] = {'Resolution': 100}
+            image = container.create_dataset('xy image', row_shape=(100,), compression=None)
+            for line in lines:
+                image.append(line)
+
+        container = DataContainer('scan.qdc')
+        image = container['xy image'].read()    # numpy.memmap
+    """
+    _index_filename = 'container.json'
+
+    def __init__(self, path, mode='r'):
+        """
+        @param str path: directory of the container
+        @param str mode: 'r' to read, 'w' to create (an existing container is replaced) and 'a' to
+                         open an existing container for writing or create a new one
+        """
+        if mode not in ('r', 'w', 'a'):
+            raise ValueError('Unknown DataContainer mode "{0}".'.format(mode))
+        self.path = path
+        self.mode = mode
+        self.attrs = OrderedDict()
+        self._datasets = OrderedDict()
+        self._dataset_dirs = OrderedDict()
+        self._closed = False
+
+        index_file = os.path.join(path, self._index_filename)
+        if mode == 'w' or (mode == 'a' and not os.path.exists(index_file)):
+            if os.path.exists(path):
+                shutil.rmtree(path)
+            os.makedirs(path)
+            self._write_index()
+        else:
+            with open(index_file, 'r') as file:
+                index = json.load(file, object_pairs_hook=OrderedDict)
+            self.attrs = index['attrs']
+            for name, info in index['datasets'].items():
+                directory = os.path.join(path, info['directory'])
+                self._dataset_dirs[name] = info['directory']
+                self._datasets[name] = ContainerDataset(self, name, directory, info)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __getitem__(self, name):
+        return self._datasets[name]
+
+    def __contains__(self, name):
+        return name in self._datasets
+
+    def keys(self):
+        return list(self._datasets)
+
+    def create_dataset(self, name, data=None, row_shape=None, dtype=None, compression='zlib',
+                       chunk_rows=None, attrs=None):
+        """ Create a new dataset.
+
+        @param str name: name of the dataset, can be any string
+        @param data: optional, initial content of the dataset (array-like)
+        @param tuple row_shape: shape of a single row, only needed if no data is given
+        @param dtype: data type, only needed if no data is given (default float64)
+        @param str compression: 'zlib' for compressed chunks or None for a memory-mappable dataset
+        @param int chunk_rows: number of rows per compressed chunk. Default is chosen to get
+                               chunks of about 1 MB.
+        @param dict attrs: optional, attributes of the dataset
+
+        @return ContainerDataset: the new dataset
+        """
+        self._check_writable()
+        if name in self._datasets:
+            raise KeyError('Dataset "{0}" already exists in container "{1}".'
+                           ''.format(name, self.path))
+        if compression not in ('zlib', None):
+            raise ValueError('Unknown compression "{0}".'.format(compression))
+        if data is not None:
+            data = np.asarray(data)
+            if data.ndim == 0:
+                data = data[np.newaxis]
+            row_shape = data.shape[1:]
+            dtype = data.dtype if dtype is None else dtype
+        dtype = np.dtype(np.float64 if dtype is None else dtype)
+        row_shape = tuple() if row_shape is None else tuple(int(n) for n in row_shape)
+        if chunk_rows is None:
+            row_bytes = max(1, int(np.prod(row_shape)) * dtype.itemsize)
+            chunk_rows = max(1, 2 ** 20 // row_bytes)
+
+        dirname = 'dataset_{0:d}'.format(len(self._datasets))
+        directory = os.path.join(self.path, dirname)
+        os.makedirs(directory)
+        info = {'dtype': dtype.str,
+                'row_shape': list(row_shape),
+                'rows': 0,
+                'compression': compression,
+                'chunk_rows': chunk_rows,
+                'attrs': attrs if attrs is not None else dict()}
+        dataset = ContainerDataset(self, name, directory, info)
+        if compression is None:
+            with open(dataset._npy_filename, 'wb') as file:
+                write_npy_header(file, dtype, dataset.shape, npy_header_size(dtype, dataset.shape))
+        self._datasets[name] = dataset
+        self._dataset_dirs[name] = dirname
+        if data is not None:
+            dataset.append(data)
+            dataset.flush()
+        self._write_index()
+        return dataset
+
+    def flush(self):
+        """ Write all pending rows and the index to disk. """
+        if self.mode == 'r' or self._closed:
+            return
+        for dataset in self._datasets.values():
+            dataset.flush()
+        self._write_index()
+        return
+
+    def close(self):
+        self.flush()
+        self._closed = True
+        return
+
+    def load(self, mmap=True):
+        """ Read all datasets.
+
+        @param bool mmap: return uncompressed datasets as read-only numpy.memmap
+
+        @return OrderedDict: dataset name: numpy.ndarray
+        """
+        return OrderedDict((name, dataset.read(mmap=mmap))
+                           for name, dataset in self._datasets.items())
+
+    def _check_writable(self):
+        if self.mode == 'r' or self._closed:
+            raise IOError('DataContainer "{0}" is not open for writing.'.format(self.path))
+
+    def _write_index(self):
+        if self.mode == 'r':
+            return
+        index = OrderedDict()
+        index['format'] = 'qudi data container'
+        index['version'] = 1
+        index['attrs'] = _to_json(self.attrs)
+        index['datasets'] = OrderedDict()
+        for name, dataset in self._datasets.items():
+            info = dataset.info()
+            info['directory'] = self._dataset_dirs[name]
+            index['datasets'][name] = info
+        # write to a temporary file first to never leave a broken index behind
+        index_file = os.path.join(self.path, self._index_filename)
+        with open(index_file + '.tmp', 'w') as file:
+            json.dump(index, file, indent=1)
+        os.replace(index_file + '.tmp', index_file)
+        return
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains a preallocated circular buffer for multi-channel traces.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import numpy as np
+
+
+class RingBuffer:
+    """ Preallocated circular buffer holding the last <length> samples of several channels.
+
+    Every sample is written twice, at the write index and at write index + length, into an array
+    of twice the requested length. This way the samples ordered from oldest to newest always form
+    a contiguous slice of the storage and can be handed out as a numpy view without copying or
+    rolling any data.
+
+    The buffer is meant to be written by a single thread (e.g. the logic thread) while other
+    threads (e.g. the GUI) only read views of it. The write index is only advanced after both
+    copies of a sample have been written, so no lock is needed for this usage pattern.
+    Views always point to the buffer memory and will therefore change when new samples arrive.
+    Copy them if a persistent snapshot is needed.
+    """
+
+    def __init__(self, channels, length, dtype=np.float64):
+        """
+        @param int channels: number of channels (rows) in the buffer
+        @param int length: number of samples per channel held in the buffer
+        @param dtype: numpy data type of the samples
+        """
+        if channels < 1 or length < 1:
+            raise ValueError('RingBuffer needs at least one channel and a length > 0.')
+        self._channels = int(channels)
+        self._length = int(length)
+        self._buffer = np.zeros((self._channels, 2 * self._length), dtype=dtype)
+        # index of the next sample to write
+        self._index = 0
+        # number of samples written since the last clear (saturates at length)
+        self._filled = 0
+
+    @property
+    def channels(self):
+        return self._channels
+
+    @property
+    def length(self):
+        return self._length
+
+    @property
+    def dtype(self):
+        return self._buffer.dtype
+
+    @property
+    def write_index(self):
+        """ Position in the circular buffer the next sample will be written to. """
+        return self._index
+
+    @property
+    def filled(self):
+        """ Number of valid samples in the buffer (at most length). """
+        return self._filled
+
+    def clear(self):
+        """ Reset all samples to zero and rewind the write index. """
+        self._buffer[:] = 0
+        self._index = 0
+        self._filled = 0
+        return
+
+    def append(self, values):
+        """ Append a single sample to each channel.
+
+        @param values: scalar or 1D array-like with one value per channel
+        """
+        index = self._index
+        self._buffer[:, index] = values
+        self._buffer[:, index + self._length] = values
+        self._index = (index + 1) % self._length
+        self._filled = min(self._filled + 1, self._length)
+        return
+
+    def extend(self, values):
+        """ Append several samples to each channel.
+
+        @param values: 2D array-like with shape (channels, n) or 1D array-like of length n, which
+                       will be written to all channels.
+        """
+        values = np.asarray(values)
+        number_of_samples = values.shape[-1]
+        if number_of_samples == 0:
+            return
+        if number_of_samples >= self._length:
+            # Only the newest <length> samples survive. Write them in order starting at index 0.
+            values = values[..., -self._length:]
+            self._buffer[:, :self._length] = values
+            self._buffer[:, self._length:] = values
+            self._index = 0
+            self._filled = self._length
+            return
+
+        index = self._index
+        stop = index + number_of_samples
+        if stop <= self._length:
+            self._buffer[:, index:stop] = values
+            self._buffer[:, index + self._length:stop + self._length] = values
+        else:
+            # wrap around: first part at the end of the lower half, rest at the beginning
+            first = self._length - index
+            self._buffer[:, index:self._length] = values[..., :first]
+            self._buffer[:, index + self._length:] = values[..., :first]
+            self._buffer[:, :stop - self._length] = values[..., first:]
+            self._buffer[:, self._length:stop] = values[..., first:]
+        self._index = stop % self._length
+        self._filled = min(self._filled + number_of_samples, self._length)
+        return
+
+    def ordered_view(self):
+        """ Zero-copy view of all samples ordered from oldest to newest.
+
+        @return numpy.ndarray: view with shape (channels, length); the newest sample is at [:, -1]
+        """
+        return self._buffer[:, self._index:self._index + self._length]
+
+    def latest(self, number_of_samples):
+        """ Zero-copy view of the newest samples ordered from oldest to newest.
+
+        @param int number_of_samples: number of samples to return (clipped to length)
+
+        @return numpy.ndarray: view with shape (channels, number_of_samples)
+        """
+        number_of_samples = max(0, min(int(number_of_samples), self._length))
+        stop = self._index + self._length
+        return self._buffer[:, stop - number_of_samples:stop]
+
+    def set_latest(self, values, number_of_samples=1):
+        """ Overwrite the newest samples in place without advancing the write index.
+
+        @param values: scalar, 1D array-like with one value per channel or 2D array-like with shape
+                       (channels, number_of_samples)
+        @param int number_of_samples: number of newest samples to overwrite (clipped to length)
+        """
+        number_of_samples = max(0, min(int(number_of_samples), self._length))
+        if number_of_samples == 0:
+            return
+        values = np.asarray(values)
+        if values.ndim == 1:
+            values = values[:, np.newaxis]
+        # Write the upper copy first. The ordered view covers indices [index, index + length).
+        stop = self._index + self._length
+        start = stop - number_of_samples
+        self._buffer[:, start:stop] = values
+        # mirror into the lower half (the part of [start, stop) that has a twin in [0, length))
+        if start < self._length:
+            self._buffer[:, start + self._length:] = self._buffer[:, start:self._length]
+        if stop > self._length:
+            lower_start = max(start, self._length)
+            self._buffer[:, lower_start - self._length:stop - self._length] = \
+                self._buffer[:, lower_start:stop]
+        return
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains a recorder streaming rows of numeric data to an appendable .npy file.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import os
+import queue
+import threading
+import numpy as np
+
+from core.util.datacontainer import write_npy_header
+from core.util.ringbuffer import RingBuffer
+
+
+class StreamRecorder:
+    """ Records rows of a fixed number of columns into a .npy file on disk.
+
+    Rows are collected in preallocated chunks of <chunk_size> rows. Full chunks are handed to a
+    background writer thread which appends them to the file. At most <max_pending_chunks> chunks
+    can wait for the writer, so the memory needed for recording stays bounded no matter how long
+    the recording runs. If the disk can not keep up, append/extend block until a chunk is written.
+
+    The file is a regular numpy .npy file (format version 1.0) with a header of fixed size. The
+    header is updated with the number of written rows on flush and stop, so the file can be loaded
+    at any time with numpy.load(filename, mmap_mode='r') without reading it into RAM.
+
+    The most recent rows are also kept in a RingBuffer of <recent_length> rows to give fast access
+    to them without touching the disk.
+    """
+    # total size of magic string, version, header length field and header in bytes
+    _header_size = 128
+
+    def __init__(self, filename, columns, dtype=np.float64, chunk_size=4096, max_pending_chunks=16,
+                 recent_length=1000):
+        """
+        @param str filename: path of the .npy file to record to
+        @param int columns: number of columns per row
+        @param dtype: numpy data type of the recorded values
+        @param int chunk_size: number of rows written to disk at once
+        @param int max_pending_chunks: maximum number of full chunks waiting to be written
+        @param int recent_length: number of most recent rows available via get_recent
+        """
+        self.filename = filename
+        self._columns = int(columns)
+        self._dtype = np.dtype(dtype)
+        self._chunk_size = max(1, int(chunk_size))
+        self._queue = queue.Queue(maxsize=max(1, int(max_pending_chunks)))
+        self._recent = RingBuffer(self._columns, max(1, int(recent_length)), dtype=self._dtype)
+
+        # protects the current chunk and the writer thread handle, since rows may be recorded
+        # from one thread while another one flushes or stops the recording
+        self._chunk_lock = threading.RLock()
+        self._chunk = np.empty((self._chunk_size, self._columns), dtype=self._dtype)
+        self._chunk_fill = 0
+        # number of rows passed to the recorder and number of rows already on disk
+        self._rows_recorded = 0
+        self._rows_written = 0
+
+        self._file = None
+        self._file_lock = threading.Lock()
+        self._writer_thread = None
+        self._writer_error = None
+
+    @property
+    def columns(self):
+        return self._columns
+
+    @property
+    def is_recording(self):
+        return self._writer_thread is not None
+
+    def __len__(self):
+        return self._rows_recorded
+
+    def start(self, append=False):
+        """ Open the file and start the background writer thread.
+
+        @param bool append: if True and the file exists, new rows are appended to the rows already
+                            contained in the file. Otherwise the file is truncated.
+        """
+        if self.is_recording:
+            return
+        if append and os.path.exists(self.filename):
+            self._file = open(self.filename, 'r+b')
+            file_size = self._file.seek(0, os.SEEK_END)
+            row_size = self._columns * self._dtype.itemsize
+            self._rows_written = (file_size - self._header_size) // row_size
+            self._rows_recorded = self._rows_written
+        else:
+            self._file = open(self.filename, 'w+b')
+            self._rows_recorded = 0
+            self._rows_written = 0
+            self._recent.clear()
+            self._write_header()
+        self._writer_error = None
+        self._writer_thread = threading.Thread(target=self._writer_loop,
+                                               name='StreamRecorder writer',
+                                               daemon=True)
+        self._writer_thread.start()
+        return
+
+    def stop(self):
+        """ Write all pending rows, update the header and close the file.
+
+        Only the last partially filled chunk has to be written, so stopping is fast.
+        """
+        with self._chunk_lock:
+            if not self.is_recording:
+                return
+            self._queue_partial_chunk()
+            self._queue.put(None)
+            writer_thread = self._writer_thread
+            self._writer_thread = None
+        writer_thread.join()
+        with self._file_lock:
+            self._write_header()
+            self._file.close()
+            self._file = None
+        return
+
+    def append(self, row):
+        """ Record a single row.
+
+        @param row: 1D array-like with <columns> entries
+        """
+        self.extend(np.asarray(row, dtype=self._dtype).reshape(1, self._columns))
+        return
+
+    def extend(self, rows):
+        """ Record several rows.
+
+        @param rows: 2D array-like with shape (n, columns)
+        """
+        rows = np.asarray(rows, dtype=self._dtype).reshape(-1, self._columns)
+        number_of_rows = rows.shape[0]
+        with self._chunk_lock:
+            if not self.is_recording:
+                raise RuntimeError(
+                    'StreamRecorder for "{0}" is not recording.'.format(self.filename))
+            if self._writer_error is not None:
+                raise IOError(
+                    'Writing to "{0}" failed: {1}'.format(self.filename, self._writer_error))
+            self._recent.extend(rows.T)
+            self._rows_recorded += number_of_rows
+
+            index = 0
+            while index < number_of_rows:
+                copy_rows = min(number_of_rows - index, self._chunk_size - self._chunk_fill)
+                self._chunk[self._chunk_fill:self._chunk_fill + copy_rows] = \
+                    rows[index:index + copy_rows]
+                self._chunk_fill += copy_rows
+                index += copy_rows
+                if self._chunk_fill == self._chunk_size:
+                    # hand over the full chunk and continue in a new one
+                    self._queue.put(self._chunk)
+                    self._chunk = np.empty((self._chunk_size, self._columns), dtype=self._dtype)
+                    self._chunk_fill = 0
+        return
+
+    def flush(self):
+        """ Block until all rows recorded so far are written to disk and the header is updated.
+        """
+        with self._chunk_lock:
+            if not self.is_recording:
+                return
+            self._queue_partial_chunk()
+        self._queue.join()
+        with self._file_lock:
+            if self._file is not None:
+                self._write_header()
+                self._file.flush()
+        return
+
+    def get_recent(self, number_of_rows):
+        """ Return a copy of the most recent rows (at most recent_length).
+
+        @param int number_of_rows: number of rows requested
+
+        @return numpy.ndarray: array with shape (n, columns) ordered from oldest to newest
+        """
+        with self._chunk_lock:
+            number_of_rows = min(int(number_of_rows), self._rows_recorded, self._recent.length)
+            return self._recent.latest(number_of_rows).T.copy()
+
+    def get_data(self):
+        """ Return all recorded rows as read-only memory-mapped array.
+
+        Flushes pending rows to disk first if the recording is running.
+
+        @return numpy.ndarray: array with shape (rows, columns)
+        """
+        self.flush()
+        if self._rows_written == 0:
+            return np.empty((0, self._columns), dtype=self._dtype)
+        return np.memmap(self.filename, dtype=self._dtype, mode='r', offset=self._header_size,
+                         shape=(self._rows_written, self._columns))
+
+    def _writer_loop(self):
+        while True:
+            chunk = self._queue.get()
+            try:
+                if chunk is None:
+                    return
+                if self._writer_error is None:
+                    with self._file_lock:
+                        self._file.write(chunk.tobytes())
+                    self._rows_written += chunk.shape[0]
+            except Exception as e:
+                self._writer_error = e
+            finally:
+                self._queue.task_done()
+
+    def _queue_partial_chunk(self):
+        """ Hand the partially filled chunk over to the writer. Call with _chunk_lock held.
+        """
+        if self._chunk_fill > 0:
+            self._queue.put(self._chunk[:self._chunk_fill].copy())
+            self._chunk_fill = 0
+        return
+
+    def _write_header(self):
+        """ Write the .npy header for the rows written so far and return to the end of the file.
+        """
+        write_npy_header(self._file, self._dtype, (self._rows_written, self._columns),
+                         self._header_size)
+        return
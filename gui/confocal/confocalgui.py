@@ -510,6 +510,11 @@ class ConfocalGui(GUIBase):
         self.adjust_cursor_roi = True
         self.xy_image.getViewBox().sigRangeChanged.connect(self.update_roi_xy_size)
         self.depth_image.getViewBox().sigRangeChanged.connect(self.update_roi_depth_size)
+        # Show a finer overview of large images when zooming in
+        self._xy_overview_level = 0
+        self._depth_overview_level = 0
+        self.xy_image.getViewBox().sigRangeChanged.connect(self.update_xy_overview_level)
+        self.depth_image.getViewBox().sigRangeChanged.connect(self.update_depth_overview_level)
 
         #################################################################
         #                           Actions                             #
@@ -1547,46 +1552,113 @@ class ConfocalGui(GUIBase):
         self.refresh_depth_colorbar()
         self.refresh_depth_image()
 
-    def refresh_xy_image(self):
+    def refresh_xy_image(self, full_resolution=False):
         """ Update the current XY image from the logic.
 
         Everytime the scanner is scanning a line in xy the
         image is rebuild and updated in the GUI.
+
+        @param bool full_resolution: show all pixels instead of an overview of large images
         """
         self.xy_image.getViewBox().updateAutoRange()
 
-        xy_image_data = self._scanning_logic.xy_image[:, :, 3 + self.xy_channel]
+        # show the overview of the image which still has a pixel for each pixel of the view
+        image = self._scanning_logic.xy_image
+        level = 0 if full_resolution else self._overview_level(image, self.xy_image,
+                                                               self._mw.xy_ViewWidget)
+        self._xy_overview_level = level
+        xy_image_data = image.channel(self.xy_channel, level)
 
         cb_range = self.get_xy_cb_range()
 
         # Now update image with new color scale, and update colorbar
-        self.xy_image.setImage(image=xy_image_data, levels=(cb_range[0], cb_range[1]))
+        self._set_image_data(self.xy_image, xy_image_data, levels=(cb_range[0], cb_range[1]))
         self.refresh_xy_colorbar()
 
         # Unlock state widget if scan is finished
         if self._scanning_logic.module_state() != 'locked':
             self.enable_scan_actions()
 
-    def refresh_depth_image(self):
+    def refresh_depth_image(self, full_resolution=False):
         """ Update the current Depth image from the logic.
 
         Everytime the scanner is scanning a line in depth the
         image is rebuild and updated in the GUI.
+
+        @param bool full_resolution: show all pixels instead of an overview of large images
         """
 
         self.depth_image.getViewBox().enableAutoRange()
 
-        depth_image_data = self._scanning_logic.depth_image[:, :, 3 + self.depth_channel]
+        # show the overview of the image which still has a pixel for each pixel of the view
+        image = self._scanning_logic.depth_image
+        level = 0 if full_resolution else self._overview_level(image, self.depth_image,
+                                                               self._mw.depth_ViewWidget)
+        self._depth_overview_level = level
+        depth_image_data = image.channel(self.depth_channel, level)
         cb_range = self.get_depth_cb_range()
 
         # Now update image with new color scale, and update colorbar
-        self.depth_image.setImage(image=depth_image_data, levels=(cb_range[0], cb_range[1]))
+        self._set_image_data(self.depth_image, depth_image_data,
+                             levels=(cb_range[0], cb_range[1]))
         self.refresh_depth_colorbar()
 
         # Unlock state widget if scan is finished
         if self._scanning_logic.module_state() != 'locked':
             self.enable_scan_actions()
 
+    def _overview_level(self, image, image_item, view_widget):
+        """ Coarsest overview level of a tiled image which still has a pixel for each pixel of
+        the view in the visible part of the image.
+
+        @param TiledImage image: the image of the scanning logic
+        @param pg.ImageItem image_item: the item showing the image
+        @param QWidget view_widget: the widget showing the view of the image item
+
+        @return int: overview level of the image
+        """
+        if image_item.image is None:
+            return image.overview_level(view_widget.height(), view_widget.width())
+        # zooming in shows a part of the image on the whole widget and needs more pixels
+        view_rect = image_item.getViewBox().viewRect()
+        image_rect = image_item.mapRectToParent(image_item.boundingRect())
+        zoom = 1.0
+        if view_rect.width() > 0 and view_rect.height() > 0:
+            zoom = max(1.0,
+                       image_rect.width() / view_rect.width(),
+                       image_rect.height() / view_rect.height())
+        return image.overview_level(int(np.ceil(view_widget.height() * zoom)),
+                                    int(np.ceil(view_widget.width() * zoom)))
+
+    def update_xy_overview_level(self):
+        """ Show the xy image with a finer or coarser overview if the visible area changed. """
+        image = self._scanning_logic.xy_image
+        level = self._overview_level(image, self.xy_image, self._mw.xy_ViewWidget)
+        if level != self._xy_overview_level:
+            self._xy_overview_level = level
+            self._set_image_data(self.xy_image, image.channel(self.xy_channel, level),
+                                 levels=tuple(self.get_xy_cb_range()))
+
+    def update_depth_overview_level(self):
+        """ Show the depth image with a finer or coarser overview if the visible area changed. """
+        image = self._scanning_logic.depth_image
+        level = self._overview_level(image, self.depth_image, self._mw.depth_ViewWidget)
+        if level != self._depth_overview_level:
+            self._depth_overview_level = level
+            self._set_image_data(self.depth_image, image.channel(self.depth_channel, level),
+                                 levels=tuple(self.get_depth_cb_range()))
+
+    def _set_image_data(self, image_item, data, levels):
+        """ Show new data in an image item. If only the resolution of the overview changed, the
+        image keeps its position and size in the view.
+        """
+        if image_item.image is None or image_item.image.shape == data.shape:
+            image_item.setImage(image=data, levels=levels)
+            return
+        rect = image_item.mapRectToParent(image_item.boundingRect())
+        image_item.setImage(image=data, levels=levels)
+        image_item.setRect(rect)
+
     def refresh_refocus_image(self):
         """Refreshes the xy image, the crosshair and the colorbar. """
         ##########
@@ -1821,6 +1893,7 @@ class ConfocalGui(GUIBase):
             filepath,
             time.strftime('%Y%m%d-%H%M-%S_confocal_xy_scan_raw_pixel_image'))
         if self._sd.save_purePNG_checkBox.isChecked():
+            self.refresh_xy_image(full_resolution=True)
             self.xy_image.save(filename + '_raw.png')
 
     def save_xy_scan_image(self):
@@ -1851,6 +1924,7 @@ class ConfocalGui(GUIBase):
             filepath,
             time.strftime('%Y%m%d-%H%M-%S_confocal_depth_scan_raw_pixel_image'))
         if self._sd.save_purePNG_checkBox.isChecked():
+            self.refresh_depth_image(full_resolution=True)
             self.depth_image.save(filename + '_raw.png')
 
     def save_depth_scan_image(self):
@@ -1174,12 +1174,12 @@ class AWG70K(Base, PulserInterface):
             self.log.error('Please specify an ensemble name for direct waveform creation.')
             return -1
 
-        if type(analog_samples).__name__ != 'ndarray':
+        if not isinstance(analog_samples, np.ndarray):
             self.log.warning('Analog samples for direct waveform creation have wrong data type.\n'
                              'Converting to numpy.ndarray of type float32.')
             analog_samples = np.array(analog_samples, dtype='float32')
 
-        if type(digital_samples).__name__ != 'ndarray':
+        if not isinstance(digital_samples, np.ndarray):
             self.log.warning('Digital samples for direct waveform creation have wrong data type.\n'
                              'Converting to numpy.ndarray of type bool.')
             digital_samples = np.array(digital_samples, dtype=bool)
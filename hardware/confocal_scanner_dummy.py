@@ -24,9 +24,10 @@ import time
 
 from core.module import Base, Connector, ConfigOption
 from interface.confocal_scanner_interface import ConfocalScannerInterface
+from interface.confocal_frame_scanner_interface import ConfocalFrameScannerInterface
 
 
-class ConfocalScannerDummy(Base, ConfocalScannerInterface):
+class ConfocalScannerDummy(Base, ConfocalScannerInterface, ConfocalFrameScannerInterface):
 
     """ Dummy confocal scanner.
         Produces a picture with several gaussian spots.
@@ -51,6 +52,12 @@ class ConfocalScannerDummy(Base, ConfocalScannerInterface):
         self._current_position = [0, 0, 0, 0][0:len(self.get_scanner_axes())]
         self._num_points = 500
 
+        # frame scan
+        self._frame_path = None
+        self._frame_pixels = 0
+        self._frame_start_time = None
+        self._frame_line_index = 0
+
     def on_activate(self):
         """ Initialisation performed during activation of the module.
         """
@@ -310,16 +317,7 @@ class ConfocalScannerDummy(Base, ConfocalScannerInterface):
         if np.shape(line_path)[1] != self._line_length:
             self._set_up_line(np.shape(line_path)[1])
 
-        count_data = np.random.uniform(0, 2e4, self._line_length)
-        z_data = line_path[2, :]
-
-        #TODO: Change the gaussian function here to the one from fitlogic and delete the local modules to calculate
-        #the gaussian functions
-        x_data = np.array(line_path[0, :])
-        y_data = np.array(line_path[1, :])
-        for i in range(self._num_points):
-            count_data += self.twoD_gaussian_function((x_data, y_data), *(self._points[i])
-                ) * self.gaussian_function(np.array(z_data), *(self._points_z[i]))
+        count_data = self._path_counts(line_path)
 
         time.sleep(self._line_length * 1. / self._clock_frequency)
         time.sleep(self._line_length * 1. / self._clock_frequency)
@@ -327,12 +325,104 @@ class ConfocalScannerDummy(Base, ConfocalScannerInterface):
         # update the scanner position instance variable
         self._current_position = list(line_path[:, -1])
 
+        return count_data
+
+    def _path_counts(self, path):
+        """ Counts of the dummy NVs along a path.
+
+        @param float[n][m] path: n axes with m points
+
+        @return float[m][3]: the photon counts per second
+        """
+        count_data = np.random.uniform(0, 2e4, np.shape(path)[1])
+        z_data = path[2, :]
+
+        #TODO: Change the gaussian function here to the one from fitlogic and delete the local modules to calculate
+        #the gaussian functions
+        x_data = np.array(path[0, :])
+        y_data = np.array(path[1, :])
+        for i in range(self._num_points):
+            count_data += self.twoD_gaussian_function((x_data, y_data), *(self._points[i])
+                ) * self.gaussian_function(np.array(z_data), *(self._points_z[i]))
+
         return np.array([
                 count_data,
                 5e5 - count_data,
-                np.ones(count_data.shape) * line_path[1, 0] * 100
+                np.ones(count_data.shape) * path[1, 0] * 100
             ]).transpose()
 
+    def supports_frame_scan(self):
+        """ Whether frames can be scanned with this scanner.
+
+        @return bool: always True
+        """
+        return True
+
+    def set_up_frame(self, frame_path, pixels):
+        """ Writes the path of a frame to the scanner.
+
+        @param float[k][n][m] frame_path: k lines with n axes and m points each, defining the
+                                          positions of the frame
+        @param int pixels: number of points at the start of each line which are pixels of the
+                           image. The remaining points of a line move the scanner to the start
+                           of the next line.
+
+        @return int: error code (0:OK, -1:error)
+        """
+        if np.ndim(frame_path) != 3:
+            self.log.error('Given frame path is no array of lines.')
+            return -1
+        if not 0 < pixels <= np.shape(frame_path)[2]:
+            self.log.error('A line of the frame path has less points than pixels.')
+            return -1
+        self._frame_path = np.array(frame_path)
+        self._frame_pixels = pixels
+        self._frame_start_time = None
+        return 0
+
+    def start_frame(self, pixel_clock=False):
+        """ Starts the scan of the frame written with set_up_frame.
+
+        @param bool pixel_clock: whether we need to output a pixel clock for the frame
+
+        @return int: error code (0:OK, -1:error)
+        """
+        if self._frame_path is None:
+            self.log.error('No frame set up, cannot start the frame scan.')
+            return -1
+        self._frame_line_index = 0
+        self._frame_start_time = time.time()
+        return 0
+
+    def get_frame_line(self):
+        """ Waits until the next line of the running frame is scanned and returns its counts.
+
+        @return float[k][3]: the photon counts per second of all k points of the line
+        """
+        if self._frame_start_time is None or self._frame_line_index >= len(self._frame_path):
+            self.log.error('No frame line to read, the frame scan is not running.')
+            return np.array([[-1.]])
+
+        line_path = self._frame_path[self._frame_line_index]
+        self._frame_line_index += 1
+        # the scanner runs through all lines of the frame without a break
+        line_end = (self._frame_start_time
+                    + self._frame_line_index * line_path.shape[1] / self._clock_frequency)
+        delay = line_end - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+        self._current_position = list(line_path[:, -1])
+        return self._path_counts(line_path)
+
+    def stop_frame(self):
+        """ Stops the scan of the frame, also before all lines are scanned.
+
+        @return int: error code (0:OK, -1:error)
+        """
+        self._frame_start_time = None
+        return 0
+
     def close_scanner(self):
         """ Closes the scanner and cleans up afterwards.
 
@@ -171,6 +171,12 @@ class FastComtec(Base, FastCounterInterface):
     trigger_safety = ConfigOption('trigger_safety', 200e-9, missing='warn')
     aom_delay = ConfigOption('aom_delay', 400e-9, missing='warn')
     minimal_binwidth = ConfigOption('minimal_binwidth', 0.2e-9, missing='warn')
+    # Read the time trace into buffers allocated once in configure() instead of allocating new
+    # arrays in every get_data_trace() call.
+    buffered_readout = ConfigOption('buffered_readout', False)
+    # With buffered_readout: return a read-only view of the trace buffer instead of a copy. The
+    # returned array is only valid until the second next call of get_data_trace().
+    read_only_trace = ConfigOption('read_only_trace', False)
 
     def __init__(self, config, **kwargs):
         super().__init__(config=config, **kwargs)
@@ -186,6 +192,12 @@ class FastComtec(Base, FastCounterInterface):
         self.stopped_or_halt = "stopped"
         self.timetrace_tmp = []
 
+        # readout buffers of buffered_readout, see _allocate_trace_buffers
+        self._readout_buffer = None
+        self._readout_pointer = None
+        self._trace_buffers = None
+        self._trace_buffer_index = 0
+
     def on_activate(self):
         """ Initialisation performed during activation of the module.
         """
@@ -277,6 +289,9 @@ class FastComtec(Base, FastCounterInterface):
         if filename is not None:
             self._change_filename(filename)
 
+        if self.buffered_readout:
+            self._allocate_trace_buffers()
+
         return (self.get_binwidth(), record_length_FastComTech_s, number_of_gates)
 
     #card if running or halt or stopped ...
@@ -327,7 +342,7 @@ class FastComtec(Base, FastCounterInterface):
             time.sleep(0.05)
 
         if self.gated:
-            self.timetrace_tmp = self.get_data_trace()
+            self.timetrace_tmp = self.get_data_trace().copy()
         return status
 
     def stop_measure(self):
@@ -389,6 +404,26 @@ class FastComtec(Base, FastCounterInterface):
 
           @return arrray: Time trace.
         """
+        if self.buffered_readout:
+            return self._get_buffered_data_trace()
+
+        data = np.empty(self._get_trace_shape(), dtype=np.uint32)
+
+        p_type_ulong = ctypes.POINTER(ctypes.c_uint32)
+        ptr = data.ctypes.data_as(p_type_ulong)
+        self.dll.LVGetDat(ptr, 0)
+        time_trace = np.int64(data)
+
+        if self.gated and len(self.timetrace_tmp) > 0:
+            time_trace = time_trace + self.timetrace_tmp
+
+        return time_trace
+
+    def _get_trace_shape(self):
+        """ Read the shape of the time trace from the card settings.
+
+        @return tuple: (number_of_bins,) or, if gated, (number_of_gates, number_of_bins)
+        """
         setting = AcqSettings()
         self.dll.GetSettingData(ctypes.byref(setting), 0)
         N = setting.range
@@ -397,20 +432,44 @@ class FastComtec(Base, FastCounterInterface):
             bsetting=BOARDSETTING()
             self.dll.GetMCSSetting(ctypes.byref(bsetting), 0)
             H = bsetting.cycles
-            data = np.empty((H, int(N / H)), dtype=np.uint32)
+            return H, int(N / H)
+        return N,
 
-        else:
-            data = np.empty((N,), dtype=np.uint32)
+    def _allocate_trace_buffers(self):
+        """ Allocate the buffers of the buffered readout for the current card settings.
 
-        p_type_ulong = ctypes.POINTER(ctypes.c_uint32)
-        ptr = data.ctypes.data_as(p_type_ulong)
-        self.dll.LVGetDat(ptr, 0)
-        time_trace = np.int64(data)
+        The card writes into a uint32 buffer, which is widened in place into one of two int64
+        trace buffers used alternately. So a returned read-only view stays valid while the
+        next trace is read.
+        """
+        shape = self._get_trace_shape()
+        self._readout_buffer = np.zeros(shape, dtype=np.uint32)
+        self._readout_pointer = self._readout_buffer.ctypes.data_as(ctypes.POINTER(ctypes.c_uint32))
+        self._trace_buffers = [np.zeros(shape, dtype='int64'), np.zeros(shape, dtype='int64')]
+        self._trace_buffer_index = 0
+        return
 
-        if self.gated and self.timetrace_tmp != []:
-            time_trace = time_trace + self.timetrace_tmp
+    def _get_buffered_data_trace(self):
+        """ get_data_trace() reading into the preallocated buffers.
 
-        return time_trace
+          @return arrray: Time trace. A read-only view of the trace buffer if read_only_trace
+                          is set, else a copy.
+        """
+        if self._trace_buffers is None:
+            self._allocate_trace_buffers()
+        self.dll.LVGetDat(self._readout_pointer, 0)
+
+        self._trace_buffer_index = 1 - self._trace_buffer_index
+        time_trace = self._trace_buffers[self._trace_buffer_index]
+        np.copyto(time_trace, self._readout_buffer)
+        if self.gated and len(self.timetrace_tmp) > 0:
+            time_trace += self.timetrace_tmp
+
+        if self.read_only_trace:
+            time_trace = time_trace.view()
+            time_trace.flags.writeable = False
+            return time_trace
+        return time_trace.copy()
 
 
 
@@ -467,6 +526,7 @@ class FastComtec(Base, FastCounterInterface):
 
         @return float: Red out length of measurement
         """
+        self._trace_buffers = None
         constraints = self.get_constraints()
         if length_bins * self.get_binwidth() < constraints['max_sweep_len']:
             cmd = 'RANGE={0}'.format(int(length_bins))
@@ -521,6 +581,7 @@ class FastComtec(Base, FastCounterInterface):
 
         @return int mode: current cycles
         """
+        self._trace_buffers = None
         cmd = 'cycles={0}'.format(cycles)
         self.dll.RunCmd(0, bytes(cmd, 'ascii'))
         return cycles
@@ -541,6 +602,7 @@ class FastComtec(Base, FastCounterInterface):
         return name
 
     def change_sweep_mode(self, gated):
+        self._trace_buffers = None
         if gated:
             cmd = 'sweepmode={0}'.format(hex(1978500))
             self.dll.RunCmd(0, bytes(cmd, 'ascii'))
@@ -31,9 +31,11 @@ from interface.slow_counter_interface import SlowCounterConstraints
 from interface.slow_counter_interface import CountingMode
 from interface.odmr_counter_interface import ODMRCounterInterface
 from interface.confocal_scanner_interface import ConfocalScannerInterface
+from interface.confocal_frame_scanner_interface import ConfocalFrameScannerInterface
 
 
-class NationalInstrumentsXSeries(Base, SlowCounterInterface, ConfocalScannerInterface, ODMRCounterInterface):
+class NationalInstrumentsXSeries(Base, SlowCounterInterface, ConfocalScannerInterface,
+                                ConfocalFrameScannerInterface, ODMRCounterInterface):
     """ stable: Kay Jahnke, Alexander Stark
 
     A National Instruments device that can count and control microvave generators.
@@ -92,6 +94,11 @@ class NationalInstrumentsXSeries(Base, SlowCounterInterface, ConfocalScannerInte
         self._odmr_length = None
         self._gated_counter_daq_task = None
         self._scanner_analog_daq_task = None
+        # frame scan
+        self._frame_path = None
+        self._frame_pixels = 0
+        self._frame_line_index = 0
+        self._frame_pixel_clock = False
 
         # handle all the parameters given by the config
         self._current_position = np.zeros(len(self._scanner_ao_channels))
@@ -1367,6 +1374,186 @@ class NationalInstrumentsXSeries(Base, SlowCounterInterface, ConfocalScannerInte
         # return values is a rate of counts/s
         return all_data.transpose()
 
+    def supports_frame_scan(self):
+        """ Whether frames can be scanned with this scanner.
+
+        @return bool: always True
+        """
+        return True
+
+    def set_up_frame(self, frame_path, pixels):
+        """ Writes the path of a frame to the analog output buffer.
+
+        @param float[k][n][m] frame_path: k lines with n axes and m points each, defining the
+                                          positions of the frame
+        @param int pixels: number of points at the start of each line which are pixels of the
+                           image. The remaining points of a line move the scanner to the start
+                           of the next line.
+
+        @return int: error code (0:OK, -1:error)
+
+        The whole frame is set up like one long line (see _set_up_line), so the scanner runs
+        through all lines without a break. The counts are read line by line with get_frame_line.
+        """
+        if len(self._scanner_counter_channels) > 0 and len(self._scanner_counter_daq_tasks) < 1:
+            self.log.error('Configured counter is not running, cannot scan a frame.')
+            return -1
+
+        if np.ndim(frame_path) != 3:
+            self.log.error('Given frame path is no array of lines.')
+            return -1
+
+        lines, axes, points = np.shape(frame_path)
+        if not 0 < pixels <= points:
+            self.log.error('A line of the frame path has less points than pixels.')
+            return -1
+        try:
+            daq.DAQmxSetSampTimingType(self._scanner_ao_task, daq.DAQmx_Val_SampClk)
+            if self._set_up_line(lines * points) < 0:
+                return -1
+            # all axes of all lines in one row per axis
+            frame_volts = self._scanner_position_to_volt(
+                np.transpose(frame_path, (1, 0, 2)).reshape(axes, lines * points))
+            if np.any(np.isnan(frame_volts)):
+                return -1
+            self._write_scanner_ao(voltages=frame_volts, length=self._line_length, start=False)
+        except:
+            self.log.exception('Error while setting up scanner to scan a frame.')
+            return -1
+
+        self._frame_path = np.array(frame_path)
+        self._frame_pixels = pixels
+        self._frame_line_index = 0
+        return 0
+
+    def start_frame(self, pixel_clock=False):
+        """ Starts the scan of the frame written with set_up_frame.
+
+        @param bool pixel_clock: whether we need to output a pixel clock for the frame
+
+        @return int: error code (0:OK, -1:error)
+        """
+        try:
+            # start the timed analog output task
+            daq.DAQmxStartTask(self._scanner_ao_task)
+
+            for i, task in enumerate(self._scanner_counter_daq_tasks):
+                daq.DAQmxStopTask(task)
+                # read the counts of each line relative to the start of the frame
+                daq.DAQmxSetReadRelativeTo(task, daq.DAQmx_Val_FirstSample)
+
+            daq.DAQmxStopTask(self._scanner_clock_daq_task)
+
+            self._frame_pixel_clock = pixel_clock and self._pixel_clock_channel is not None
+            if self._frame_pixel_clock:
+                daq.DAQmxConnectTerms(
+                    self._scanner_clock_channel + 'InternalOutput',
+                    self._pixel_clock_channel,
+                    daq.DAQmx_Val_DoNotInvertPolarity)
+
+            # start the scanner counting task that acquires counts synchroneously
+            for i, task in enumerate(self._scanner_counter_daq_tasks):
+                daq.DAQmxStartTask(task)
+
+            if len(self._scanner_ai_channels) > 0:
+                daq.DAQmxStartTask(self._scanner_analog_daq_task)
+
+            daq.DAQmxStartTask(self._scanner_clock_daq_task)
+        except:
+            self.log.exception('Error while starting the frame scan.')
+            return -1
+        self._frame_line_index = 0
+        return 0
+
+    def get_frame_line(self):
+        """ Waits until the next line of the running frame is scanned and returns its counts.
+
+        @return float[k][m]: the photon counts per second of all k points of the line for m
+                             channels, [[-1.]] on error
+        """
+        if self._frame_path is None or self._frame_line_index >= len(self._frame_path):
+            self.log.error('No frame line to read, the frame scan is not running.')
+            return np.array([[-1.]])
+
+        line_path = self._frame_path[self._frame_line_index]
+        points = line_path.shape[1]
+        # wait at most for the line itself and the usual timeout
+        timeout = self._RWTimeout + points / self._scanner_clock_frequency
+        try:
+            # the counters count twice per pixel, the first sample of the frame is not used
+            line_counts = np.empty(
+                (len(self._scanner_counter_daq_tasks), 2 * points), dtype=np.uint32)
+            n_read_samples = daq.int32()
+            for i, task in enumerate(self._scanner_counter_daq_tasks):
+                daq.DAQmxSetReadOffset(task, 1 + 2 * points * self._frame_line_index)
+                daq.DAQmxReadCounterU32(
+                    task,
+                    2 * points,
+                    timeout,
+                    line_counts[i],
+                    2 * points,
+                    daq.byref(n_read_samples),
+                    None)
+
+            all_data = np.full(
+                (len(self.get_scanner_count_channels()), points), 2, dtype=np.float64)
+            # add up adjoint pixels to also get the counts from the low time of the clock
+            all_data[0:len(line_counts)] = (line_counts[:, ::2] + line_counts[:, 1::2]
+                                            ) * self._scanner_clock_frequency
+
+            # Analog channels, read one after the other
+            if len(self._scanner_ai_channels) > 0:
+                analog_data = np.empty((len(self._scanner_ai_channels), points), dtype=np.float64)
+                analog_read_samples = daq.int32()
+                daq.DAQmxReadAnalogF64(
+                    self._scanner_analog_daq_task,
+                    points,
+                    timeout,
+                    daq.DAQmx_Val_GroupByChannel,
+                    analog_data,
+                    len(self._scanner_ai_channels) * points,
+                    daq.byref(analog_read_samples),
+                    None)
+                all_data[len(self._scanner_counter_channels):] = analog_data
+
+            self._current_position = np.array(line_path[:, -1])
+        except:
+            self.log.exception('Error while reading a line of the frame.')
+            return np.array([[-1.]])
+        self._frame_line_index += 1
+        # return values is a rate of counts/s
+        return all_data.transpose()
+
+    def stop_frame(self):
+        """ Stops the scan of the frame, also before all lines are scanned.
+
+        @return int: error code (0:OK, -1:error)
+        """
+        retval = 0
+        try:
+            for i, task in enumerate(self._scanner_counter_daq_tasks):
+                daq.DAQmxStopTask(task)
+            if len(self._scanner_ai_channels) > 0:
+                daq.DAQmxStopTask(self._scanner_analog_daq_task)
+            daq.DAQmxStopTask(self._scanner_clock_daq_task)
+        except:
+            self.log.exception('Error while stopping the frame scan.')
+            retval = -1
+
+        if self._stop_analog_output() < 0:
+            retval = -1
+
+        if self._frame_pixel_clock:
+            try:
+                daq.DAQmxDisconnectTerms(
+                    self._scanner_clock_channel + 'InternalOutput',
+                    self._pixel_clock_channel)
+            except:
+                self.log.exception('Error while disconnecting the pixel clock.')
+                retval = -1
+            self._frame_pixel_clock = False
+        return retval
+
     def close_scanner(self):
         """ Closes the scanner and cleans up afterwards.
 
@@ -31,6 +31,7 @@ from interface.slow_counter_interface import SlowCounterInterface
 from interface.slow_counter_interface import SlowCounterConstraints
 from interface.slow_counter_interface import CountingMode
 from interface.fast_counter_interface import FastCounterInterface
+from hardware.picoquant.tttr import TTTRHistogram
 
 # =============================================================================
 # Wrapper around the PHLib.DLL. The current file is based on the header files
@@ -125,6 +126,13 @@ class PicoHarp300(Base, SlowCounterInterface, FastCounterInterface):
         self._photon_source2 = None #for compatibility reasons with second APD
         self._count_channel = 1
 
+        # histogram of the TTTR records returned by get_data_trace, created in configure
+        self._tttr_histogram = None
+
+        # the readout loop is running, and the measurement is paused (module stays locked)
+        self._readout_running = False
+        self._paused = False
+
         #locking for thread safety
         self.threadlock = Mutex()
 
@@ -146,7 +154,6 @@ class PicoHarp300(Base, SlowCounterInterface, FastCounterInterface):
         self.sigStart.connect(self.start_measure)
         self.sigReadoutPicoharp.connect(self.get_fresh_data_loop, QtCore.Qt.QueuedConnection) # ,QtCore.Qt.QueuedConnection
         self.sigAnalyzeData.connect(self.analyze_received_data, QtCore.Qt.QueuedConnection)
-        self.result = []
 
 
     def on_deactivate(self):
@@ -1051,29 +1058,34 @@ class PicoHarp300(Base, SlowCounterInterface, FastCounterInterface):
 
     #FIXME: The interface connection to the fast counter must be established!
 
-    def configure(self, bin_width_ns, record_length_ns, number_of_gates = 0):
+    def configure(self, bin_width_s, record_length_s, number_of_gates = 0):
         """
         Configuration of the fast counter.
-        bin_width_ns: Length of a single time bin in the time trace histogram
-                      in nanoseconds.
-        record_length_ns: Total length of the timetrace/each single gate in
-                          nanoseconds.
+        bin_width_s: Length of a single time bin in the time trace histogram
+                     in seconds.
+        record_length_s: Total length of the timetrace/each single gate in
+                         seconds.
         number_of_gates: Number of gates in the pulse sequence. Ignore for
                          ungated counter.
+
+        The device is initialized in T3 mode if this is the configured mode,
+        otherwise in T2 mode. The TTTR records are histogrammed relative to
+        the sync pulses (see hardware/picoquant/tttr.py).
         """
-#        self.initialize(mode=3)
-        self._bin_width_ns = bin_width_ns
-        self._record_length_ns = record_length_ns
+        self._bin_width_ns = bin_width_s * 1e9
+        self._record_length_ns = record_length_s * 1e9
         self._number_of_gates = number_of_gates
 
-        #FIXME: actualle only an unsigned array will be needed. Change that later.
-#        self.data_trace = np.zeros(number_of_gates, dtype=np.int64 )
-        self.data_trace = [0]*number_of_gates
-        self.count = 0
-
-        self.result = []
-        self.initialize(2)
-        return
+        tttr_mode = self.MODE_T3 if self._mode == self.MODE_T3 else self.MODE_T2
+        self.initialize(tttr_mode)
+        resolution_ps = self.get_resolution() if tttr_mode == self.MODE_T3 else None
+        with self.threadlock:
+            self._tttr_histogram = TTTRHistogram(tttr_mode,
+                                                 bin_width_ps=bin_width_s * 1e12,
+                                                 number_of_bins=int(round(record_length_s / bin_width_s)),
+                                                 number_of_gates=number_of_gates,
+                                                 resolution_ps=resolution_ps)
+        return bin_width_s, record_length_s, number_of_gates
 
     def get_status(self):
         """
@@ -1087,6 +1099,8 @@ class PicoHarp300(Base, SlowCounterInterface, FastCounterInterface):
         """
         if not self.connected_to_device:
             return -1
+        elif self._paused:
+            return 3
         else:
             returnvalue = self._get_status()
             if returnvalue == 0:
@@ -1099,16 +1113,24 @@ class PicoHarp300(Base, SlowCounterInterface, FastCounterInterface):
         """
         Pauses the current measurement if the fast counter is in running state.
         """
-
-        self.stop_measure()
-        self.meas_run = False
+        with self.threadlock:
+            # the readout loop stops the device but keeps the module locked
+            self._paused = True
+            self.meas_run = False
 
     def continue_measure(self):
         """
         Continues the current measurement if the fast counter is in pause state.
         """
-        self.meas_run = True
-        self.start(self._record_length_ns/1e6)
+        with self.threadlock:
+            self._paused = False
+            self.meas_run = True
+            if self._readout_running:
+                # the readout loop has not stopped the device yet and simply continues
+                return
+            self._readout_running = True
+        self.start(self.ACQTMAX)
+        self.sigReadoutPicoharp.emit()
 
     def is_gated(self):
         """
@@ -1121,8 +1143,7 @@ class PicoHarp300(Base, SlowCounterInterface, FastCounterInterface):
         """
         returns the width of a single timebin in the timetrace in seconds
         """
-        #FIXME: Must be implemented
-        return 2e-9
+        return self._bin_width_ns * 1e-9
 
     def get_data_trace(self):
         """
@@ -1135,9 +1156,10 @@ class PicoHarp300(Base, SlowCounterInterface, FastCounterInterface):
           - If the counter is gated it will return a 2D-numpy-array with
             returnarray[gate_index, timebin_index]
         """
-
-
-        return self.data_trace
+        with self.threadlock:
+            if self._tttr_histogram is None:
+                return np.zeros(0, dtype='int64')
+            return self._tttr_histogram.get_data_trace()
 
 
 
@@ -1150,18 +1172,28 @@ class PicoHarp300(Base, SlowCounterInterface, FastCounterInterface):
         """
         Starts the fast counter.
         """
-        self.lock()
+        self.module_state.lock()
 
         self.meas_run = True
+        with self.threadlock:
+            self._paused = False
+            self._readout_running = True
+            if self._tttr_histogram is not None:
+                self._tttr_histogram.clear()
 
-        # start the device:
-        self.start(int(self._record_length_ns/1e6))
+        # start the device. The acquisition runs until it is stopped.
+        self.start(self.ACQTMAX)
 
         self.sigReadoutPicoharp.emit()
 
     def stop_measure(self):
         """ By setting the Flag, the measurement should stop.  """
-        self.meas_run = False
+        with self.threadlock:
+            self.meas_run = False
+            self._paused = False
+            # a paused measurement has no readout loop left to unlock the module
+            if not self._readout_running and self.module_state() == 'locked':
+                self.module_state.unlock()
 
 
     def get_fresh_data_loop(self):
@@ -1172,15 +1204,17 @@ class PicoHarp300(Base, SlowCounterInterface, FastCounterInterface):
 #        buffer, actual_counts = [1,2,3,4,5,6,7,8,9], 9
 
         # This analysis signel should be analyzed in a queued thread:
-        self.sigAnalyzeData.emit(buffer[0:actual_counts-1], actual_counts)
-
-        if not self.meas_run:
-            with self.threadlock:
-                self.unlock()
-                self.stop_device
+        self.sigAnalyzeData.emit(buffer[0:actual_counts], actual_counts)
+
+        with self.threadlock:
+            # continue_measure may have set meas_run again since the last readout
+            if not self.meas_run:
+                self.stop_device()
+                self._readout_running = False
+                if not self._paused:
+                    self.module_state.unlock()
                 return
 
-        print('get new data.')
         # get the next data:
         self.sigReadoutPicoharp.emit()
 
@@ -1192,8 +1226,8 @@ class PicoHarp300(Base, SlowCounterInterface, FastCounterInterface):
         @param arr_data: numpy uint32 array with length 'actual_counts'.
         @param actual_counts: int, number of read out events from the buffer.
 
-        Write the obtained arr_data to the predefined array data_trace,
-        initialized in the configure method.
+        Decode the obtained arr_data and add the photons to the histogram
+        returned by get_data_trace, initialized in the configure method.
 
         The received array contains 32bit words. The bit assignment starts from
         the MSB (most significant bit), which is here displayed as the most
@@ -1266,36 +1300,9 @@ class PicoHarp300(Base, SlowCounterInterface, FastCounterInterface):
                       the channel-number are set to high (i.e. 1).
         """
 
-        # at first just a simple test
-        time.sleep(0.2)
-
-        self.data_trace[self.count] = actual_counts
-        self.count += 1
-
-        if self.count > self._number_of_gates-1:
-            self.count = 0
+        with self.threadlock:
+            if self._tttr_histogram is not None:
+                self._tttr_histogram.add_records(arr_data[:actual_counts])
 
         if actual_counts == self.TTREADMAX:
             self.log.warning('Overflow!')
-
-        print('Data analyzed.')
-
-#        self.result = []
-#        for entry in arr_data[0:actual_counts-1]:
-#
-#            # apply three bitmasks to extract the relavent numbers:
-#            overflow = entry & (2**(32-1) )
-#            marker_ch = entry & (2**(32-2)  + 2**(32-3) + 2**(32-4))
-#            time_tag = entry & (2**32 -1 - 2**(32-1) + 2**(32-2) + 2**(32-3) + 2**(32-4))
-
-
-
-
-
-
-
-
-
-
-
-
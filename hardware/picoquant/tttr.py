@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the decoder and histogrammer for the time-tagged time-resolved (TTTR) records
+of the PicoHarp300.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import numpy as np
+
+# The record formats are described in the PicoHarp300 manual and in the file format demos
+# of PicoQuant. Each record is a 32 bit word, starting from the MSB:
+#
+# T2: [ 4 bit channel | 28 bit time tag ]
+#     channel 0 is the sync input, channels 1-4 are the (routed) photon inputs.
+# T3: [ 4 bit channel | 12 bit dtime | 16 bit nsync ]
+#     channels 1-4 are the (routed) photon inputs. dtime is the time since the last sync pulse
+#     in units of the resolution, nsync the number of sync pulses.
+#
+# The channel 15 marks a special record. If the lowest 4 bits of the time tag (T2) or dtime (T3)
+# are zero it is an overflow of the time tag (T2) or nsync (T3), else these bits are the
+# external markers.
+
+MODE_T2 = 2
+MODE_T3 = 3
+
+SPECIAL_CHANNEL = 15
+T2_WRAPAROUND = 210698240
+T3_WRAPAROUND = 65536
+T2_RESOLUTION_PS = 4
+
+
+class TTTRDecoder:
+    """
+    Vectorized decoder of a stream of PicoHarp300 T2 or T3 records.
+
+    The records can be passed in chunks of any size (e.g. as read from the FIFO or from a
+    recorded file). The overflow correction is carried over from one chunk to the next, so the
+    returned times are continuous over the whole stream.
+    """
+    def __init__(self, mode):
+        """
+        @param int mode: MODE_T2 or MODE_T3
+        """
+        if mode not in (MODE_T2, MODE_T3):
+            raise ValueError('TTTR records can only be decoded in T2 ({0:d}) or T3 ({1:d}) mode, '
+                             'not in mode {2}.'.format(MODE_T2, MODE_T3, mode))
+        self.mode = mode
+        self.overflows = 0
+        self.invalid_records = 0
+
+    def reset(self):
+        """ Start decoding a new stream. """
+        self.overflows = 0
+        self.invalid_records = 0
+        return
+
+    def decode(self, records):
+        """ Decode a chunk of records.
+
+        @param numpy.ndarray records: 1D array of uint32 records
+
+        @return dict: the decoded events of the chunk, all as 1D numpy arrays:
+                      'photon_channel': channel (1-4) of each photon
+                      'photon_time': T2: time tag in 4 ps units, T3: sync count of each photon
+                      'photon_dtime': T3 only: time since the last sync in units of the resolution
+                      'sync_time': T2 only: time tag of each sync pulse
+                      'marker_bits': the external marker bits of each marker record
+                      'marker_time': T2: time tag, T3: sync count of each marker record
+                      All times include the overflow correction.
+        """
+        records = np.asarray(records, dtype=np.uint32).ravel()
+        channel = records >> np.uint32(28)
+        if self.mode == MODE_T3:
+            time_tag = records & np.uint32(0xFFFF)
+            low_bits = (records >> np.uint32(16)) & np.uint32(0xF)
+            wraparound = T3_WRAPAROUND
+        else:
+            time_tag = records & np.uint32(0x0FFFFFFF)
+            low_bits = records & np.uint32(0xF)
+            wraparound = T2_WRAPAROUND
+
+        special = channel == SPECIAL_CHANNEL
+        overflow = special & (low_bits == 0)
+        # number of overflows up to each record
+        true_time = np.cumsum(overflow, dtype='int64')
+        true_time += self.overflows
+        true_time *= wraparound
+        true_time += time_tag
+        if overflow.size > 0:
+            self.overflows += int(np.count_nonzero(overflow))
+
+        photon = (~special) & (channel >= 1) & (channel <= 4)
+        marker = special & ~overflow
+        result = {'photon_channel': channel[photon].astype(np.uint8),
+                  'photon_time': true_time[photon],
+                  'marker_bits': low_bits[marker].astype(np.uint8),
+                  'marker_time': true_time[marker]}
+        if self.mode == MODE_T3:
+            dtime = (records[photon] >> np.uint32(16)) & np.uint32(0xFFF)
+            result['photon_dtime'] = dtime.astype('int64')
+            number_of_valid = photon.sum() + special.sum()
+        else:
+            sync = (~special) & (channel == 0)
+            result['sync_time'] = true_time[sync]
+            number_of_valid = photon.sum() + special.sum() + sync.sum()
+        self.invalid_records += records.size - int(number_of_valid)
+        return result
+
+
+class TTTRHistogram:
+    """
+    Streaming histogram of the photon arrival times relative to the sync pulses, as returned by
+    FastCounterInterface.get_data_trace.
+
+    Ungated: counts[bin] with the time since the last sync pulse.
+    Gated (T3 only): counts[gate, bin]. A sync pulse marks the start of each gate and an external
+    marker the start of the sequence, i.e. of gate 0. Photons before the first marker or after the
+    last gate are discarded.
+    """
+    def __init__(self, mode, bin_width_ps, number_of_bins, number_of_gates=0, resolution_ps=None,
+                 sequence_marker=0xF):
+        """
+        @param int mode: MODE_T2 or MODE_T3
+        @param float bin_width_ps: width of a time bin in ps
+        @param int number_of_bins: number of time bins (per gate)
+        @param int number_of_gates: number of gates, 0 for an ungated histogram
+        @param float resolution_ps: T3 only: resolution of dtime in ps
+        @param int sequence_marker: gated only: bit mask of the markers starting a sequence
+        """
+        if mode == MODE_T3 and resolution_ps is None:
+            raise ValueError('The resolution is required to histogram T3 records.')
+        if mode == MODE_T2 and number_of_gates > 0:
+            raise ValueError('Gated histograms are only supported for T3 records.')
+        self.decoder = TTTRDecoder(mode)
+        self.mode = mode
+        self.bin_width_ps = float(bin_width_ps)
+        self.number_of_bins = int(number_of_bins)
+        self.number_of_gates = int(number_of_gates)
+        self.resolution_ps = T2_RESOLUTION_PS if mode == MODE_T2 else float(resolution_ps)
+        self.sequence_marker = int(sequence_marker)
+        if self.number_of_gates > 0:
+            self.counts = np.zeros((self.number_of_gates, self.number_of_bins), dtype='int64')
+        else:
+            self.counts = np.zeros(self.number_of_bins, dtype='int64')
+        # time of the last sync pulse (T2) or sequence marker (gated T3) of the previous records
+        self._last_reference = None
+
+    def clear(self):
+        """ Clear the histogram and start a new stream of records. """
+        self.counts[...] = 0
+        self.decoder.reset()
+        self._last_reference = None
+        return
+
+    def get_data_trace(self):
+        """ Copy of the histogram.
+
+        @return numpy.ndarray: int64 array, 1D (ungated) or 2D with shape (gates, bins) (gated)
+        """
+        return self.counts.copy()
+
+    def add_records(self, records):
+        """ Decode a chunk of records and add its photons to the histogram.
+
+        @param numpy.ndarray records: 1D array of uint32 records
+
+        @return int: number of photons added to the histogram
+        """
+        events = self.decoder.decode(records)
+        if self.mode == MODE_T3:
+            delay = events['photon_dtime']
+            if self.number_of_gates > 0:
+                is_start = (events['marker_bits'] & self.sequence_marker) != 0
+                gate = self._time_since_reference(events['photon_time'],
+                                                  events['marker_time'][is_start])
+                in_gate = (gate >= 0) & (gate < self.number_of_gates)
+                gate = gate[in_gate]
+                delay = delay[in_gate]
+        else:
+            delay = self._time_since_reference(events['photon_time'], events['sync_time'])
+            delay = delay[delay >= 0]
+
+        time_bin = (delay * (self.resolution_ps / self.bin_width_ps)).astype('int64')
+        in_range = time_bin < self.number_of_bins
+        if self.number_of_gates > 0:
+            flat_bin = gate[in_range] * self.number_of_bins + time_bin[in_range]
+            self.counts += np.bincount(flat_bin, minlength=self.counts.size).reshape(
+                self.counts.shape)
+        else:
+            self.counts += np.bincount(time_bin[in_range], minlength=self.number_of_bins)
+        return int(np.count_nonzero(in_range))
+
+    def _time_since_reference(self, times, reference_times):
+        """ Time of each event since the last reference event (sync pulse or marker) at or before
+        it. The last reference of this chunk is kept for the next one.
+
+        @param numpy.ndarray times: sorted times of the events
+        @param numpy.ndarray reference_times: sorted times of the reference events
+
+        @return numpy.ndarray: time since the last reference, -1 if there was none
+        """
+        if self._last_reference is not None:
+            reference_times = np.concatenate(([self._last_reference], reference_times))
+        if reference_times.size == 0:
+            return np.full(times.size, -1, dtype='int64')
+        self._last_reference = int(reference_times[-1])
+        index = np.searchsorted(reference_times, times, side='right') - 1
+        elapsed = times - reference_times[np.maximum(index, 0)]
+        elapsed[index < 0] = -1
+        return elapsed
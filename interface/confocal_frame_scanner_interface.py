@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module contains the Qudi interface file for confocal scanners which can scan a whole frame
+in one hardware timed task.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import abc
+from core.util.interfaces import InterfaceMetaclass
+
+
+class ConfocalFrameScannerInterface(metaclass=InterfaceMetaclass):
+    """ Optional extension of the ConfocalScannerInterface for scanners which can scan a whole
+    frame (all lines of an image) in one hardware timed task.
+
+    The path of the frame is written to the scanner once with set_up_frame. After start_frame the
+    scanner runs through the whole path with the scanner clock and get_frame_line returns the
+    counts line by line while the scanner continues with the next lines.
+    The scanner and its clock are set up with set_up_scanner_clock and set_up_scanner of the
+    ConfocalScannerInterface as for line scans.
+    """
+
+    _modtype = 'ConfocalFrameScannerInterface'
+    _modclass = 'interface'
+
+    @abc.abstractmethod
+    def supports_frame_scan(self):
+        """ Whether frames can be scanned with this scanner. Modules forwarding to another scanner
+        (e.g. interfuses) report the capability of that scanner.
+
+        @return bool: True if set_up_frame and the other frame methods can be used
+        """
+        pass
+
+    @abc.abstractmethod
+    def set_up_frame(self, frame_path, pixels):
+        """ Writes the path of a frame to the scanner.
+
+        @param float[k][n][m] frame_path: k lines with n axes and m points each, defining the
+                                          positions of the frame
+        @param int pixels: number of points at the start of each line which are pixels of the
+                           image. The remaining points of a line move the scanner to the start
+                           of the next line (e.g. a return line or a turnaround).
+
+        @return int: error code (0:OK, -1:error)
+        """
+        pass
+
+    @abc.abstractmethod
+    def start_frame(self, pixel_clock=False):
+        """ Starts the scan of the frame written with set_up_frame.
+
+        @param bool pixel_clock: whether we need to output a pixel clock for the frame
+
+        @return int: error code (0:OK, -1:error)
+        """
+        pass
+
+    @abc.abstractmethod
+    def get_frame_line(self):
+        """ Waits until the next line of the running frame is scanned and returns its counts.
+
+        @return float[k][m]: the photon counts per second of all k points of the line for m
+                             channels, [[-1.]] on error. The first <pixels> points are the pixels
+                             of the image, the remaining ones were counted while moving to the
+                             next line.
+        """
+        pass
+
+    @abc.abstractmethod
+    def stop_frame(self):
+        """ Stops the scan of the frame, also before all lines are scanned.
+
+        @return int: error code (0:OK, -1:error)
+        """
+        pass
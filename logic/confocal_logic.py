@@ -32,6 +32,8 @@ from io import BytesIO
 from logic.generic_logic import GenericLogic
 from core.util.mutex import Mutex
 from core.module import Connector, ConfigOption, StatusVar
+from interface.confocal_frame_scanner_interface import ConfocalFrameScannerInterface
+from logic.tiled_image import TiledImage
 
 
 class OldConfigFileError(Exception):
@@ -130,20 +132,21 @@ class ConfocalHistoryEntry(QtCore.QObject):
         confocal._scanning_device.tilt_reference_y = self.tilt_reference_y
         confocal._scanning_device.tiltcorrection = self.tilt_correction
 
+        # the images share their tiles with the history until they are scanned again
         confocal.initialize_image()
         try:
             if confocal.xy_image.shape == self.xy_image.shape:
-                confocal.xy_image = np.copy(self.xy_image)
+                confocal.xy_image = self.xy_image.copy()
         except AttributeError:
-            self.xy_image = np.copy(confocal.xy_image)
+            self.xy_image = confocal.xy_image.copy()
 
         confocal._zscan = True
         confocal.initialize_image()
         try:
             if confocal.depth_image.shape == self.depth_image.shape:
-                confocal.depth_image = np.copy(self.depth_image)
+                confocal.depth_image = self.depth_image.copy()
         except AttributeError:
-            self.depth_image = np.copy(confocal.depth_image)
+            self.depth_image = confocal.depth_image.copy()
         confocal._zscan = False
 
     def snapshot(self, confocal):
@@ -172,8 +175,8 @@ class ConfocalHistoryEntry(QtCore.QObject):
         self.point1 = np.copy(confocal.point1)
         self.point2 = np.copy(confocal.point2)
         self.point3 = np.copy(confocal.point3)
-        self.xy_image = np.copy(confocal.xy_image)
-        self.depth_image = np.copy(confocal.depth_image)
+        self.xy_image = confocal.xy_image.copy()
+        self.depth_image = confocal.depth_image.copy()
 
     def serialize(self):
         """ Give out a dictionary that can be saved via the usual means """
@@ -197,8 +200,8 @@ class ConfocalHistoryEntry(QtCore.QObject):
         serialized['tilt_point3'] = list(self.point3)
         serialized['tilt_reference'] = [self.tilt_reference_x, self.tilt_reference_y]
         serialized['tilt_slope'] = [self.tilt_slope_x, self.tilt_slope_y]
-        serialized['xy_image'] = self.xy_image
-        serialized['depth_image'] = self.depth_image
+        serialized['xy_image'] = np.array(self.xy_image)
+        serialized['depth_image'] = np.array(self.depth_image)
         return serialized
 
     def deserialize(self, serialized):
@@ -238,12 +241,12 @@ class ConfocalHistoryEntry(QtCore.QObject):
             self.point3 = np.array(serialized['tilt_point3'])
         if 'xy_image' in serialized:
             if isinstance(serialized['xy_image'], np.ndarray):
-                self.xy_image = serialized['xy_image']
+                self.xy_image = TiledImage.from_array(serialized['xy_image'])
             else:
                 raise OldConfigFileError()
         if 'depth_image' in serialized:
             if isinstance(serialized['depth_image'], np.ndarray):
-                self.depth_image = serialized['depth_image'].copy()
+                self.depth_image = TiledImage.from_array(serialized['depth_image'])
             else:
                 raise OldConfigFileError()
 
@@ -259,10 +262,32 @@ class ConfocalLogic(GenericLogic):
     confocalscanner1 = Connector(interface='ConfocalScannerInterface')
     savelogic = Connector(interface='SaveLogic')
 
+    # config options
+    # scan the return line of each line within the same scanner task as the line. Only the counts
+    # of the line are kept, but the scanner emits the pixel clock during the return as well.
+    _combine_return_line = ConfigOption('combine_return_line', False)
+    # scan lines without returning to the Qt event loop until this time (in s) has passed
+    _line_batch_time = ConfigOption('line_batch_time', 0.1)
+    # scan whole frames in one hardware timed task if the scanner supports frame scans
+    _frame_scan = ConfigOption('frame_scan', False)
+    # number of points to move to the next line at the end of a line of a serpentine scan
+    _turnaround_points = ConfigOption('turnaround_points', 10)
+    # largest shift (in pixels) of the backward lines searched by the automatic pixel shift
+    _max_pixel_shift = ConfigOption('max_pixel_shift', 10)
+    # number of rows and columns of the tiles of xy_image and depth_image, a power of 2
+    _image_tile_size = ConfigOption('image_tile_size', 256)
+
     # status vars
     _clock_frequency = StatusVar('clock_frequency', 500)
     return_slowness = StatusVar(default=50)
     max_history_length = StatusVar(default=10)
+    # scan every other line backwards instead of returning to the start of the line
+    serpentine_scan = StatusVar(default=False)
+    # shift (in pixels) of the counts of the backward lines of a serpentine scan relative to the
+    # forward lines, compensates the lag of the scanner
+    pixel_shift = StatusVar(default=0)
+    # estimate the pixel shift from the cross-correlation of adjacent lines while scanning
+    auto_pixel_shift = StatusVar(default=False)
 
     # signals
     signal_start_scanning = QtCore.Signal(str)
@@ -297,6 +322,14 @@ class ConfocalLogic(GenericLogic):
         self.depth_scan_dir_is_xz = True
         self.depth_img_is_xz = True
         self.permanent_scan = False
+        # precomputed scanner paths of all lines of the current scan
+        self._line_paths = None
+        self._return_paths = None
+        self._scan_frames = False
+        self._scan_serpentine = False
+        self._frame_running = False
+        self._pixel_shift_estimates = []
+        self._last_backward_counts = None
 
     def on_activate(self):
         """ Initialisation performed during activation of the module.
@@ -496,39 +529,23 @@ class ConfocalLogic(GenericLogic):
             if self.depth_img_is_xz:
                 #self._image_horz_axis = self._X
                 # creates an image where each pixel will be [x,y,z,counts]
-                self.depth_image = np.zeros((
-                        len(self._image_vert_axis),
-                        len(self._X),
-                        3 + len(self.get_scanner_count_channels())
-                    ))
-
-                self.depth_image[:, :, 0] = np.full(
-                    (len(self._image_vert_axis), len(self._X)), self._XL)
-
-                self.depth_image[:, :, 1] = self._current_y * np.ones(
-                    (len(self._image_vert_axis), len(self._X)))
-
-                z_value_matrix = np.full((len(self._X), len(self._image_vert_axis)), self._Z)
-                self.depth_image[:, :, 2] = z_value_matrix.transpose()
+                self.depth_image = TiledImage(
+                    [(1, self._XL),
+                     (0, np.full(len(self._image_vert_axis), self._current_y)),
+                     (0, self._Z)],
+                    len(self.get_scanner_count_channels()),
+                    tile_size=self._image_tile_size)
 
             # depth scan is yz plane instead of xz plane
             else:
                 #self._image_horz_axis = self._Y
                 # creats an image where each pixel will be [x,y,z,counts]
-                self.depth_image = np.zeros((
-                        len(self._image_vert_axis),
-                        len(self._Y),
-                        3 + len(self.get_scanner_count_channels())
-                    ))
-
-                self.depth_image[:, :, 0] = self._current_x * np.ones(
-                    (len(self._image_vert_axis), len(self._Y)))
-
-                self.depth_image[:, :, 1] = np.full(
-                    (len(self._image_vert_axis), len(self._Y)), self._YL)
-
-                z_value_matrix = np.full((len(self._Y), len(self._image_vert_axis)), self._Z)
-                self.depth_image[:, :, 2] = z_value_matrix.transpose()
+                self.depth_image = TiledImage(
+                    [(0, np.full(len(self._image_vert_axis), self._current_x)),
+                     (1, self._YL),
+                     (0, self._Z)],
+                    len(self.get_scanner_count_channels()),
+                    tile_size=self._image_tile_size)
 
                 # now we are scanning along the y-axis, so we need a new return line along Y:
                 self._return_YL = np.linspace(self._YL[-1], self._YL[0], self.return_slowness)
@@ -541,20 +558,12 @@ class ConfocalLogic(GenericLogic):
             #self._image_horz_axis = self._X
             self._image_vert_axis = self._Y
             # creats an image where each pixel will be [x,y,z,counts]
-            self.xy_image = np.zeros((
-                    len(self._image_vert_axis),
-                    len(self._X),
-                    3 + len(self.get_scanner_count_channels())
-                ))
-
-            self.xy_image[:, :, 0] = np.full(
-                (len(self._image_vert_axis), len(self._X)), self._XL)
-
-            y_value_matrix = np.full((len(self._X), len(self._image_vert_axis)), self._Y)
-            self.xy_image[:, :, 1] = y_value_matrix.transpose()
-
-            self.xy_image[:, :, 2] = self._current_z * np.ones(
-                (len(self._image_vert_axis), len(self._X)))
+            self.xy_image = TiledImage(
+                [(1, self._XL),
+                 (0, self._Y),
+                 (0, np.full(len(self._image_vert_axis), self._current_z))],
+                len(self.get_scanner_count_channels()),
+                tile_size=self._image_tile_size)
 
             self.sigImageXYInitialized.emit()
         return 0
@@ -590,6 +599,7 @@ class ConfocalLogic(GenericLogic):
             self.set_position('scanner')
             return -1
 
+        self._prepare_scan_paths()
         self.signal_scan_lines_next.emit()
         return 0
 
@@ -619,9 +629,83 @@ class ConfocalLogic(GenericLogic):
             self.set_position('scanner')
             return -1
 
+        self._prepare_scan_paths()
         self.signal_scan_lines_next.emit()
         return 0
 
+    def _prepare_scan_paths(self):
+        """ Precompute the scanner paths of all lines and return lines of the current image.
+
+        The paths of a line are views into one array of shape (lines, axes, points), so no path
+        has to be built while scanning. Only the z (xy scan) and a values are updated before each
+        line (frame) is scanned, to follow changes of the position during the scan.
+        With combine_return_line and in frame scans, the return line is appended to the line path
+        and _return_paths is None. In serpentine scans every other line is reversed and followed
+        by a turnaround to the start of the next line instead of the return line.
+        """
+        image = self.depth_image if self._zscan else self.xy_image
+        n_ch = len(self.get_scanner_axes())
+        lines, pixels = image.shape[0], image.shape[1]
+        pos_ch = min(n_ch, 3)
+        # interfuses implement the frame scanner interface, but ask if the scanner behind can
+        self._scan_frames = (self._frame_scan
+                             and isinstance(self._scanning_device, ConfocalFrameScannerInterface)
+                             and self._scanning_device.supports_frame_scan())
+        self._scan_serpentine = self.serpentine_scan
+        self._pixel_shift_estimates = []
+        self._last_backward_counts = None
+
+        if self._scan_serpentine:
+            turnaround = max(self._turnaround_points, 2)
+            self._line_paths = np.empty((lines, n_ch, pixels + turnaround))
+            self._return_paths = None
+            self._line_paths[:, :pos_ch, :pixels] = image[:, :, :pos_ch].transpose(0, 2, 1)
+            self._line_paths[1::2, :pos_ch, :pixels] = image[1::2, ::-1, :pos_ch].transpose(0, 2, 1)
+            # move from the end of each line to the start of the next one, the last line stays
+            line_ends = self._line_paths[:, :pos_ch, pixels - 1]
+            next_starts = line_ends.copy()
+            next_starts[:-1] = self._line_paths[1:, :pos_ch, 0]
+            self._line_paths[:, :pos_ch, pixels:] = np.linspace(
+                line_ends, next_starts, turnaround, axis=-1)
+            return
+
+        if self._zscan and not self.depth_img_is_xz:
+            return_axis, return_values = 1, self._return_YL
+        else:
+            return_axis, return_values = 0, self._return_XL
+
+        combine = self._combine_return_line or self._scan_frames
+        points = pixels + return_values.size if combine else pixels
+        self._line_paths = np.empty((lines, n_ch, points))
+        self._line_paths[:, :pos_ch, :pixels] = image[:, :, :pos_ch].transpose(0, 2, 1)
+        if combine:
+            self._return_paths = None
+            return_paths = self._line_paths[:, :, pixels:]
+        else:
+            self._return_paths = np.empty((lines, n_ch, return_values.size))
+            return_paths = self._return_paths
+        # the return line stays at the position of the first pixel of its line in all other axes
+        return_paths[:, :pos_ch, :] = image[:, 0, :pos_ch][:, :, np.newaxis]
+        if return_axis < n_ch:
+            return_paths[:, return_axis, :] = return_values
+        return
+
+    def _scan_start_line(self, image):
+        """ Move the scanner from the cursor position to the first pixel of the scan.
+
+        @return bool: True if the scanner moved, False on a scanner error
+        """
+        n_ch = len(self.get_scanner_axes())
+        rs = self.return_slowness
+        start_line = np.empty((n_ch, rs))
+        start = (self._current_x, self._current_y, self._current_z, self._current_a)
+        for axis in range(n_ch):
+            stop = image[0, 0, axis] if axis < 3 else self._current_a
+            start_line[axis] = np.linspace(start[axis], stop, rs)
+        # counts are thrown away
+        start_line_counts = self._scanning_device.scan_line(start_line)
+        return not np.any(start_line_counts == -1)
+
     def kill_scanner(self):
         """Closing the scanner device.
 
@@ -714,6 +798,7 @@ class ConfocalLogic(GenericLogic):
         # stops scanning
         if self.stopRequested:
             with self.threadlock:
+                self._stop_frame()
                 self.kill_scanner()
                 self.stopRequested = False
                 self.module_state.unlock()
@@ -734,119 +819,214 @@ class ConfocalLogic(GenericLogic):
                 return
 
         image = self.depth_image if self._zscan else self.xy_image
-        n_ch = len(self.get_scanner_axes())
         s_ch = len(self.get_scanner_count_channels())
+        pixels = image.shape[1]
+        batch_start = time.perf_counter()
 
         try:
-            if self._scan_counter == 0:
-                # make a line from the current cursor position to
-                # the starting position of the first scan line of the scan
-                rs = self.return_slowness
-                lsx = np.linspace(self._current_x, image[self._scan_counter, 0, 0], rs)
-                lsy = np.linspace(self._current_y, image[self._scan_counter, 0, 1], rs)
-                lsz = np.linspace(self._current_z, image[self._scan_counter, 0, 2], rs)
-                if n_ch <= 3:
-                    start_line = np.vstack([lsx, lsy, lsz][0:n_ch])
+            # scan lines until the batch time is over, then return to the event loop to update
+            # the image and to handle requests
+            while True:
+                if self._scan_frames:
+                    line_counts = self._scan_frame_line(image)
                 else:
-                    start_line = np.vstack(
-                        [lsx, lsy, lsz, np.ones(lsx.shape) * self._current_a])
-                # move to the start position of the scan, counts are thrown away
-                start_line_counts = self._scanning_device.scan_line(start_line)
-                if np.any(start_line_counts == -1):
+                    line_counts = self._scan_single_line(image)
+                if line_counts is None:
                     self.stopRequested = True
-                    self.signal_scan_lines_next.emit()
-                    return
-
-            # adjust z of line in image to current z before building the line
-            if not self._zscan:
-                z_shape = image[self._scan_counter, :, 2].shape
-                image[self._scan_counter, :, 2] = self._current_z * np.ones(z_shape)
-
-            # make a line in the scan, _scan_counter says which one it is
-            lsx = image[self._scan_counter, :, 0]
-            lsy = image[self._scan_counter, :, 1]
-            lsz = image[self._scan_counter, :, 2]
-            if n_ch <= 3:
-                line = np.vstack([lsx, lsy, lsz][0:n_ch])
-            else:
-                line = np.vstack(
-                    [lsx, lsy, lsz, np.ones(lsx.shape) * self._current_a])
+                    break
+
+                # update image with counts from the line we just scanned
+                if self._scan_serpentine:
+                    line_counts = self._serpentine_line_counts(image, line_counts)
+                image[self._scan_counter, :, 3:3 + s_ch] = line_counts[:pixels]
+
+                # next line in scan
+                self._scan_counter += 1
+
+                # stop scanning when last line scan was performed and makes scan not continuable
+                if self._scan_counter >= np.size(self._image_vert_axis):
+                    self._stop_frame()
+                    if not self.permanent_scan:
+                        self.stop_scanning()
+                        if self._zscan:
+                            self._zscan_continuable = False
+                        else:
+                            self._xyscan_continuable = False
+                    else:
+                        self._scan_counter = 0
 
-            # scan the line in the scan
-            line_counts = self._scanning_device.scan_line(line, pixel_clock=True)
-            if np.any(line_counts == -1):
-                self.stopRequested = True
-                self.signal_scan_lines_next.emit()
-                return
+                if (self.stopRequested
+                        or time.perf_counter() - batch_start >= self._line_batch_time):
+                    break
 
-            # make a line to go to the starting position of the next scan line
-            if self.depth_img_is_xz or not self._zscan:
-                if n_ch <= 3:
-                    return_line = np.vstack([
-                        self._return_XL,
-                        image[self._scan_counter, 0, 1] * np.ones(self._return_XL.shape),
-                        image[self._scan_counter, 0, 2] * np.ones(self._return_XL.shape)
-                    ][0:n_ch])
-                else:
-                    return_line = np.vstack([
-                            self._return_XL,
-                            image[self._scan_counter, 0, 1] * np.ones(self._return_XL.shape),
-                            image[self._scan_counter, 0, 2] * np.ones(self._return_XL.shape),
-                            np.ones(self._return_XL.shape) * self._current_a
-                        ])
-            else:
-                if n_ch <= 3:
-                    return_line = np.vstack([
-                            image[self._scan_counter, 0, 1] * np.ones(self._return_YL.shape),
-                            self._return_YL,
-                            image[self._scan_counter, 0, 2] * np.ones(self._return_YL.shape)
-                        ][0:n_ch])
-                else:
-                    return_line = np.vstack([
-                            image[self._scan_counter, 0, 1] * np.ones(self._return_YL.shape),
-                            self._return_YL,
-                            image[self._scan_counter, 0, 2] * np.ones(self._return_YL.shape),
-                            np.ones(self._return_YL.shape) * self._current_a
-                        ])
-
-            # return the scanner to the start of next line, counts are thrown away
-            return_line_counts = self._scanning_device.scan_line(return_line)
-            if np.any(return_line_counts == -1):
-                self.stopRequested = True
-                self.signal_scan_lines_next.emit()
-                return
-
-            # update image with counts from the line we just scanned
             if self._zscan:
-                if self.depth_img_is_xz:
-                    self.depth_image[self._scan_counter, :, 3:3 + s_ch] = line_counts
-                else:
-                    self.depth_image[self._scan_counter, :, 3:3 + s_ch] = line_counts
                 self.signal_depth_image_updated.emit()
             else:
-                self.xy_image[self._scan_counter, :, 3:3 + s_ch] = line_counts
                 self.signal_xy_image_updated.emit()
-
-            # next line in scan
-            self._scan_counter += 1
-
-            # stop scanning when last line scan was performed and makes scan not continuable
-            if self._scan_counter >= np.size(self._image_vert_axis):
-                if not self.permanent_scan:
-                    self.stop_scanning()
-                    if self._zscan:
-                        self._zscan_continuable = False
-                    else:
-                        self._xyscan_continuable = False
-                else:
-                    self._scan_counter = 0
-
             self.signal_scan_lines_next.emit()
         except:
             self.log.exception('The scan went wrong, killing the scanner.')
             self.stop_scanning()
             self.signal_scan_lines_next.emit()
 
+    def _serpentine_line_counts(self, image, line_counts):
+        """ Counts of a line of a serpentine scan in the order of the image pixels. The backward
+        lines are reversed and shifted by pixel_shift relative to the forward lines.
+
+        With auto_pixel_shift, the shift between the line and the line before it is estimated
+        first and pixel_shift is set to the median of the estimates of this scan. Estimating from
+        the backward line before and after a forward line cancels the difference of the content
+        of adjacent lines to first order.
+
+        @param float[k][m] line_counts: the counts of the line in the order they were scanned,
+                                        including the turnaround if the scanner returned it
+
+        @return float[k][m]: the counts of the pixels of the line
+        """
+        pixels = image.shape[1]
+        backward = self._scan_counter % 2 == 1
+        if backward:
+            backward_counts = line_counts[pixels - 1::-1, 0]
+            forward_counts = image[self._scan_counter - 1, :, 3]
+        else:
+            backward_counts = self._last_backward_counts
+            forward_counts = line_counts[:pixels, 0]
+
+        if self.auto_pixel_shift and self._scan_counter > 0 and backward_counts is not None:
+            shift = self._estimate_pixel_shift(forward_counts, backward_counts,
+                                               self._max_pixel_shift)
+            if shift is not None:
+                self._pixel_shift_estimates.append(shift)
+                self.pixel_shift = int(round(np.median(self._pixel_shift_estimates)))
+
+        if not backward:
+            return line_counts
+        self._last_backward_counts = backward_counts.copy()
+        # counts after the end of the line are taken from the turnaround (line scans and frame
+        # scans both return it), the counts before the start of the line are not scanned and
+        # repeat the first count. pixel_shift is set by the user and may be a float.
+        index = np.arange(pixels - 1, -1, -1) + int(round(self.pixel_shift))
+        return line_counts[np.clip(index, 0, len(line_counts) - 1)]
+
+    @staticmethod
+    def _estimate_pixel_shift(forward, backward, max_shift):
+        """ Shift of a backward line relative to an adjacent forward line, at the maximum of
+        their cross-correlation.
+
+        @param float[k] forward: counts of the forward line
+        @param float[k] backward: counts of the backward line in the order of the image pixels
+        @param int max_shift: largest shift to search for
+
+        @return float: shift s for which backward[p - s] matches forward[p] best, interpolated
+                       between the pixels. None if a line is flat.
+        """
+        # correlate the slopes, a slowly changing background would dominate the counts
+        forward = np.diff(forward)
+        backward = np.diff(backward)
+        forward -= forward.mean()
+        backward -= backward.mean()
+        if not forward.any() or not backward.any():
+            return None
+        pixels = forward.size
+        max_shift = min(int(max_shift), pixels // 2)
+        shifts = np.arange(-max_shift, max_shift + 1)
+        correlation = np.empty(shifts.size)
+        for i, shift in enumerate(shifts):
+            if shift >= 0:
+                overlap = np.dot(forward[shift:], backward[:pixels - shift])
+            else:
+                overlap = np.dot(forward[:pixels + shift], backward[-shift:])
+            correlation[i] = overlap / (pixels - abs(shift))
+
+        peak = np.argmax(correlation)
+        if 0 < peak < shifts.size - 1:
+            # vertex of the parabola through the maximum and its neighbours
+            left, center, right = correlation[peak - 1:peak + 2]
+            curvature = left - 2 * center + right
+            if curvature < 0:
+                return shifts[peak] + 0.5 * (left - right) / curvature
+        return float(shifts[peak])
+
+    def _scan_single_line(self, image):
+        """ Scan the next line of the image and return the scanner to the start of the line.
+
+        @return float[k][m]: the counts of the line, None on a scanner error
+        """
+        n_ch = len(self.get_scanner_axes())
+        if self._scan_counter == 0:
+            # move from the current cursor position to the start of the first scan line
+            if not self._scan_start_line(image):
+                return None
+
+        # the precomputed paths of the line, _scan_counter says which one it is
+        line = self._line_paths[self._scan_counter]
+        return_line = None
+        if self._return_paths is not None:
+            return_line = self._return_paths[self._scan_counter]
+
+        # adjust z of line in image and paths to current z
+        if not self._zscan:
+            image[self._scan_counter, :, 2] = self._current_z
+            if n_ch > 2:
+                line[2] = self._current_z
+                if return_line is not None:
+                    return_line[2] = self._current_z
+        if n_ch > 3:
+            line[3:] = self._current_a
+            if return_line is not None:
+                return_line[3:] = self._current_a
+
+        # scan the line (and with combine_return_line the return line) in the scan
+        line_counts = self._scanning_device.scan_line(line, pixel_clock=True)
+        if np.any(line_counts == -1):
+            return None
+
+        # return the scanner to the start of next line, counts are thrown away
+        if return_line is not None:
+            return_line_counts = self._scanning_device.scan_line(return_line)
+            if np.any(return_line_counts == -1):
+                return None
+        return line_counts
+
+    def _scan_frame_line(self, image):
+        """ Read the next line of the frame scan, start the frame scan of the remaining lines of
+        the image first if it is not running.
+
+        Changes of z (xy scan) and a are applied when the frame is started.
+
+        @return float[k][m]: the counts of the line, None on a scanner error
+        """
+        if not self._frame_running:
+            n_ch = len(self.get_scanner_axes())
+            if self._scan_counter == 0:
+                # move from the current cursor position to the start of the first scan line
+                if not self._scan_start_line(image):
+                    return None
+            frame = self._line_paths[self._scan_counter:]
+            if not self._zscan:
+                image[self._scan_counter:, :, 2] = self._current_z
+                if n_ch > 2:
+                    frame[:, 2] = self._current_z
+            if n_ch > 3:
+                frame[:, 3:] = self._current_a
+            if self._scanning_device.set_up_frame(frame, image.shape[1]) < 0:
+                return None
+            if self._scanning_device.start_frame(pixel_clock=True) < 0:
+                return None
+            self._frame_running = True
+
+        line_counts = self._scanning_device.get_frame_line()
+        if np.any(line_counts == -1):
+            return None
+        return line_counts
+
+    def _stop_frame(self):
+        """ Stop the running frame scan. """
+        if self._frame_running:
+            self._frame_running = False
+            self._scanning_device.stop_frame()
+        return
+
     def save_xy_data(self, colorscale_range=None, percentile_range=None):
         """ Save the current confocal xy data to file.
 
@@ -20,15 +20,204 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 """
 
 from qtpy import QtCore
-from collections import OrderedDict
+from collections import deque, OrderedDict
+import datetime
+import heapq
 import numpy as np
+import os
 import time
 import matplotlib.pyplot as plt
 
-from core.module import Connector, StatusVar
+from core.module import Connector, ConfigOption, StatusVar
 from logic.generic_logic import GenericLogic
 from interface.slow_counter_interface import CountingMode
 from core.util.mutex import Mutex
+from core.util.ringbuffer import RingBuffer
+from core.util.streamrecorder import StreamRecorder
+
+
+class RunningMedian:
+    """ Median of the last <window> values of a single channel, updated in O(log window).
+
+    The lower half of the window is kept in a max-heap and the upper half in a min-heap. Values
+    leaving the window are only marked for deletion and dropped once they reach the top of a heap.
+    """
+
+    def __init__(self, window):
+        """
+        @param int window: number of values the median is calculated over
+        """
+        self._window = max(1, int(window))
+        self.reset()
+
+    def reset(self):
+        """ Forget all values. """
+        self._values = deque()
+        # max-heap (stored negated) and min-heap
+        self._low = []
+        self._high = []
+        # number of valid entries in the heaps
+        self._low_size = 0
+        self._high_size = 0
+        # values marked for lazy deletion and how often they are marked
+        self._delayed = {}
+        return
+
+    def update(self, value):
+        """ Add a value and remove the oldest one if the window is full.
+
+        @param float value: new value
+
+        @return float: median of the values in the window
+        """
+        value = float(value)
+        self._values.append(value)
+        if not self._low or value <= -self._low[0]:
+            heapq.heappush(self._low, -value)
+            self._low_size += 1
+        else:
+            heapq.heappush(self._high, value)
+            self._high_size += 1
+
+        if len(self._values) > self._window:
+            old_value = self._values.popleft()
+            self._delayed[old_value] = self._delayed.get(old_value, 0) + 1
+            if old_value <= -self._low[0]:
+                self._low_size -= 1
+                if old_value == -self._low[0]:
+                    self._prune(self._low, -1)
+            else:
+                self._high_size -= 1
+                if old_value == self._high[0]:
+                    self._prune(self._high, 1)
+        self._balance()
+
+        if self._low_size > self._high_size:
+            return -self._low[0]
+        return (self._high[0] - self._low[0]) / 2
+
+    def _balance(self):
+        """ Move entries between the heaps until the lower half holds the median. """
+        if self._low_size > self._high_size + 1:
+            heapq.heappush(self._high, -heapq.heappop(self._low))
+            self._low_size -= 1
+            self._high_size += 1
+            self._prune(self._low, -1)
+        elif self._low_size < self._high_size:
+            heapq.heappush(self._low, -heapq.heappop(self._high))
+            self._low_size += 1
+            self._high_size -= 1
+            self._prune(self._high, 1)
+        return
+
+    def _prune(self, heap, sign):
+        """ Drop entries marked for deletion from the top of a heap. """
+        while heap:
+            value = sign * heap[0]
+            count = self._delayed.get(value, 0)
+            if count == 0:
+                break
+            if count == 1:
+                del self._delayed[value]
+            else:
+                self._delayed[value] = count - 1
+            heapq.heappop(heap)
+        return
+
+
+class MedianSmoother:
+    """ Running median over the last <window> samples of each channel, O(log window) per sample.
+    """
+
+    def __init__(self, channels, window):
+        self._medians = [RunningMedian(window) for _ in range(channels)]
+        self._result = np.zeros(channels)
+
+    def reset(self):
+        for median in self._medians:
+            median.reset()
+        return
+
+    def update(self, values):
+        """ Add one sample per channel.
+
+        @param numpy.ndarray values: one value per channel
+
+        @return numpy.ndarray: smoothed value per channel
+        """
+        for i, median in enumerate(self._medians):
+            self._result[i] = median.update(values[i])
+        return self._result.copy()
+
+
+class MeanSmoother:
+    """ Running mean over the last <window> samples of each channel, O(1) per sample.
+    """
+
+    def __init__(self, channels, window):
+        self._window = max(1, int(window))
+        self._history = RingBuffer(channels, self._window)
+        self._sum = np.zeros(channels)
+        self._updates = 0
+
+    def reset(self):
+        self._history.clear()
+        self._sum[:] = 0
+        self._updates = 0
+        return
+
+    def update(self, values):
+        """ Add one sample per channel.
+
+        @param numpy.ndarray values: one value per channel
+
+        @return numpy.ndarray: smoothed value per channel
+        """
+        if self._history.filled == self._window:
+            self._sum -= self._history.latest(self._window)[:, 0]
+        self._history.append(values)
+        self._sum += self._history.latest(1)[:, 0]
+        # recalculate the sum from time to time to get rid of accumulated rounding errors
+        self._updates += 1
+        if self._updates >= 100 * self._window:
+            self._updates = 0
+            self._sum = self._history.latest(self._history.filled).sum(axis=1)
+        return self._sum / self._history.filled
+
+
+class ExponentialSmoother:
+    """ Exponential moving average with a decay time of about <window> samples, O(1) per sample.
+    """
+
+    def __init__(self, channels, window):
+        self._alpha = 2 / (max(1, int(window)) + 1)
+        self._result = np.zeros(channels)
+        self._initialized = False
+
+    def reset(self):
+        self._result[:] = 0
+        self._initialized = False
+        return
+
+    def update(self, values):
+        """ Add one sample per channel.
+
+        @param numpy.ndarray values: one value per channel
+
+        @return numpy.ndarray: smoothed value per channel
+        """
+        if self._initialized:
+            self._result += self._alpha * (values - self._result)
+        else:
+            self._result[:] = values
+            self._initialized = True
+        return self._result.copy()
+
+
+# smoothing methods selectable with the config option 'smoothing_method' of CounterLogic
+SMOOTHING_METHODS = {'median': MedianSmoother,
+                     'mean': MeanSmoother,
+                     'exponential': ExponentialSmoother}
 
 
 class CounterLogic(GenericLogic):
@@ -62,6 +251,15 @@ class CounterLogic(GenericLogic):
     counter1 = Connector(interface='SlowCounterInterface')
     savelogic = Connector(interface='SaveLogic')
 
+    # config options
+    # If True, saved samples are streamed to a binary .npy file by a background thread instead of
+    # being collected in RAM until save_data is called.
+    _stream_recording = ConfigOption('stream_recording', False)
+    _recording_chunk_size = ConfigOption('recording_chunk_size', 4096)
+    _recording_recent_length = ConfigOption('recording_recent_length', 10000)
+    # one of the keys of SMOOTHING_METHODS: 'median', 'mean' or 'exponential'
+    _smoothing_method = ConfigOption('smoothing_method', 'median')
+
     # status vars
     _count_length = StatusVar('count_length', 300)
     _smooth_window_length = StatusVar('smooth_window_length', 10)
@@ -106,6 +304,7 @@ class CounterLogic(GenericLogic):
         # Connect to hardware and save logic
         self._counting_device = self.counter1()
         self._save_logic = self.savelogic()
+        self._save_context = self._save_logic.get_save_context('Counter')
 
         # Recall saved app-parameters
         if 'counting_mode' in self._statusVariables:
@@ -114,12 +313,19 @@ class CounterLogic(GenericLogic):
         constraints = self.get_hardware_constraints()
         number_of_detectors = constraints.max_detectors
 
+        if self._smoothing_method not in SMOOTHING_METHODS:
+            self.log.warning('Unknown smoothing method "{0}". Valid methods are {1}. Falling back '
+                             'to "median".'.format(self._smoothing_method,
+                                                   list(SMOOTHING_METHODS)))
+            self._smoothing_method = 'median'
+
         # initialize data arrays
-        self.countdata = np.zeros([len(self.get_channels()), self._count_length])
-        self.countdata_smoothed = np.zeros([len(self.get_channels()), self._count_length])
+        self._init_count_buffers()
         self.rawdata = np.zeros([len(self.get_channels()), self._counting_samples])
         self._already_counted_samples = 0  # For gated counting
         self._data_to_save = []
+        self._recorder = None
+        self._recorder_saved = True
 
         # Flag to stop the loop
         self.stopRequested = False
@@ -140,9 +346,38 @@ class CounterLogic(GenericLogic):
         if self.module_state() == 'locked':
             self._stopCount_wait()
 
+        if self._recorder is not None:
+            self._recorder.stop()
+
         self.sigCountDataNext.disconnect()
         return
 
+    @property
+    def countdata(self):
+        """ Zero-copy view of the raw count trace with shape (channels, count_length).
+
+        The newest sample is found at [:, -1]. The view is backed by the circular buffer and
+        changes while counting. Copy it if a persistent snapshot is needed.
+        """
+        return self._countdata_buffer.ordered_view()
+
+    @property
+    def countdata_smoothed(self):
+        """ Zero-copy view of the smoothed count trace with shape (channels, count_length).
+        """
+        return self._countdata_smoothed_buffer.ordered_view()
+
+    def _init_count_buffers(self):
+        """ (Re-)Allocate the circular buffers for the raw and smoothed count traces and set up
+        the streaming smoother.
+        """
+        channels = len(self.get_channels())
+        self._countdata_buffer = RingBuffer(channels, self._count_length)
+        self._countdata_smoothed_buffer = RingBuffer(channels, self._count_length)
+        self._smoother = SMOOTHING_METHODS[self._smoothing_method](channels,
+                                                                  self._smooth_window_length)
+        return
+
     def get_hardware_constraints(self):
         """
         Retrieve the hardware constrains from the counter device.
@@ -268,6 +503,11 @@ class CounterLogic(GenericLogic):
         if not resume:
             self._data_to_save = []
             self._saving_start_time = time.time()
+            if self._stream_recording:
+                self._create_recorder()
+
+        if self._recorder is not None:
+            self._recorder.start(append=resume)
 
         self._saving = True
 
@@ -286,9 +526,14 @@ class CounterLogic(GenericLogic):
 
         @return dict parameters: Dictionary which contains the saving parameters
         """
-        # stop saving thus saving state has to be set to False
-        self._saving = False
-        self._saving_stop_time = time.time()
+        # stop saving thus saving state has to be set to False. Hold the threadlock, so the count
+        # loop can not record samples into the recorder while it is stopped.
+        with self.threadlock:
+            self._saving = False
+            self._saving_stop_time = time.time()
+            if self._recorder is not None:
+                # only the last partially filled chunk has to be written to disk
+                self._recorder.stop()
 
         # write the parameters:
         parameters = OrderedDict()
@@ -297,6 +542,7 @@ class CounterLogic(GenericLogic):
         parameters['Count frequency (Hz)'] = self._count_frequency
         parameters['Oversampling (Samples)'] = self._counting_samples
         parameters['Smooth Window Length (# of events)'] = self._smooth_window_length
+        parameters['Smoothing method'] = self._smoothing_method
 
         if to_file:
             # If there is a postfix then add separating underscore
@@ -310,16 +556,103 @@ class CounterLogic(GenericLogic):
             for i, detector in enumerate(self.get_channels()):
                 header = header + ',Signal{0} (counts/s)'.format(i)
 
-            data = {header: self._data_to_save}
-            filepath = self._save_logic.get_path_for_module(module_name='Counter')
+            filepath = self._save_context.filepath
 
-            fig = self.draw_figure(data=np.array(self._data_to_save))
-            self._save_logic.save_data(data, filepath=filepath, parameters=parameters,
-                                       filelabel=filelabel, plotfig=fig, delimiter='\t')
+            if self._recorder is None:
+                data = {header: self._data_to_save}
+                fig = self.draw_figure(data=np.array(self._data_to_save))
+                self._save_context.save_data(data, parameters=parameters, filelabel=filelabel,
+                                             plotfig=fig, delimiter='\t')
+            else:
+                # The samples are already on disk. Move the recording next to the parameter file
+                # and only save the parameters and the figure in the usual way.
+                timestamp = datetime.datetime.now()
+                filename = self._save_context.get_labelled_filename(filelabel, timestamp)
+                data_filename = os.path.join(filepath, filename[:-4] + '.npy')
+                os.replace(self._recorder.filename, data_filename)
+                self._recorder.filename = data_filename
+                self._recorder_saved = True
+                parameters['Data file'] = os.path.basename(data_filename)
+
+                recorded_data = self._recorder.get_data()
+                # do not plot more than ~100000 points
+                step = max(1, len(recorded_data) // 100000)
+                fig = self.draw_figure(data=np.asarray(recorded_data[::step]))
+                data = {header: np.empty((0, self._recorder.columns))}
+                self._save_context.save_data(data, parameters=parameters, filename=filename,
+                                             timestamp=timestamp, plotfig=fig, delimiter='\t')
             self.log.info('Counter Trace saved to:\n{0}'.format(filepath))
 
         self.sigSavingStatusChanged.emit(self._saving)
-        return self._data_to_save, parameters
+        return self.get_saved_data(), parameters
+
+    def get_saved_data(self):
+        """ Returns all samples recorded since saving was started.
+
+        @return numpy.ndarray: 2D array with one row (time, counts...) per sample. If stream
+                               recording is enabled this is a read-only memory-mapped array.
+        """
+        if self._recorder is not None:
+            return self._recorder.get_data()
+        return np.array(self._data_to_save)
+
+    def get_recent_saved_data(self, number_of_samples):
+        """ Returns the most recent samples recorded since saving was started.
+
+        @param int number_of_samples: number of samples requested
+
+        @return numpy.ndarray: 2D array with one row (time, counts...) per sample
+        """
+        if self._recorder is not None:
+            return self._recorder.get_recent(number_of_samples)
+        if number_of_samples < 1:
+            return np.empty((0, len(self.get_channels()) + 1))
+        return np.array(self._data_to_save[-number_of_samples:])
+
+    def get_saved_samples_count(self):
+        """ Returns the number of samples recorded since saving was started.
+
+        @return int: number of samples
+        """
+        if self._recorder is not None:
+            return len(self._recorder)
+        return len(self._data_to_save)
+
+    def _create_recorder(self):
+        """ Set up a new StreamRecorder writing into the daily directory of the counter.
+
+        A previous recording which has not been saved by save_data is deleted.
+        """
+        if self._recorder is not None:
+            self._recorder.stop()
+            if not self._recorder_saved and os.path.exists(self._recorder.filename):
+                os.remove(self._recorder.filename)
+
+        if self._counting_mode == CountingMode['GATED']:
+            columns = 2
+        else:
+            columns = len(self.get_channels()) + 1
+        filename = self._save_context.get_labelled_filename(
+            'recording', datetime.datetime.fromtimestamp(self._saving_start_time), '.npy')
+        self._recorder = StreamRecorder(os.path.join(self._save_context.filepath, filename),
+                                        columns=columns,
+                                        chunk_size=self._recording_chunk_size,
+                                        recent_length=self._recording_recent_length)
+        self._recorder_saved = False
+        return
+
+    def _record_samples(self, samples):
+        """ Add samples to the data to save.
+
+        @param numpy.ndarray samples: 2D array with one row (time, counts...) per sample
+        """
+        if self._recorder is not None:
+            # the recording may have been stopped by save_data in the meantime
+            if self._recorder.is_recording:
+                self._recorder.extend(samples)
+        else:
+            self._data_to_save.extend(list(samples))
+        return
 
     def draw_figure(self, data):
         """ Draw figure to save with data file.
@@ -425,8 +758,7 @@ class CounterLogic(GenericLogic):
 
             # initialising the data arrays
             self.rawdata = np.zeros([len(self.get_channels()), self._counting_samples])
-            self.countdata = np.zeros([len(self.get_channels()), self._count_length])
-            self.countdata_smoothed = np.zeros([len(self.get_channels()), self._count_length])
+            self._init_count_buffers()
             self._sampling_data = np.empty([len(self.get_channels()), self._counting_samples])
 
             # the sample index for gated counting
@@ -532,10 +864,11 @@ class CounterLogic(GenericLogic):
         parameters['Count frequency (Hz)'] = self._count_frequency
         parameters['Oversampling (Samples)'] = self._counting_samples
         parameters['Smooth Window Length (# of events)'] = self._smooth_window_length
+        parameters['Smoothing method'] = self._smoothing_method
 
-        filepath = self._save_logic.get_path_for_module(module_name='Counter')
-        self._save_logic.save_data(data, filepath=filepath, parameters=parameters,
-                                   filelabel=filelabel, delimiter='\t')
+        filepath = self._save_context.filepath
+        self._save_context.save_data(data, parameters=parameters, filelabel=filelabel,
+                                     delimiter='\t')
 
         self.log.debug('Current Counter Trace saved to: {0}'.format(filepath))
         return data, filepath, parameters, filelabel
@@ -547,44 +880,42 @@ class CounterLogic(GenericLogic):
         """
         return self._counting_device.get_counter_channels()
 
+    def _append_count_sample(self):
+        """
+        Appends the averaged raw data to the circular count buffers and updates the smoothed trace
+        """
+        new_counts = np.average(self.rawdata, axis=1)
+        # remember the new count data in circular array (no data is moved)
+        self._countdata_buffer.append(new_counts)
+        self._countdata_smoothed_buffer.append(0)
+        # update the smoother and save the result in the newest half window of the smoothed trace
+        self._countdata_smoothed_buffer.set_latest(self._smoother.update(new_counts),
+                                                   int(self._smooth_window_length / 2) + 1)
+        return
+
     def _process_data_continous(self):
         """
         Processes the raw data from the counting device
         @return:
         """
-        for i, ch in enumerate(self.get_channels()):
-            # remember the new count data in circular array
-            self.countdata[i, 0] = np.average(self.rawdata[i])
-        # move the array to the left to make space for the new data
-        self.countdata = np.roll(self.countdata, -1, axis=1)
-        # also move the smoothing array
-        self.countdata_smoothed = np.roll(self.countdata_smoothed, -1, axis=1)
-        # calculate the median and save it
-        window = -int(self._smooth_window_length / 2) - 1
-        for i, ch in enumerate(self.get_channels()):
-            self.countdata_smoothed[i, window:] = np.median(self.countdata[i,
-                                                            -self._smooth_window_length:])
+        self._append_count_sample()
 
         # save the data if necessary
         if self._saving:
-             # if oversampling is necessary
+            chans = self.get_channels()
+            # if oversampling is necessary
             if self._counting_samples > 1:
-                chans = self.get_channels()
-                self._sampling_data = np.empty([len(chans) + 1, self._counting_samples])
-                self._sampling_data[0, :] = time.time() - self._saving_start_time
-                for i, ch in enumerate(chans):
-                    self._sampling_data[i+1, 0] = self.rawdata[i]
-
-                self._data_to_save.extend(list(self._sampling_data))
+                self._sampling_data = np.empty([self._counting_samples, len(chans) + 1])
+                self._sampling_data[:, 0] = time.time() - self._saving_start_time
+                self._sampling_data[:, 1:] = self.rawdata.transpose()
+                self._record_samples(self._sampling_data)
             # if we don't want to use oversampling
             else:
                 # append tuple to data stream (timestamp, average counts)
-                chans = self.get_channels()
-                newdata = np.empty((len(chans) + 1, ))
-                newdata[0] = time.time() - self._saving_start_time
-                for i, ch in enumerate(chans):
-                    newdata[i+1] = self.countdata[i, -1]
-                self._data_to_save.append(newdata)
+                newdata = np.empty((1, len(chans) + 1))
+                newdata[0, 0] = time.time() - self._saving_start_time
+                newdata[0, 1:] = self.countdata[:, -1]
+                self._record_samples(newdata)
         return
 
     def _process_data_gated(self):
@@ -592,15 +923,7 @@ class CounterLogic(GenericLogic):
         Processes the raw data from the counting device
         @return:
         """
-        # remember the new count data in circular array
-        self.countdata[0] = np.average(self.rawdata[0])
-        # move the array to the left to make space for the new data
-        self.countdata = np.roll(self.countdata, -1)
-        # also move the smoothing array
-        self.countdata_smoothed = np.roll(self.countdata_smoothed, -1)
-        # calculate the median and save it
-        self.countdata_smoothed[-int(self._smooth_window_length / 2) - 1:] = np.median(
-            self.countdata[-self._smooth_window_length:])
+        self._append_count_sample()
 
         # save the data if necessary
         if self._saving:
@@ -609,12 +932,12 @@ class CounterLogic(GenericLogic):
                 self._sampling_data = np.empty((self._counting_samples, 2))
                 self._sampling_data[:, 0] = time.time() - self._saving_start_time
                 self._sampling_data[:, 1] = self.rawdata[0]
-                self._data_to_save.extend(list(self._sampling_data))
+                self._record_samples(self._sampling_data)
             # if we don't want to use oversampling
             else:
                 # append tuple to data stream (timestamp, average counts)
-                self._data_to_save.append(np.array((time.time() - self._saving_start_time,
-                                                    self.countdata[-1])))
+                self._record_samples(np.array([[time.time() - self._saving_start_time,
+                                                self.countdata[0, -1]]]))
         return
 
     def _process_data_finite_gated(self):
@@ -622,19 +945,16 @@ class CounterLogic(GenericLogic):
         Processes the raw data from the counting device
         @return:
         """
-        if self._already_counted_samples+len(self.rawdata[0]) >= len(self.countdata):
-            needed_counts = len(self.countdata) - self._already_counted_samples
-            self.countdata[0:needed_counts] = self.rawdata[0][0:needed_counts]
-            self.countdata = np.roll(self.countdata, -needed_counts)
+        if self._already_counted_samples + self.rawdata.shape[1] >= self._count_length:
+            needed_counts = self._count_length - self._already_counted_samples
+            self._countdata_buffer.extend(self.rawdata[:, :needed_counts])
             self._already_counted_samples = 0
             self.stopRequested = True
         else:
-            # replace the first part of the array with the new data:
-            self.countdata[0:len(self.rawdata[0])] = self.rawdata[0]
-            # roll the array by the amount of data it had been inserted:
-            self.countdata = np.roll(self.countdata, -len(self.rawdata[0]))
+            # append the new data to the circular array
+            self._countdata_buffer.extend(self.rawdata)
             # increment the index counter:
-            self._already_counted_samples += len(self.rawdata[0])
+            self._already_counted_samples += self.rawdata.shape[1]
         return
 
     def _stopCount_wait(self, timeout=5.0):
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+"""
+This file contains the bit-packed container for sampled digital channels.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import numpy as np
+
+
+def digital_word_dtype(number_of_channels):
+    """ Smallest unsigned integer type holding one bit for each digital channel.
+
+    @param int number_of_channels: number of digital channels
+
+    @return numpy.dtype: uint8, uint16, uint32 or uint64
+    """
+    for dtype in (np.uint8, np.uint16, np.uint32, np.uint64):
+        if number_of_channels <= 8 * np.dtype(dtype).itemsize:
+            return np.dtype(dtype)
+    raise ValueError('At most 64 digital channels can be packed into one sample word, {0} given.'
+                     ''.format(number_of_channels))
+
+
+def pack_digital_words(channel_states):
+    """ Pack digital channel states into one word per sample.
+
+    @param numpy.ndarray channel_states: bool array with shape (channels, samples)
+
+    @return numpy.ndarray: 1D array of unsigned integers. Bit i holds the state of channel i.
+    """
+    channel_states = np.asarray(channel_states, dtype=bool)
+    dtype = digital_word_dtype(channel_states.shape[0])
+    words = np.zeros(channel_states.shape[1], dtype=dtype)
+    for channel, states in enumerate(channel_states):
+        words |= states.astype(dtype) << dtype.type(channel)
+    return words
+
+
+class PackedDigitalSamples:
+    """
+    Sampled digital channels stored as one unsigned integer word per sample.
+
+    Bit i of each word holds the logic level of the i-th active digital channel (in the order of
+    the activation config), so 8 channels need one byte per sample instead of one byte per sample
+    and channel. This is also the native representation of the FPGA and PulseStreamer pulse
+    generators.
+
+    The words can be any 1D array (e.g. a numpy.memmap). view() gives access to a range of samples
+    without copying. Converting the container with numpy.asarray yields the bool array with shape
+    (channels, samples) the hardware modules expect for direct writing.
+    """
+    def __init__(self, number_of_channels, words):
+        """
+        @param int number_of_channels: number of digital channels
+        @param numpy.ndarray words: 1D array of digital_word_dtype(number_of_channels) with one
+                                    word per sample
+        """
+        if words.ndim != 1 or words.dtype != digital_word_dtype(number_of_channels):
+            raise ValueError('Words of {0:d} digital channels must be a 1D array of type {1}.'
+                             ''.format(number_of_channels,
+                                       digital_word_dtype(number_of_channels)))
+        self.number_of_channels = int(number_of_channels)
+        self.words = words
+
+    @classmethod
+    def empty(cls, number_of_channels, number_of_samples):
+        """ Container with uninitialized samples.
+
+        @param int number_of_channels: number of digital channels
+        @param int number_of_samples: number of samples per channel
+
+        @return PackedDigitalSamples: the new container
+        """
+        return cls(number_of_channels,
+                   np.empty(number_of_samples, dtype=digital_word_dtype(number_of_channels)))
+
+    @classmethod
+    def from_bool_array(cls, channel_states):
+        """ Pack a bool array with shape (channels, samples).
+
+        @param numpy.ndarray channel_states: logic levels of each channel
+
+        @return PackedDigitalSamples: the new container
+        """
+        channel_states = np.asarray(channel_states, dtype=bool)
+        return cls(channel_states.shape[0], pack_digital_words(channel_states))
+
+    def __len__(self):
+        return self.words.size
+
+    def __array__(self, dtype=None, copy=None):
+        states = self.to_bool_array()
+        return states if dtype is None else states.astype(dtype, copy=False)
+
+    @property
+    def shape(self):
+        """ Shape of the corresponding unpacked array (channels, samples). """
+        return self.number_of_channels, self.words.size
+
+    @property
+    def nbytes(self):
+        return self.words.nbytes
+
+    def view(self, start, stop):
+        """ Container sharing the samples [start, stop) with this one.
+
+        @param int start: first sample
+        @param int stop: sample after the last one
+
+        @return PackedDigitalSamples: the view
+        """
+        return PackedDigitalSamples(self.number_of_channels, self.words[start:stop])
+
+    def bits(self, channel):
+        """ Logic levels of a single channel as 0 or 1.
+
+        @param int channel: index of the channel in the container
+
+        @return numpy.ndarray: uint8 array with one value per sample
+        """
+        if not 0 <= channel < self.number_of_channels:
+            raise IndexError('Digital channel index {0} out of range for {1:d} channels.'
+                             ''.format(channel, self.number_of_channels))
+        bits = np.right_shift(self.words, self.words.dtype.type(channel))
+        bits &= 1
+        return bits.astype(np.uint8, copy=False)
+
+    def channel(self, channel):
+        """ Logic levels of a single channel.
+
+        @param int channel: index of the channel in the container
+
+        @return numpy.ndarray: bool array with one value per sample
+        """
+        return self.bits(channel).view(bool)
+
+    def to_bool_array(self):
+        """ Unpack all channels.
+
+        @return numpy.ndarray: bool array with shape (channels, samples)
+        """
+        states = np.empty(self.shape, dtype=bool)
+        for channel in range(self.number_of_channels):
+            states[channel] = self.channel(channel)
+        return states
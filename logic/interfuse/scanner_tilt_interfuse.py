@@ -19,13 +19,15 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 """
 
 import copy
+import numpy as np
 
 from core.module import Connector
 from logic.generic_logic import GenericLogic
 from interface.confocal_scanner_interface import ConfocalScannerInterface
+from interface.confocal_frame_scanner_interface import ConfocalFrameScannerInterface
 
 
-class ScannerTiltInterfuse(GenericLogic, ConfocalScannerInterface):
+class ScannerTiltInterfuse(GenericLogic, ConfocalScannerInterface, ConfocalFrameScannerInterface):
     """ This interfuse produces a Z correction corresponding to a tilted surface.
     """
 
@@ -186,9 +188,60 @@ class ScannerTiltInterfuse(GenericLogic, ConfocalScannerInterface):
         @return float[]: the photon counts per second
         """
         if self.tiltcorrection:
-            line_path[:][2] += self._calc_dz(line_path[:][0], line_path[:][1])
+            # correct a copy, the caller may scan the same path again
+            line_path = np.array(line_path, dtype=float)
+            line_path[2] += self._calc_dz(line_path[0], line_path[1])
         return self._scanning_device.scan_line(line_path, pixel_clock)
 
+    def supports_frame_scan(self):
+        """ Whether the connected scanner can scan frames.
+
+        @return bool: True if the connected scanner can scan frames
+        """
+        return (isinstance(self._scanning_device, ConfocalFrameScannerInterface)
+                and self._scanning_device.supports_frame_scan())
+
+    def set_up_frame(self, frame_path, pixels):
+        """ Writes the path of a frame to the scanner.
+
+        @param float[k][n][m] frame_path: k lines with n axes and m points each, defining the
+                                          positions of the frame
+        @param int pixels: number of points at the start of each line which are pixels of the
+                           image
+
+        @return int: error code (0:OK, -1:error)
+        """
+        if not self.supports_frame_scan():
+            self.log.error('The connected scanner cannot scan frames.')
+            return -1
+        if self.tiltcorrection:
+            frame_path = np.array(frame_path, dtype=float)
+            frame_path[:, 2] += self._calc_dz(frame_path[:, 0], frame_path[:, 1])
+        return self._scanning_device.set_up_frame(frame_path, pixels)
+
+    def start_frame(self, pixel_clock=False):
+        """ Starts the scan of the frame written with set_up_frame.
+
+        @param bool pixel_clock: whether we need to output a pixel clock for the frame
+
+        @return int: error code (0:OK, -1:error)
+        """
+        return self._scanning_device.start_frame(pixel_clock)
+
+    def get_frame_line(self):
+        """ Waits until the next line of the running frame is scanned and returns its counts.
+
+        @return float[k][m]: the photon counts per second of all k points of the line
+        """
+        return self._scanning_device.get_frame_line()
+
+    def stop_frame(self):
+        """ Stops the scan of the frame, also before all lines are scanned.
+
+        @return int: error code (0:OK, -1:error)
+        """
+        return self._scanning_device.stop_frame()
+
     def close_scanner(self):
         """ Closes the scanner and cleans up afterwards.
 
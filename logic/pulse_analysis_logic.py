@@ -45,6 +45,11 @@ class PulseAnalysisLogic(GenericLogic):
 
     def __init__(self, config, **kwargs):
         super().__init__(config=config, **kwargs)
+        # laser data, the cumulative sum of each laser pulse and the window sums computed for it
+        # (see _window_sums)
+        self._prefix_laser_data = None
+        self._laser_data_prefix = None
+        self._laser_window_sums = dict()
 
     def on_activate(self):
         """ Initialisation performed during activation of the module.
@@ -98,3 +103,60 @@ class PulseAnalysisLogic(GenericLogic):
 
         signal_data, measuring_error = self.analysis_methods[self.analysis_settings['current_method']](laser_data)
         return signal_data, measuring_error
+
+    def _window_sums(self, laser_data, start_bin, stop_bin):
+        """ Sum of the counts within a window of all laser pulses.
+
+        For integer count data the sums are computed from the cumulative sum of each laser pulse.
+        It is kept as long as the same laser_data array is analyzed, so analyzing the same data
+        with different windows does not touch the counts again. The window sums themselves are
+        kept as well and updated by add_laser_counts.
+
+        @param numpy.ndarray laser_data: 2D array with the counts, dimensions: 0: laser number,
+                                         1: time bin
+        @param int start_bin: first bin of the window (like slicing laser_data[:, start:stop])
+        @param int stop_bin: bin after the last bin of the window
+
+        @return tuple: (float numpy.ndarray with the sum for each laser pulse, number of bins of
+                       the window)
+        """
+        start, stop, step = slice(start_bin, stop_bin).indices(laser_data.shape[1])
+        length = max(stop - start, 0)
+        if length == 0:
+            return np.zeros(laser_data.shape[0], dtype=float), 0
+        if not np.issubdtype(laser_data.dtype, np.integer):
+            return np.sum(laser_data[:, start:stop], axis=1, dtype=float), length
+
+        if laser_data is not self._prefix_laser_data:
+            self._laser_data_prefix = None
+            self._laser_window_sums = dict()
+            self._prefix_laser_data = laser_data
+        if (start, stop) not in self._laser_window_sums:
+            if self._laser_data_prefix is None:
+                self._laser_data_prefix = np.zeros((laser_data.shape[0], laser_data.shape[1] + 1),
+                                                   dtype='int64')
+                np.cumsum(laser_data, axis=1, out=self._laser_data_prefix[:, 1:])
+            self._laser_window_sums[(start, stop)] = (self._laser_data_prefix[:, stop] -
+                                                      self._laser_data_prefix[:, start])
+        return self._laser_window_sums[(start, stop)].astype(float), length
+
+    def add_laser_counts(self, laser_data, laser_indices, bin_indices, counts):
+        """ Add counts to the laser pulses in place and update the kept window sums accordingly.
+
+        Only the changed bins are touched, so the window sums of a growing measurement can be
+        updated at a cost independent of the size of laser_data.
+
+        @param numpy.ndarray laser_data: 2D integer array of the laser pulses to add the counts to
+        @param numpy.ndarray laser_indices: laser pulse of each count
+        @param numpy.ndarray bin_indices: time bin within the laser pulse of each count
+        @param numpy.ndarray counts: the counts to add
+        """
+        np.add.at(laser_data, (laser_indices, bin_indices), counts)
+        if laser_data is not self._prefix_laser_data:
+            return
+        # the cumulative sums are outdated, the window sums are updated
+        self._laser_data_prefix = None
+        for (start, stop), sums in self._laser_window_sums.items():
+            in_window = (bin_indices >= start) & (bin_indices < stop)
+            np.add.at(sums, laser_indices[in_window], counts[in_window])
+        return
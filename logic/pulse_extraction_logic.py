@@ -25,6 +25,7 @@ import inspect
 import numpy as np
 
 from collections import OrderedDict
+from scipy import ndimage
 from core.module import StatusVar
 from core.util.modules import get_main_dir
 from logic.generic_logic import GenericLogic
@@ -41,7 +42,11 @@ class PulseExtractionLogic(GenericLogic):
                                                                     'count_threshold': 10,
                                                                     'threshold_tolerance': 20e-9,
                                                                     'min_laser_length': 200e-9,
-                                                                    'current_method': 'conv_deriv'})
+                                                                    'current_method': 'conv_deriv',
+                                                                    'reuse_laser_edges': False})
+    # standard deviation (in bins) of the gaussian filter used to locate the laser edges precisely
+    # (the same as in the conv_deriv extraction methods)
+    _edge_ref_std_dev = 10
 
     def __init__(self, config, **kwargs):
         super().__init__(config=config, **kwargs)
@@ -52,6 +57,8 @@ class PulseExtractionLogic(GenericLogic):
             self.log.debug('{0}: {1}'.format(key, config[key]))
 
         self.number_of_lasers = 50
+        # laser edges found by the last full ungated extraction (see extract_laser_pulses)
+        self._laser_edge_cache = None
 
     def on_activate(self):
         """ Initialisation performed during activation of the module.
@@ -99,6 +106,12 @@ class PulseExtractionLogic(GenericLogic):
         @param count_data:
         @param is_gated:
         @return:
+
+        If the extraction setting "reuse_laser_edges" is True and the ungated method is
+        "conv_deriv", the rising and falling edges found in an ungated timetrace are kept. The next extractions only check if the derivative of the
+        timetrace still has its extrema at these edges (within a small window around each edge)
+        and slice the laser pulses at the known positions. A full extraction is only performed if
+        this validation fails.
         """
 
         # convert time to bin
@@ -111,6 +124,107 @@ class PulseExtractionLogic(GenericLogic):
         if is_gated:
             return_dict = self.gated_extraction_methods[self.extraction_settings['current_method']](count_data)
         else:
+            if self._reuse_laser_edges():
+                return_dict = self._extract_at_cached_edges(count_data)
+                if return_dict is not None:
+                    return return_dict
             return_dict = self.ungated_extraction_methods[self.extraction_settings['current_method']](count_data)
+            self._cache_laser_edges(count_data, return_dict)
+        return return_dict
+
+    def clear_laser_edge_cache(self):
+        """ Forget the laser edges of the last ungated extraction. The next extraction is a full
+        one.
+        """
+        self._laser_edge_cache = None
+        return
+
+    def _reuse_laser_edges(self):
+        """ Whether the laser edges of ungated extractions are cached and reused. Only the slicing
+        of the "conv_deriv" method is reproduced by _extract_at_cached_edges.
+        """
+        return (self.extraction_settings.get('reuse_laser_edges', False)
+                and self.extraction_settings['current_method'] == 'conv_deriv')
+
+    def _laser_edge_cache_key(self, count_data):
+        """ Everything the validity of cached laser edges depends on besides the data itself. """
+        return (tuple(sorted(self.extraction_settings.items())),
+                self.number_of_lasers,
+                count_data.size)
+
+    def _cache_laser_edges(self, count_data, return_dict):
+        """ Keep the laser edges found by a full ungated extraction.
+
+        @param numpy.ndarray count_data: the ungated timetrace
+        @param dict return_dict: the result of the extraction method
+        """
+        self._laser_edge_cache = None
+        if not self._reuse_laser_edges():
+            return
+        rising_ind = np.asarray(return_dict['laser_indices_rising'], dtype='int64')
+        falling_ind = np.asarray(return_dict['laser_indices_falling'], dtype='int64')
+        # only keep complete results of successful extractions
+        if (rising_ind.shape != (self.number_of_lasers,) or
+                falling_ind.shape != (self.number_of_lasers,) or
+                np.max(falling_ind - rising_ind, initial=0) <= 0 or
+                np.sum(return_dict['laser_counts_arr']) < 1):
+            return
+        self._laser_edge_cache = {'key': self._laser_edge_cache_key(count_data),
+                                  'rising': rising_ind.copy(),
+                                  'falling': falling_ind.copy()}
+        return
+
+    def _extract_at_cached_edges(self, count_data):
+        """ Extract the laser pulses of an ungated timetrace at the cached laser edges.
+
+        The derivative of the smoothed timetrace is only computed in windows of
+        +-2*conv_std_dev around the cached edges. The edges are valid if the maximum (rising) or
+        minimum (falling) of each window lies inside the window and not at its border, i.e. the
+        derivative still has a local extremum close to each cached edge.
+
+        @param numpy.ndarray count_data: the ungated timetrace
+
+        @return dict: the extracted laser pulses and the edges or None if the cached edges are
+                      not valid (anymore)
+        """
+        cache = self._laser_edge_cache
+        if cache is None or cache['key'] != self._laser_edge_cache_key(count_data):
+            return None
+        std_dev = self.extraction_settings['conv_std_dev']
+        half_window = max(int(2 * std_dev), 1)
+        # margin needed for the gaussian filter (truncated at 4 sigma) and the gradient
+        margin = 4 * self._edge_ref_std_dev + 2
+
+        edges = np.concatenate((cache['rising'], cache['falling']))
+        offsets = np.arange(-half_window - margin, half_window + margin + 1)
+        windows = count_data.take(edges[:, np.newaxis] + offsets, mode='clip').astype(float)
+        windows_deriv = np.gradient(ndimage.gaussian_filter1d(windows, self._edge_ref_std_dev,
+                                                              axis=1), axis=1)
+        windows_deriv = windows_deriv[:, margin:-margin]
+
+        rising_deriv = windows_deriv[:self.number_of_lasers]
+        falling_deriv = windows_deriv[self.number_of_lasers:]
+        rising_shift = np.argmax(rising_deriv, axis=1) - half_window
+        falling_shift = np.argmin(falling_deriv, axis=1) - half_window
+        if (np.any(np.abs(rising_shift) >= half_window) or
+                np.any(np.abs(falling_shift) >= half_window) or
+                np.any(np.max(rising_deriv, axis=1) <= 0) or
+                np.any(np.min(falling_deriv, axis=1) >= 0)):
+            self.log.debug('Cached laser edges are not valid anymore. Performing full pulse '
+                           'extraction.')
+            return None
+
+        # slice all laser pulses with a single gather. Bins behind the end of the timetrace are 0.
+        rising_ind = cache['rising']
+        falling_ind = cache['falling']
+        laser_length = np.max(falling_ind - rising_ind)
+        laser_bins = rising_ind[:, np.newaxis] + np.arange(laser_length)
+        laser_arr = count_data.take(laser_bins, mode='clip').astype('int64')
+        laser_arr[laser_bins >= count_data.size] = 0
+
+        return_dict = dict()
+        return_dict['laser_counts_arr'] = laser_arr
+        return_dict['laser_indices_rising'] = rising_ind.copy()
+        return_dict['laser_indices_falling'] = falling_ind.copy()
         return return_dict
 
@@ -78,6 +78,13 @@ def ungated_conv_deriv(self, count_data):
         self.conv_std_dev (2*self.conv_std_dev to the left and
         2*self.conv_std_dev) are set to zero.
 
+        To avoid searching the whole array for every laser pulse, the array is
+        divided into blocks of about sqrt(size) bins and the position of the
+        maximum and minimum of each block is kept. A search only compares the
+        block extrema and only the blocks touched by setting entries to zero
+        are updated (see _block_extremum_indices). The result is identical to
+        searching the whole array with argmax/argmin.
+
         The crucial part is the knowledge of the number of laser pulses and
         the choice of the appropriate std_dev for the gauss filter.
 
@@ -118,12 +125,16 @@ def ungated_conv_deriv(self, count_data):
     rising_ind = np.empty([self.number_of_lasers], 'int64')
     falling_ind = np.empty([self.number_of_lasers], 'int64')
 
+    # positions of the maximum and minimum within each block of conv_deriv
+    block_size = int(np.sqrt(conv_deriv.size)) + 1
+    block_max_ind, block_min_ind = self._block_extremum_indices(conv_deriv, block_size)
+
     # Find as many rising and falling flanks as there are laser pulses in
     # the trace:
     for i in range(self.number_of_lasers):
         # save the index of the absolute maximum of the derived time trace
         # as rising edge position
-        rising_ind[i] = np.argmax(conv_deriv)
+        rising_ind[i] = block_max_ind[np.argmax(conv_deriv[block_max_ind])]
 
         # refine the rising edge detection, by using a small and fixed
         # conv_std_dev parameter to find the inflection point more precise
@@ -151,10 +162,12 @@ def ungated_conv_deriv(self, count_data):
         else:
             del_ind_stop = rising_ind[i] + int(2 * self.extraction_settings['conv_std_dev'])
             conv_deriv[del_ind_start:del_ind_stop] = 0
+            self._update_block_extremum_indices(conv_deriv, block_size, block_max_ind,
+                                                block_min_ind, del_ind_start, del_ind_stop)
 
         # save the index of the absolute minimum of the derived time trace
         # as falling edge position
-        falling_ind[i] = np.argmin(conv_deriv)
+        falling_ind[i] = block_min_ind[np.argmin(conv_deriv[block_min_ind])]
 
         # refine the falling edge detection, by using a small and fixed
         # conv_std_dev parameter to find the inflection point more precise
@@ -182,6 +195,8 @@ def ungated_conv_deriv(self, count_data):
         else:
             del_ind_stop = falling_ind[i] + int(2 * self.extraction_settings['conv_std_dev'])
         conv_deriv[del_ind_start:del_ind_stop] = 0
+        self._update_block_extremum_indices(conv_deriv, block_size, block_max_ind, block_min_ind,
+                                            del_ind_start, del_ind_stop)
 
     # sort all indices of rising and falling flanks
     rising_ind.sort()
@@ -318,6 +333,53 @@ def _convolve_derive(self, data, std_dev):
     return conv_deriv
 
 
+def _block_extremum_indices(self, data, block_size, first_block=0, last_block=None):
+    """ Find the positions of the maximum and minimum within blocks of an array.
+
+    @param numpy.ndarray data: 1D array
+    @param int block_size: number of entries per block (the last block can be shorter)
+    @param int first_block: index of the first block to search
+    @param int last_block: index after the last block to search (None: up to the end of data)
+
+    @return tuple: (max_ind, min_ind) 1D arrays with the index in data of the first maximum and
+                   the first minimum of each block
+    """
+    if last_block is None:
+        last_block = -(-data.size // block_size)
+    start = first_block * block_size
+    stop = min(last_block * block_size, data.size)
+    full_blocks = (stop - start) // block_size
+    full_stop = start + full_blocks * block_size
+    blocks = data[start:full_stop].reshape(full_blocks, block_size)
+    offsets = start + block_size * np.arange(full_blocks, dtype='int64')
+    max_ind = offsets + np.argmax(blocks, axis=1)
+    min_ind = offsets + np.argmin(blocks, axis=1)
+    if full_stop < stop:
+        # shorter last block
+        max_ind = np.append(max_ind, full_stop + np.argmax(data[full_stop:stop]))
+        min_ind = np.append(min_ind, full_stop + np.argmin(data[full_stop:stop]))
+    return max_ind, min_ind
+
+
+def _update_block_extremum_indices(self, data, block_size, max_ind, min_ind, start, stop):
+    """ Update the block extrema (see _block_extremum_indices) after changing data[start:stop].
+
+    @param numpy.ndarray data: 1D array
+    @param int block_size: number of entries per block
+    @param numpy.ndarray max_ind: index of the maximum of each block, updated in place
+    @param numpy.ndarray min_ind: index of the minimum of each block, updated in place
+    @param int start: index of the first changed entry
+    @param int stop: index after the last changed entry
+    """
+    if stop <= start:
+        return
+    first_block = start // block_size
+    last_block = (stop - 1) // block_size + 1
+    max_ind[first_block:last_block], min_ind[first_block:last_block] = \
+        self._block_extremum_indices(data, block_size, first_block, last_block)
+    return
+
+
 def _find_consecutive(self, data):
     return np.split(data, np.where(np.diff(data) != 1)[0]+1)
 
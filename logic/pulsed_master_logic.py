@@ -61,7 +61,7 @@ class PulsedMasterLogic(GenericLogic):
     sigMeasurementSequenceSettingsChanged = QtCore.Signal(np.ndarray, int, float, list, bool)
     sigPulseGeneratorSettingsChanged = QtCore.Signal(float, str, dict, bool)
     sigUploadAsset = QtCore.Signal(str)
-    sigDirectWriteEnsemble = QtCore.Signal(str, np.ndarray, np.ndarray)
+    sigDirectWriteEnsemble = QtCore.Signal(str, object, object)
     sigDirectWriteSequence = QtCore.Signal(str, list)
     sigLoadAsset = QtCore.Signal(str, dict)
     sigClearPulseGenerator = QtCore.Signal()
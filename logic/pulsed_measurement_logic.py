@@ -30,9 +30,99 @@ from core.module import Connector, ConfigOption, StatusVar
 from core.util.mutex import Mutex
 from core.util.network import netobtain
 from core.util import units
+from logic.digital_samples import PackedDigitalSamples
 from logic.generic_logic import GenericLogic
 
 
+class PulsedAnalysisWorker(QtCore.QObject):
+    """ Helper class analysing the raw data of a pulsed measurement in a separate thread.
+
+    Only the latest submitted raw data is kept. Raw data submitted while the previous one is still
+    waiting for the analysis replaces (drops) it, so the analysis never lags behind the fast
+    counter polling and the polling never waits for the analysis.
+    """
+    sigAnalyse = QtCore.Signal()
+
+    def __init__(self, parentclass):
+        super().__init__()
+
+        # remember the reference to the parent class to access functions and settings
+        self._parentclass = parentclass
+        self._lock = Mutex()
+        self._snapshot = None
+        self._submitted = 0
+        self._dropped = 0
+        self._analysed = 0
+        self._latency = 0.0
+        self._duration = 0.0
+        self.sigAnalyse.connect(self._analyse_latest, QtCore.Qt.QueuedConnection)
+
+    def submit(self, raw_data, measurement_id):
+        """ Hand over raw data to analyse. Returns immediately.
+
+        @param numpy.ndarray raw_data: the raw data. It must not be changed afterwards.
+        @param int measurement_id: the measurement the raw data belongs to
+        """
+        with self._lock:
+            pending = self._snapshot is not None
+            if pending:
+                self._dropped += 1
+            self._snapshot = (raw_data, measurement_id, time.time())
+            self._submitted += 1
+        if not pending:
+            self.sigAnalyse.emit()
+        return
+
+    def get_statistics(self):
+        """ Statistics of the analysis.
+
+        @return dict: queue_depth (raw data waiting for the analysis, 0 or 1), the number of
+                      submitted, dropped and analysed raw data, latency (time in s from
+                      submission to the end of the last analysis) and duration (time in s of the
+                      last analysis)
+        """
+        with self._lock:
+            return {'queue_depth': int(self._snapshot is not None),
+                    'submitted': self._submitted,
+                    'dropped': self._dropped,
+                    'analysed': self._analysed,
+                    'latency': self._latency,
+                    'duration': self._duration}
+
+    def analyse_pending(self):
+        """ Analyses the raw data waiting for the analysis right away in the calling thread.
+
+        Waits for an analysis running in the thread of the worker to finish first.
+        """
+        self._analyse_latest()
+        return
+
+    def _analyse_latest(self):
+        """ Analyses the latest submitted raw data. Usually runs in the thread of the worker.
+        """
+        with self._lock:
+            snapshot = self._snapshot
+            self._snapshot = None
+        if snapshot is None:
+            return
+        raw_data, measurement_id, submit_time = snapshot
+        start_time = time.time()
+        try:
+            analysed = self._parentclass._analyse_snapshot(raw_data, measurement_id)
+        except Exception:
+            self._parentclass.log.exception('Analysis of pulsed measurement raw data failed.')
+            return
+        if not analysed:
+            return
+        stop_time = time.time()
+        with self._lock:
+            self._analysed += 1
+            self._latency = stop_time - submit_time
+            self._duration = stop_time - start_time
+        self._parentclass.sigAnalysisStatisticsUpdated.emit(self.get_statistics())
+        return
+
+
 class PulsedMeasurementLogic(GenericLogic):
     """
     This is the Logic class for the control of pulsed measurements.
@@ -50,6 +140,12 @@ class PulsedMeasurementLogic(GenericLogic):
     pulsegenerator = Connector(interface='PulserInterface')
 
     raw_data_save_type = ConfigOption('raw_data_save_type', 'text')
+    # Update the laser pulses with the counts added since the last analysis instead of extracting
+    # them anew from the whole timetrace. Requires a fast counter returning the accumulated trace.
+    incremental_analysis = ConfigOption('incremental_analysis', False)
+    # Analyse the raw data in a separate thread (see PulsedAnalysisWorker) instead of the thread
+    # of this module, which then only polls the fast counter.
+    analysis_thread = ConfigOption('analysis_thread', False)
 
     # status vars
     fast_counter_record_length = StatusVar(default=3.e-6)
@@ -98,6 +194,7 @@ class PulsedMeasurementLogic(GenericLogic):
     sigAnalysisMethodsUpdated = QtCore.Signal(dict)
     sigExtractionSettingsUpdated = QtCore.Signal(dict)
     sigExtractionMethodsUpdated = QtCore.Signal(dict)
+    sigAnalysisStatisticsUpdated = QtCore.Signal(dict)
 
     def __init__(self, config, **kwargs):
         super().__init__(config=config, **kwargs)
@@ -159,6 +256,14 @@ class PulsedMeasurementLogic(GenericLogic):
         self.show_laser_index = 0
         self.saved_raw_data = OrderedDict()  # temporary saved raw data
         self.recalled_raw_data = None  # the currently recalled raw data to add
+        # laser pulse positions and raw data of the last analysis (see _update_laser_data)
+        self._incremental_state = None
+        self._extraction_outdated = True
+
+        # analysis of the raw data, optionally in a separate thread
+        self._analysis_lock = Mutex()
+        self._analysis_worker = None
+        self._measurement_id = 0
 
         # for fit:
         self.fc = None  # Fit container
@@ -226,6 +331,13 @@ class PulsedMeasurementLogic(GenericLogic):
 
         # recalled saved raw data
         self.recalled_raw_data = None
+
+        # create the analysis worker and let it live on its own thread
+        if self.analysis_thread:
+            self._analysis_worker = PulsedAnalysisWorker(self)
+            thread = self._manager.tm.newThread(self._analysis_thread_name)
+            self._analysis_worker.moveToThread(thread)
+            thread.start()
         return
 
     def on_deactivate(self):
@@ -235,12 +347,30 @@ class PulsedMeasurementLogic(GenericLogic):
         if self.module_state() != 'idle' and self.module_state() != 'deactivated':
             self.stop_pulsed_measurement()
 
+        if self._analysis_worker is not None:
+            self._manager.tm.quitThread(self._analysis_thread_name)
+            self._manager.tm.joinThread(self._analysis_thread_name)
+            self._analysis_worker = None
+
         self._statusVariables['number_of_lasers'] = self.number_of_lasers
         self._statusVariables['controlled_vals'] = list(self.controlled_vals)
         if len(self.fc.fit_list) > 0:
             self._statusVariables['fits'] = self.fc.save_to_dict()
         return
 
+    @property
+    def _analysis_thread_name(self):
+        return 'pulsed-analysis-{0}'.format(self._name)
+
+    def get_analysis_statistics(self):
+        """ Statistics of the analysis thread (see PulsedAnalysisWorker.get_statistics).
+
+        @return dict: the statistics, empty if the analysis runs in the thread of this module
+        """
+        if self._analysis_worker is None:
+            return dict()
+        return self._analysis_worker.get_statistics()
+
     def request_init_values(self):
         """
 
@@ -359,6 +489,7 @@ class PulsedMeasurementLogic(GenericLogic):
         self.sequence_length_s = sequence_length_s
         self.laser_ignore_list = laser_ignore_list
         self.alternating = is_alternating
+        self._extraction_outdated = True
         if self.fast_counter_gated:
             self.set_fast_counter_settings(self.fast_counter_binwidth,
                                            self.fast_counter_record_length)
@@ -596,9 +727,12 @@ class PulsedMeasurementLogic(GenericLogic):
 
         @param ensemble_name:
         @param analog_samples:
-        @param digital_samples:
+        @param digital_samples: PackedDigitalSamples or numpy.ndarray of type bool
         @return:
         """
+        # the pulser interface expects one bool array row per digital channel
+        if isinstance(digital_samples, PackedDigitalSamples):
+            digital_samples = digital_samples.to_bool_array()
         err = self._pulse_generator_device.direct_write_ensemble(ensemble_name,
                                                                  analog_samples, digital_samples)
         uploaded_assets = self._pulse_generator_device.get_uploaded_asset_names()
@@ -682,8 +816,14 @@ class PulsedMeasurementLogic(GenericLogic):
                 self.sigElapsedTimeUpdated.emit(self.elapsed_time, self.elapsed_time_str)
                 # Clear previous fits
                 self.fc.clear_result()
-                # initialize plots
-                self._initialize_plots()
+                with self._analysis_lock:
+                    # raw data of previous measurements still waiting for analysis is dropped
+                    self._measurement_id += 1
+                    # find the laser pulses anew in the first analysis of this measurement
+                    self._pulse_extraction_logic.clear_laser_edge_cache()
+                    self._extraction_outdated = True
+                    # initialize plots
+                    self._initialize_plots()
 
                 # recall stashed raw data
                 if stashed_raw_data_tag is None:
@@ -751,40 +891,14 @@ class PulsedMeasurementLogic(GenericLogic):
                 else:
                     self.raw_data = fc_data
 
-                # extract laser pulses from raw data
-                return_dict = self._pulse_extraction_logic.extract_laser_pulses(self.raw_data,
-                                                                                self.fast_counter_gated)
-                self.laser_data = return_dict['laser_counts_arr']
-
-                # analyze pulses and get data points for signal plot. Also check if extraction
-                # worked (non-zero array returned).
-                if np.sum(self.laser_data) < 1:
-                    tmp_signal = np.zeros(self.laser_data.shape[0])
-                    tmp_error = np.zeros(self.laser_data.shape[0])
+                if self._analysis_worker is None:
+                    with self._analysis_lock:
+                        self._analyse_raw_data(self.raw_data)
                 else:
-                    tmp_signal, tmp_error = self._pulse_analysis_logic.analyze_data(self.laser_data)
-                # exclude laser pulses to ignore
-                if len(self.laser_ignore_list) > 0:
-                    ignore_indices = self.laser_ignore_list
-                    if -1 in ignore_indices:
-                        ignore_indices[ignore_indices.index(-1)] = len(ignore_indices) - 1
-                    tmp_signal = np.delete(tmp_signal, ignore_indices)
-                    tmp_error = np.delete(tmp_error, ignore_indices)
-                # order data according to alternating flag
-                if self.alternating:
-                    self.signal_plot_y = tmp_signal[::2]
-                    self.signal_plot_y2 = tmp_signal[1::2]
-                    self.measuring_error_plot_y = tmp_error[::2]
-                    self.measuring_error_plot_y2 = tmp_error[1::2]
-                else:
-                    self.signal_plot_y = tmp_signal
-                    self.measuring_error_plot_y = tmp_error
-
-                # set laser to show
-                self.set_laser_to_show(self.show_laser_index, self.show_raw_data)
-
-                # Compute the second plot of signal
-                self._compute_second_plot()
+                    # read-only traces are views of fast counter buffers reused by later readouts
+                    if not self.raw_data.flags.writeable:
+                        self.raw_data = self.raw_data.copy()
+                    self._analysis_worker.submit(self.raw_data, self._measurement_id)
 
             # recalculate time
             self.elapsed_time = time.time() - self.start_time
@@ -796,11 +910,173 @@ class PulsedMeasurementLogic(GenericLogic):
 
             # emit signals
             self.sigElapsedTimeUpdated.emit(self.elapsed_time, self.elapsed_time_str)
-            self.sigSignalDataUpdated.emit(self.signal_plot_x, self.signal_plot_y,
-                                           self.signal_plot_y2, self.measuring_error_plot_y,
-                                           self.measuring_error_plot_y2, self.signal_second_plot_x,
-                                           self.signal_second_plot_y, self.signal_second_plot_y2)
+            if self._analysis_worker is None:
+                self._emit_signal_data()
+            return
+
+    def _analyse_snapshot(self, raw_data, measurement_id):
+        """ Analyses raw data handed over to the analysis worker. Runs in the worker thread.
+
+        @param numpy.ndarray raw_data: the raw data to analyse
+        @param int measurement_id: the measurement the raw data belongs to
+
+        @return bool: False if the raw data belongs to a previous measurement and was dropped
+        """
+        with self._analysis_lock:
+            if measurement_id != self._measurement_id:
+                return False
+            self._analyse_raw_data(raw_data)
+            self._emit_signal_data()
+        return True
+
+    def _analyse_raw_data(self, raw_data):
+        """ Extracts and analyses the laser pulses and updates the plot data.
+        The caller must hold the _analysis_lock.
+
+        @param numpy.ndarray raw_data: the raw data to analyse
+        """
+        # extract laser pulses from raw data
+        self._update_laser_data(raw_data)
+
+        # analyze pulses and get data points for signal plot
+        self._analyze_laser_data()
+
+        # set laser to show
+        self._update_laser_plot(self.show_laser_index, self.show_raw_data)
+
+        # Compute the second plot of signal
+        self._compute_second_plot()
+        return
+
+    def _emit_signal_data(self):
+        """ Emits the current signal plot data. """
+        self.sigSignalDataUpdated.emit(self.signal_plot_x, self.signal_plot_y,
+                                       self.signal_plot_y2, self.measuring_error_plot_y,
+                                       self.measuring_error_plot_y2, self.signal_second_plot_x,
+                                       self.signal_second_plot_y, self.signal_second_plot_y2)
+        return
+
+    def _update_laser_data(self, raw_data):
+        """ Extracts the laser pulses from the raw data.
+
+        With the config option incremental_analysis the counts added to the raw data since the
+        last analysis are added to the laser pulses at the positions found by the last full
+        extraction. The pulse analysis logic updates its window sums with these counts only.
+        A full extraction is performed at the start of a measurement, after changes of the
+        extraction settings or the pulse sequence, if the raw data shrinks (e.g. the fast counter
+        was restarted) and whenever the total number of counts has doubled since the last full
+        extraction. The latter refines the laser positions found in the first sparse timetraces
+        while the number of full extractions only grows logarithmically with the measurement time.
+
+        @param numpy.ndarray raw_data: the raw data
+        """
+        if self._extraction_outdated:
+            self._extraction_outdated = False
+            self._incremental_state = None
+        if self.incremental_analysis and self._add_laser_counts(raw_data):
+            return
+        return_dict = self._pulse_extraction_logic.extract_laser_pulses(raw_data,
+                                                                        self.fast_counter_gated)
+        self.laser_data = return_dict['laser_counts_arr']
+        self._incremental_state = None
+        if self.incremental_analysis:
+            self._init_incremental_state(raw_data, return_dict)
+        return
+
+    def _init_incremental_state(self, raw_data, return_dict):
+        """ Keeps the positions of the extracted laser pulses in the raw data if the laser pulses
+        are plain, non-overlapping slices of the raw data.
+
+        @param numpy.ndarray raw_data: the raw data the laser pulses were extracted from
+        @param dict return_dict: the result of the pulse extraction
+        """
+        laser_data = self.laser_data
+        if (laser_data.ndim != 2 or laser_data.dtype != np.int64 or laser_data.shape[1] < 1 or
+                laser_data.shape[0] < 1):
+            return
+        laser_length = laser_data.shape[1]
+        if self.fast_counter_gated:
+            rising_ind = int(np.asarray(return_dict['laser_indices_rising']).ravel()[0])
+            if (raw_data.ndim != 2 or laser_data.shape[0] != raw_data.shape[0] or
+                    rising_ind < 0 or rising_ind + laser_length > raw_data.shape[1]):
+                return
+            start_ind = np.arange(laser_data.shape[0], dtype='int64') * raw_data.shape[1]
+            start_ind += rising_ind
+        else:
+            start_ind = np.asarray(return_dict['laser_indices_rising'], dtype='int64').ravel()
+            if start_ind.shape != (laser_data.shape[0],) or start_ind[0] < 0:
+                return
+        if np.any(np.diff(start_ind) < laser_length):
             return
+        # The raw data of all laser pulses must match the extracted ones
+        indices = start_ind[:, np.newaxis] + np.arange(laser_length)
+        expected = raw_data.ravel().take(indices, mode='clip')
+        expected[indices >= raw_data.size] = 0
+        if not np.array_equal(expected, laser_data):
+            return
+        total_counts = int(np.sum(raw_data))
+        self._incremental_state = {'start_ind': start_ind,
+                                   'laser_length': laser_length,
+                                   'raw_data': raw_data.copy(),
+                                   'total_counts': total_counts,
+                                   'extraction_counts': total_counts}
+        return
+
+    def _add_laser_counts(self, raw_data):
+        """ Adds the counts in the raw data since the last analysis to the laser pulses.
+
+        @param numpy.ndarray raw_data: the raw data
+
+        @return bool: True if the laser pulses were updated, False if a full extraction is needed
+        """
+        state = self._incremental_state
+        if state is None or raw_data.shape != state['raw_data'].shape:
+            return False
+        delta = raw_data - state['raw_data']
+        changed_ind = np.flatnonzero(delta)
+        counts = delta.ravel()[changed_ind]
+        if np.any(counts < 0):
+            return False
+        total_counts = state['total_counts'] + int(np.sum(counts))
+        if total_counts >= 2 * state['extraction_counts']:
+            return False
+
+        laser_ind = np.searchsorted(state['start_ind'], changed_ind, side='right') - 1
+        bin_ind = changed_ind - state['start_ind'][laser_ind]
+        in_laser = (laser_ind >= 0) & (bin_ind < state['laser_length'])
+        self._pulse_analysis_logic.add_laser_counts(self.laser_data, laser_ind[in_laser],
+                                                    bin_ind[in_laser], counts[in_laser])
+        np.copyto(state['raw_data'], raw_data)
+        state['total_counts'] = total_counts
+        return True
+
+    def _analyze_laser_data(self):
+        """ Computes the signal plot data (and measuring error) from the extracted laser pulses.
+        """
+        # analyze pulses and get data points for signal plot. Also check if extraction
+        # worked (non-zero array returned).
+        if np.sum(self.laser_data) < 1:
+            tmp_signal = np.zeros(self.laser_data.shape[0])
+            tmp_error = np.zeros(self.laser_data.shape[0])
+        else:
+            tmp_signal, tmp_error = self._pulse_analysis_logic.analyze_data(self.laser_data)
+        # exclude laser pulses to ignore
+        if len(self.laser_ignore_list) > 0:
+            ignore_indices = self.laser_ignore_list
+            if -1 in ignore_indices:
+                ignore_indices[ignore_indices.index(-1)] = len(ignore_indices) - 1
+            tmp_signal = np.delete(tmp_signal, ignore_indices)
+            tmp_error = np.delete(tmp_error, ignore_indices)
+        # order data according to alternating flag
+        if self.alternating:
+            self.signal_plot_y = tmp_signal[::2]
+            self.signal_plot_y2 = tmp_signal[1::2]
+            self.measuring_error_plot_y = tmp_error[::2]
+            self.measuring_error_plot_y2 = tmp_error[1::2]
+        else:
+            self.signal_plot_y = tmp_signal
+            self.measuring_error_plot_y = tmp_error
+        return
 
     def set_laser_to_show(self, laser_index, show_raw_data):
         """
@@ -810,6 +1086,12 @@ class PulsedMeasurementLogic(GenericLogic):
 
         @return:
 
+        """
+        with self._analysis_lock:
+            return self._update_laser_plot(laser_index, show_raw_data)
+
+    def _update_laser_plot(self, laser_index, show_raw_data):
+        """ See set_laser_to_show. The caller must hold the _analysis_lock.
         """
         self.show_raw_data = show_raw_data
         self.show_laser_index = laser_index
@@ -822,12 +1104,12 @@ class PulsedMeasurementLogic(GenericLogic):
             else:
                 self.laser_plot_y = self.raw_data
         else:
+            # copy, since the laser data may be updated in place by the next analysis
             if laser_index > 0:
-                self.laser_plot_y = self.laser_data[laser_index - 1]
+                self.laser_plot_y = self.laser_data[laser_index - 1].copy()
             else:
                 self.laser_plot_y = np.sum(self.laser_data, 0)
 
-
         self.laser_plot_x = np.arange(1, len(self.laser_plot_y) + 1) * self.fast_counter_binwidth
 
         self.sigLaserToShowUpdated.emit(self.show_laser_index, self.show_raw_data)
@@ -853,6 +1135,11 @@ class PulsedMeasurementLogic(GenericLogic):
                 if self.use_ext_microwave:
                     self.microwave_on_off(False)
 
+                # analyse the raw data still waiting for the analysis thread, so saving right
+                # after stopping contains the last raw data
+                if self._analysis_worker is not None:
+                    self._analysis_worker.analyse_pending()
+
                 # save raw data if requested
                 if stash_raw_data_tag is not None:
                     self.log.info('sum of raw data with tag "{0}" to be saved for next measurement:'
@@ -944,6 +1231,17 @@ class PulsedMeasurementLogic(GenericLogic):
                 analysis_settings['norm_end_s'] = round(analysis_settings['norm_end_s'] / self.fast_counter_binwidth) * self.fast_counter_binwidth
             self.sigAnalysisSettingsUpdated.emit(analysis_settings)
 
+            # re-analyze the current laser pulses with the new settings right away. The analysis
+            # keeps the cumulative sums of the laser pulses, so this does not touch the counts.
+            if self.module_state() == 'locked' and self.laser_data.shape[0] == self.number_of_lasers:
+                if self._analysis_worker is None:
+                    with self._analysis_lock:
+                        self._analyze_laser_data()
+                        self._compute_second_plot()
+                        self._emit_signal_data()
+                else:
+                    self._analysis_worker.submit(self.raw_data, self._measurement_id)
+
         return analysis_settings
 
     def extraction_settings_changed(self, extraction_settings):
@@ -953,8 +1251,12 @@ class PulsedMeasurementLogic(GenericLogic):
         @return:
         """
         with self.threadlock:
-            for parameter in extraction_settings:
-                self._pulse_extraction_logic.extraction_settings[parameter] = extraction_settings[parameter]
+            with self._analysis_lock:
+                for parameter in extraction_settings:
+                    self._pulse_extraction_logic.extraction_settings[parameter] = extraction_settings[parameter]
+                # laser edges found with the old settings must not be reused
+                self._pulse_extraction_logic.clear_laser_edge_cache()
+                self._extraction_outdated = True
             self.sigExtractionSettingsUpdated.emit(extraction_settings)
         return extraction_settings
 
@@ -991,7 +1293,14 @@ class PulsedMeasurementLogic(GenericLogic):
 
         @return str: filepath where data were saved
         """
+        # the analysis thread must not update the data while it is saved
+        with self._analysis_lock:
+            return self._save_measurement_data(controlled_val_unit, tag, with_error,
+                                               save_second_plot)
 
+    def _save_measurement_data(self, controlled_val_unit, tag, with_error, save_second_plot):
+        """ See save_measurement_data. The caller must hold the _analysis_lock.
+        """
         filepath = self._save_logic.get_path_for_module('PulsedMeasurement')
         timestamp = datetime.datetime.now()
 
@@ -1304,8 +1613,10 @@ class PulsedMeasurementLogic(GenericLogic):
         self.fc.set_current_fit(fit_method)
 
         if x_data is None or y_data is None:
-            x_data = self.signal_plot_x
-            y_data = self.signal_plot_y
+            # the analysis thread replaces the plot arrays, so take both from the same analysis
+            with self._analysis_lock:
+                x_data = self.signal_plot_x
+                y_data = self.signal_plot_y
 
         self.signal_plot_x_fit, self.signal_plot_y_fit, result = self.fc.do_fit(x_data, y_data)
 
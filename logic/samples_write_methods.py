@@ -26,12 +26,19 @@ import numpy as np
 from collections import OrderedDict
 from lxml import etree as ET
 
+from logic.digital_samples import PackedDigitalSamples
+from logic.sampling_engine import split_segment_ranges
+
 
 class SamplesWriteMethods():
     """
     Collection of write-to-file methods used to create hardware compatible files for the pulse
     generator out of sample arrays.
     """
+    # Max. number of samples converted and written at once. Limits the temporary memory needed
+    # for the conversion (e.g. if the sample arrays are memory-mapped).
+    _write_block_samples = 2**24
+
     def __init__(self):
         # If you want to define a new file format, make a new method and add the
         # reference to this method to the _write_to_file dictionary:
@@ -42,6 +49,13 @@ class SamplesWriteMethods():
         self._write_to_file['seqx'] = self._write_seqx
         self._write_to_file['fpga'] = self._write_fpga
         self._write_to_file['pstream'] = self._write_pstream
+        # File formats which can be written directly from the run-length representation of the
+        # digital channels (see EnsembleSegments.digital_runs) without sampling the ensemble:
+        self._write_events_to_file = OrderedDict()
+        self._write_events_to_file['fpga'] = self._write_fpga_events
+        self._write_events_to_file['pstream'] = self._write_pstream_events
+        # header size and sample position of the wfmx-files currently written chunkwise
+        self._wfmx_write_positions = dict()
         return
 
     def _write_wfmx(self, name, analog_samples, digital_samples, total_number_of_samples,
@@ -52,11 +66,17 @@ class SamplesWriteMethods():
         If both flags (is_first_chunk, is_last_chunk) are set to TRUE it means
         that the whole ensemble is written as a whole in one big chunk.
 
+        A wfmx-file consists of the xml header, all analog samples (float32) and all marker
+        samples (one byte per sample) of one channel. Since the total number of samples is known in
+        advance, the file is created at full size with the first chunk and every chunk writes its
+        analog and marker samples directly to their final position. No temporary files are needed
+        and every sample is written only once.
+
         @param name: string, represents the name of the sampled ensemble
         @param analog_samples: float32 numpy ndarray, contains the
                                        samples for the analog channels that
                                        are to be written by this function call.
-        @param digital_samples: bool numpy ndarray, contains the samples
+        @param digital_samples: PackedDigitalSamples, contains the samples
                                       for the digital channels that
                                       are to be written by this function call.
         @param total_number_of_samples: int, The total number of samples in the
@@ -72,130 +92,78 @@ class SamplesWriteMethods():
         # record the name of the created files
         created_files = []
 
-        # The overhead of the write process in bytes.
-        # Making this value bigger will result in a faster write process
-        # but consumes more memory
-        write_overhead_bytes = 1024*1024*256 # 256 MB
-        # The overhead of the write process in number of samples
-        write_overhead_samples = write_overhead_bytes//4
-
         # analyze the activation_config and extract analogue and digital channel numbers
         ana_chnl_numbers = [int(chnl.split('ch')[-1]) for chnl in self.activation_config if
                             'a_ch' in chnl]
         digi_chnl_numbers = [int(chnl.split('ch')[-1]) for chnl in self.activation_config if
                             'd_ch' in chnl]
 
-        # if it is the first chunk, create the .WFMX file with header.
+        # if it is the first chunk, create the .WFMX files with header and reserve the space for
+        # all samples.
         if is_first_chunk:
-            # create header
-            self._create_xml_file(total_number_of_samples, self.temp_dir)
-            # read back the header xml-file and delete it afterwards
-            temp_file = os.path.join(self.temp_dir, 'header.xml')
-            with open(temp_file, 'r') as header:
-                header_lines = header.readlines()
-            os.remove(temp_file)
-
-            # create wfmx-file for each analog channel
+            header = self._create_xml_header(total_number_of_samples)
             for channel in ana_chnl_numbers:
                 filename = name + '_ch' + str(channel) + '.wfmx'
                 created_files.append(filename)
-
-                filepath = os.path.join(self.waveform_dir, filename)
-
-                with open(filepath, 'wb') as wfmxfile:
-                    # write header
-                    for line in header_lines:
-                        wfmxfile.write(bytes(line, 'UTF-8'))
-
-        # append analog samples to the .WFMX files of each channel. Write
-        # digital samples in temporary files.
+                has_markers = (channel * 2) - 1 in digi_chnl_numbers or \
+                              channel * 2 in digi_chnl_numbers
+                file_size = len(header) + total_number_of_samples * (5 if has_markers else 4)
+                with open(os.path.join(self.waveform_dir, filename), 'wb') as wfmxfile:
+                    wfmxfile.write(header)
+                    wfmxfile.truncate(file_size)
+            # position (in samples) of the next chunk within the waveform
+            self._wfmx_write_positions[name] = (len(header), 0)
+
+        header_size, position = self._wfmx_write_positions[name]
+        chunk_length = analog_samples.shape[1]
         for i, channel in enumerate(ana_chnl_numbers):
-            # append analog samples chunk to .WFMX file
             filepath = os.path.join(self.waveform_dir, name + '_ch' + str(channel) + '.wfmx')
-            with open(filepath, 'ab') as wfmxfile:
-                # append analog samples in binary format. One sample is 4
-                # bytes (np.float32). Write in chunks if array is very big to
-                # avoid large temporary copys in memory
-                number_of_full_chunks = int(analog_samples.shape[1]//write_overhead_samples)
-                for start_ind in np.arange(0, number_of_full_chunks * write_overhead_samples,
-                                           write_overhead_samples):
-                    stop_ind = start_ind+write_overhead_samples
-                    wfmxfile.write(analog_samples[i][start_ind:stop_ind])
-                # write rest
-                rest_start_ind = number_of_full_chunks*write_overhead_samples
-                wfmxfile.write(analog_samples[i][rest_start_ind:])
-
-            # create the byte values corresponding to the marker states
-            # (\x01 for marker 1, \x02 for marker 2, \x03 for both)
-            # and write them into a temporary file
-            filepath = os.path.join(self.temp_dir, name + '_ch' + str(channel) + '_digi' + '.tmp')
-            with open(filepath, 'ab') as tmpfile:
-                if (channel*2)-1 not in digi_chnl_numbers and channel*2 not in digi_chnl_numbers:
-                    # no digital channels to write for this analog channel
-                    pass
-                elif (channel*2)-1 in digi_chnl_numbers and channel*2 not in digi_chnl_numbers:
-                    # Only marker one is active for this channel
-                    digi_chnl_index = digi_chnl_numbers.index((channel * 2) - 1)
-                    for start_ind in np.arange(0, number_of_full_chunks * write_overhead_bytes,
-                                               write_overhead_bytes):
-                        stop_ind = start_ind + write_overhead_bytes
-                        # append digital samples in binary format. One sample
-                        # is 1 byte (np.uint8).
-                        tmpfile.write(digital_samples[digi_chnl_index][start_ind:stop_ind])
-                    # write rest of digital samples
-                    rest_start_ind = number_of_full_chunks * write_overhead_bytes
-                    tmpfile.write(digital_samples[digi_chnl_index][rest_start_ind:])
-                elif (channel*2)-1 not in digi_chnl_numbers and channel*2 in digi_chnl_numbers:
-                    # Only marker two is active for this channel
-                    digi_chnl_index = digi_chnl_numbers.index(channel * 2)
-                    for start_ind in np.arange(0, number_of_full_chunks * write_overhead_bytes,
-                                               write_overhead_bytes):
-                        stop_ind = start_ind + write_overhead_bytes
-                        # append digital samples in binary format. One sample
-                        # is 1 byte (np.uint8).
-                        tmpfile.write(np.left_shift(
-                            digital_samples[digi_chnl_index][start_ind:stop_ind].astype('uint8'),
-                            1))
-                    # write rest of digital samples
-                    rest_start_ind = number_of_full_chunks * write_overhead_bytes
-                    tmpfile.write(np.left_shift(
-                        digital_samples[digi_chnl_index][rest_start_ind:].astype('uint8'), 1))
-                else:
-                    # Both markers are active for this channel
-                    digi_chnl_index = digi_chnl_numbers.index(channel * 2)
-                    for start_ind in np.arange(0, number_of_full_chunks * write_overhead_bytes,
-                                               write_overhead_bytes):
-                        stop_ind = start_ind + write_overhead_bytes
-                        # append digital samples in binary format. One sample
-                        # is 1 byte (np.uint8).
-                        tmpfile.write(np.add(np.left_shift(
-                            digital_samples[digi_chnl_index][start_ind:stop_ind].astype('uint8'),
-                            1), digital_samples[digi_chnl_index - 1][start_ind:stop_ind]))
-                    # write rest of digital samples
-                    rest_start_ind = number_of_full_chunks * write_overhead_bytes
-                    tmpfile.write(np.add(np.left_shift(
-                        digital_samples[digi_chnl_index][rest_start_ind:].astype('uint8'), 1),
-                                         digital_samples[digi_chnl_index - 1][rest_start_ind:]))
-
-        # append the digital sample tmp file to the .WFMX file and delete the
-        # .tmp files if it was the last chunk to write.
+            with open(filepath, 'r+b') as wfmxfile:
+                for start in range(0, chunk_length, self._write_block_samples):
+                    stop = min(start + self._write_block_samples, chunk_length)
+                    # analog samples in binary format. One sample is 4 bytes (np.float32).
+                    wfmxfile.seek(header_size + 4 * (position + start))
+                    wfmxfile.write(
+                        np.ascontiguousarray(analog_samples[i, start:stop], dtype='float32'))
+                    # marker samples in binary format behind all analog samples. One sample is
+                    # 1 byte (np.uint8).
+                    markers = self._pack_marker_bytes(channel, digital_samples.view(start, stop),
+                                                      digi_chnl_numbers)
+                    if markers is not None:
+                        wfmxfile.seek(header_size + 4 * total_number_of_samples + position + start)
+                        wfmxfile.write(markers)
+
         if is_last_chunk:
-            for channel in ana_chnl_numbers:
-                tmp_filepath = os.path.join(self.temp_dir, name + '_ch' + str(channel) + '_digi' + '.tmp')
-                wfmx_filepath = os.path.join(self.waveform_dir, name + '_ch' + str(channel) + '.wfmx')
-                with open(wfmx_filepath, 'ab') as wfmxfile:
-                    with open(tmp_filepath, 'rb') as tmpfile:
-                        # read and write files in max. write_overhead_bytes chunks to reduce
-                        # memory usage
-                        while True:
-                            tmp_data = tmpfile.read(write_overhead_bytes)
-                            if not tmp_data:
-                                break
-                            wfmxfile.write(tmp_data)
-                # delete tmp file
-                os.remove(tmp_filepath)
+            del self._wfmx_write_positions[name]
+        else:
+            self._wfmx_write_positions[name] = (header_size, position + chunk_length)
         return created_files
 
+    @staticmethod
+    def _pack_marker_bytes(channel, digital_samples, digi_chnl_numbers):
+        """
+        Create the byte values corresponding to the marker states of an analog channel
+        (\x01 for marker 1, \x02 for marker 2, \x03 for both).
+
+        @param int channel: number of the analog channel
+        @param PackedDigitalSamples digital_samples: digital samples of all active channels
+        @param list digi_chnl_numbers: numbers of the active digital channels
+
+        @return numpy.ndarray: uint8 array with the marker bytes or None if the analog channel has
+                               no active markers
+        """
+        marker1 = marker2 = None
+        if (channel * 2) - 1 in digi_chnl_numbers:
+            marker1 = digital_samples.bits(digi_chnl_numbers.index((channel * 2) - 1))
+        if channel * 2 in digi_chnl_numbers:
+            marker2 = digital_samples.bits(digi_chnl_numbers.index(channel * 2))
+            marker2 = np.left_shift(marker2, 1, out=marker2)
+        if marker1 is None:
+            return marker2
+        if marker2 is None:
+            return marker1
+        return np.bitwise_or(marker2, marker1, out=marker2)
+
     def _write_wfm(self, name, analog_samples, digital_samples, total_number_of_samples,
                     is_first_chunk, is_last_chunk):
         """
@@ -208,7 +176,7 @@ class SamplesWriteMethods():
         @param analog_samples: float32 numpy ndarray, contains the
                                        samples for the analog channels that
                                        are to be written by this function call.
-        @param digital_samples: bool numpy ndarray, contains the samples
+        @param digital_samples: PackedDigitalSamples, contains the samples
                                       for the digital channels that
                                       are to be written by this function call.
         @param total_number_of_samples: int, The total number of samples in the
@@ -256,36 +224,23 @@ class SamplesWriteMethods():
                     wfm_file.write(header)
 
             # now write the samples chunk in binary representation:
-            # First we create a structured numpy array representing one byte (numpy uint8)
-            # for the markers and 4 byte (numpy float32) for the analog samples.
-            write_array = np.empty(digital_samples.shape[1], dtype='float32, uint8')
-
-            # now we determine which markers are active for this channel and write them to
-            # write_array.
-            if (channel_number * 2) - 1 in digi_chnl_numbers and (channel_number * 2) in digi_chnl_numbers:
-                # both markers active for this channel
-                digi_index = digi_chnl_numbers.index(channel_number * 2)
-                write_array['f1'] = np.add(
-                    np.left_shift(digital_samples[digi_index][:].astype('uint8'), 1),
-                    digital_samples[digi_index - 1][:].astype('uint8'))
-            elif (channel_number * 2) - 1 in digi_chnl_numbers and (channel_number * 2) not in digi_chnl_numbers:
-                # only marker 1 active for this channel
-                digi_index = digi_chnl_numbers.index((channel_number * 2) - 1)
-                write_array['f1'] = digital_samples[digi_index][:].astype('uint8')
-            elif (channel_number * 2) - 1 not in digi_chnl_numbers and (channel_number * 2) in digi_chnl_numbers:
-                # only marker 2 active for this channel
-                digi_index = digi_chnl_numbers.index(channel_number * 2)
-                write_array['f1'] = np.left_shift(
-                    digital_samples[digi_index][:].astype('uint8'), 1)
-            else:
-                # no markers active for this channel
-                write_array['f1'] = np.zeros(digital_samples.shape[1], dtype='uint8')
-            # Write analog samples into the write_array
-            write_array['f0'] = analog_samples[channel_index][:]
-
-            # Write write_array to file
+            # For each block of samples we create a structured numpy array representing one byte
+            # (numpy uint8) for the markers and 4 byte (numpy float32) for the analog samples.
+            chunk_length = digital_samples.shape[1]
             with open(filepath, 'ab') as wfm_file:
-                wfm_file.write(write_array)
+                for start in range(0, chunk_length, self._write_block_samples):
+                    stop = min(start + self._write_block_samples, chunk_length)
+                    write_array = np.empty(stop - start, dtype='float32, uint8')
+                    # determine which markers are active for this channel and write them to
+                    # write_array.
+                    markers = self._pack_marker_bytes(channel_number,
+                                                      digital_samples.view(start, stop),
+                                                      digi_chnl_numbers)
+                    write_array['f1'] = 0 if markers is None else markers
+                    # Write analog samples into the write_array
+                    write_array['f0'] = analog_samples[channel_index, start:stop]
+                    # Write write_array to file
+                    wfm_file.write(write_array)
 
                 # append footer if it's the last chunk to write
                 if is_last_chunk:
@@ -306,7 +261,7 @@ class SamplesWriteMethods():
         @param analog_samples: float32 numpy ndarray, contains the
                                        samples for the analog channels that
                                        are to be written by this function call.
-        @param digital_samples: bool numpy ndarray, contains the samples
+        @param digital_samples: PackedDigitalSamples, contains the samples
                                       for the digital channels that
                                       are to be written by this function call.
         @param total_number_of_samples: int, The total number of samples in the
@@ -341,9 +296,8 @@ class SamplesWriteMethods():
         else:
             encoded_samples = np.zeros(chunk_length_bins, dtype='uint8')
 
-        for channel in range(channel_number):
-            encoded_samples[:chunk_length_bins] += (2 ** channel) * np.uint8(
-                digital_samples[channel])
+        # The packed samples of 8 channels are the FPGA samples already (bit i: channel i)
+        encoded_samples[:chunk_length_bins] = digital_samples.words
 
         del digital_samples  # no longer needed
 
@@ -357,6 +311,60 @@ class SamplesWriteMethods():
 
         return created_files
 
+    def _write_fpga_events(self, name, run_lengths, run_states):
+        """
+        Write a fpga-file directly from the run-length representation of the digital channels.
+
+        The file holds one byte per sample, so the runs are expanded block by block while writing.
+        No sample arrays of the whole ensemble are needed.
+
+        @param name: string, represents the name of the sampled ensemble
+        @param run_lengths: int numpy ndarray, the length in bins of each run
+        @param run_states: PackedDigitalSamples, the digital channel states of each run (one word
+                           per run)
+
+        @return list: the list contains the string names of the created files
+        """
+        # record the name of the created files
+        created_files = []
+
+        channel_number = run_states.number_of_channels
+        # FIXME: Also allow for single channel to be specified. Set all others to zero.
+        if channel_number != 8:
+            self.log.error('FPGA pulse generator needs 8 digital channels. {0} is not allowed!'
+                           ''.format(channel_number))
+            return -1
+
+        # check if the sequence length is an integer multiple of 32 bins
+        total_number_of_samples = int(np.sum(run_lengths))
+        number_of_zeros = 0
+        if total_number_of_samples % 32 != 0:
+            # calculate number of zero timeslots to append
+            number_of_zeros = 32 - (total_number_of_samples % 32)
+            self.log.warning('FPGA pulse sequence length is no integer multiple of 32 samples. '
+                             'Appending {0} zero-samples to the sequence.'.format(number_of_zeros))
+
+        filename = name + '.fpga'
+        created_files.append(filename)
+
+        # The packed states of 8 channels are the FPGA samples already (bit i: channel i)
+        filepath = os.path.join(self.waveform_dir, filename)
+        with open(filepath, 'wb') as fpgafile:
+            for first, last in split_segment_ranges(run_lengths, self._write_block_samples):
+                if last - first == 1 and run_lengths[first] > self._write_block_samples:
+                    # a single long run: write it in blocks of constant samples
+                    block = np.full(self._write_block_samples, run_states.words[first])
+                    full_blocks, remainder = divmod(int(run_lengths[first]), block.size)
+                    for _ in range(full_blocks):
+                        fpgafile.write(block)
+                    fpgafile.write(block[:remainder])
+                else:
+                    fpgafile.write(np.repeat(run_states.words[first:last],
+                                             run_lengths[first:last]))
+            fpgafile.write(np.zeros(number_of_zeros, dtype='uint8'))
+
+        return created_files
+
     def _write_pstream(self, name, analog_samples, digital_samples, total_number_of_samples,
                     is_first_chunk, is_last_chunk):
         """
@@ -390,19 +398,18 @@ class SamplesWriteMethods():
         will be compressed to three Pulse elements with duration 2, 2, 1 and with the correct
         respective bitmasks for the active channels. 
         
-        This function traverses the digital_samples array to identify where the active digital
+        This function traverses the packed digital samples to identify where the active digital
         channels are modified and compresses it down to a sequence of pulse elements each with 
         a bitmask and a length. The file is then written to disk. 
         
-        TODO: This is inefficient, as the original PulseElement representation inside Qudi is
-        first decompressed into a sample stream, then recompressed into the PulseStreamer 
-        representation. Work is required to enable the bypass of the interim stage. 
+        The sequence generator bypasses this interim sample stream and calls
+        _write_pstream_events with the run-length representation of the ensemble instead.
 
         @param name: string, represents the name of the sampled ensemble
         @param analog_samples: float32 numpy ndarray, contains the
                                        samples for the analog channels that
                                        are to be written by this function call.
-        @param digital_samples: bool numpy ndarray, contains the samples
+        @param digital_samples: PackedDigitalSamples, contains the samples
                                       for the digital channels that
                                       are to be written by this function call.
         @param total_number_of_samples: int, The total number of samples in the
@@ -415,31 +422,47 @@ class SamplesWriteMethods():
         @return list: the list contains the string names of the created files for the passed
                       presampled arrays
         """
+        # the packed samples are the bitmasks of the active channels (bit i: channel i)
+        words = digital_samples.words
+
+        # fetch locations where digital channel states change
+        new_channel_indices = np.flatnonzero(words[:-1] != words[1:])
+
+        # add in indices for the start and end of the sequence to simplify iteration
+        new_channel_indices = np.insert(new_channel_indices, 0, [-1])
+        new_channel_indices = np.insert(new_channel_indices, new_channel_indices.size, [words.size-1])
+
+        run_lengths = np.diff(new_channel_indices)
+        run_states = PackedDigitalSamples(digital_samples.number_of_channels,
+                                          words[new_channel_indices[:-1] + 1])
+        return self._write_pstream_events(name, run_lengths, run_states)
+
+    def _write_pstream_events(self, name, run_lengths, run_states):
+        """
+        Write a PulseStreamer file directly from the run-length representation of the digital
+        channels. Every run is one Pulse element (see _write_pstream), so the cost only depends
+        on the number of runs and not on the number of samples.
+
+        @param name: string, represents the name of the sampled ensemble
+        @param run_lengths: int numpy ndarray, the length in bins of each run
+        @param run_states: PackedDigitalSamples, the digital channel states of each run (one word
+                           per run)
+
+        @return list: the list contains the string names of the created files
+        """
         import dill
 
         # record the name of the created files
         created_files = []
 
-        channel_number = digital_samples.shape[0]
-        digital_samples = np.transpose(digital_samples)
-
+        channel_number = run_states.number_of_channels
         if channel_number != 8:
             self.log.error('Pulse streamer needs 8 digital channels. {0} is not allowed!'
                            ''.format(channel_number))
             return -1
 
-        # fetch locations where digital channel states change, and eliminate duplicates
-        new_channel_indices = np.where(digital_samples[:-1,:] != digital_samples[1:,:])[0]
-        new_channel_indices = np.unique(new_channel_indices)
-
-        # add in indices for the start and end of the sequence to simplify iteration
-        new_channel_indices = np.insert(new_channel_indices, 0, [-1])
-        new_channel_indices = np.insert(new_channel_indices, new_channel_indices.size, [digital_samples.shape[0]-1])
-
-        pulses = []
-        for new_channel_index in range(1, new_channel_indices.size):
-            pulse = [new_channel_indices[new_channel_index] - new_channel_indices[new_channel_index - 1], _convert_to_bitmask(digital_samples[new_channel_indices[new_channel_index - 1] + 1,:])]
-            pulses.append(pulse)
+        # the packed states are the bitmasks of the active channels (bit i: channel i)
+        pulses = [[length, int(word)] for length, word in zip(run_lengths, run_states.words)]
 
         # append samples to file
         filename = name + '.pstream'
@@ -544,10 +567,13 @@ class SamplesWriteMethods():
         """
         pass
 
-    def _create_xml_file(self, number_of_samples, temp_dir=''):
+    def _create_xml_header(self, number_of_samples):
         """
-        This function creates an xml file containing the header for the wfmx-file format using
-        etree.
+        This function creates the xml header for the wfmx-file format in memory using etree.
+
+        @param int number_of_samples: total number of samples of the waveform
+
+        @return bytes: the header as written to the wfmx-file
         """
         root = ET.Element('DataFile', offset='xxxxxxxxx', version="0.1")
         DataSetsCollection = ET.SubElement(root, 'DataSetsCollection',
@@ -585,66 +611,17 @@ class SamplesWriteMethods():
                                           name='Basic Waveform')
         Setup = ET.SubElement(root, 'Setup')
 
-        filepath = os.path.join(temp_dir, 'header.xml')
-
-        ##### This command creates the first version of the file
-        tree = ET.ElementTree(root)
-        tree.write(filepath, pretty_print=True, xml_declaration=True)
+        ##### This command creates the first version of the header
+        text = ET.tostring(ET.ElementTree(root), pretty_print=True, xml_declaration=True)
 
         # Calculates the length of the header:
-        # 40 is subtracted since the first line of the above created file has a length of 39 and is
+        # 40 is subtracted since the first line (xml declaration) has a length of 39 and is
         # not included later and the last endline (\n) is also not neccessary.
-        # The for loop is needed to give a nine digit length: xxxxxxxxx
-        length_of_header = ''
-        size = str(os.path.getsize(filepath) - 40)
+        # The header length is written with nine digits: xxxxxxxxx
+        length_of_header = str(len(text) - 40).zfill(9)
 
-        for ii in range(9 - len(size)):
-            length_of_header += '0'
-        length_of_header += size
-
-        # The header length is written into the file
+        # The header length is written into the header
         # The first line is not included since it is redundant
         # Also the last endline (\n) is excluded
-        text = open(filepath, "U").read()
-        text = text.replace("xxxxxxxxx", length_of_header)
-        text = bytes(text, 'UTF-8')
-        f = open(filepath, "wb")
-        f.write(text[39:-1])
-        f.close()
-
-def _convert_to_bitmask(active_channels):
-    """ Convert a list of channels into a bitmask.
-    @param numpy.array active_channels: the list of active channels like
-                        e.g. [0,4,7]. Note that the channels start from 0.
-    @return int: The channel-list is converted into a bitmask (an sequence
-                 of 1 and 0). The returned integer corresponds to such a
-                 bitmask.
-    Note that you can get a binary representation of an integer in python
-    if you use the command bin(<integer-value>). All higher unneeded digits
-    will be dropped, i.e. 0b00100 is turned into 0b100. Examples are
-        bin(0) =    0b0
-        bin(1) =    0b1
-        bin(8) = 0b1000
-    Each bit value (read from right to left) corresponds to the fact that a
-    channel is on or off. I.e. if you have
-        0b001011
-    then it would mean that only channel 0, 1 and 3 are switched to on, the
-    others are off.
-    Helper method for write_pulse_form.
-    """
-    bits = 0  # that corresponds to: 0b0
-    active_channels = np.where(active_channels == True)
-    for channel in active_channels[0]:
-        # go through each list element and create the digital word out of
-        # 0 and 1 that represents the channel configuration. In order to do
-        # that a bitwise shift to the left (<< operator) is performed and
-        # the current channel configuration is compared with a bitwise OR
-        # to check whether the bit was already set. E.g.:
-        #   0b1001 | 0b0110: compare elementwise:
-        #           1 | 0 => 1
-        #           0 | 1 => 1
-        #           0 | 1 => 1
-        #           1 | 1 => 1
-        #                   => 0b1111
-        bits = bits | (1 << channel)
-    return bits
+        text = text.replace(b'xxxxxxxxx', length_of_header.encode('UTF-8'))
+        return text[39:-1]
@@ -0,0 +1,482 @@
+# -*- coding: utf-8 -*-
+
+"""
+This file contains the vectorized sampling engine used to create sample arrays out of
+PulseBlockEnsemble objects.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+from logic.digital_samples import PackedDigitalSamples
+from logic.digital_samples import pack_digital_words
+
+
+def split_segment_ranges(length_bins, max_samples):
+    """ Split a list of consecutive segments into ranges holding at most max_samples samples.
+
+    A single segment longer than max_samples forms a range on its own.
+
+    @param numpy.ndarray length_bins: length in bins of each segment
+    @param int max_samples: maximum number of samples per range
+
+    @return list: list of tuples (first, last) with the segment index range [first, last)
+    """
+    number_of_segments = len(length_bins)
+    if number_of_segments == 0:
+        return []
+    cumulated_bins = np.cumsum(length_bins, dtype=np.int64)
+    max_samples = max(1, int(max_samples))
+    ranges = list()
+    first = 0
+    while first < number_of_segments:
+        samples_before = cumulated_bins[first - 1] if first > 0 else 0
+        last = int(np.searchsorted(cumulated_bins, samples_before + max_samples, side='right'))
+        last = max(last, first + 1)
+        ranges.append((first, last))
+        first = last
+    return ranges
+
+
+class EnsembleSegments:
+    """
+    Flat table of all PulseBlockElements of a PulseBlockEnsemble including repetitions.
+
+    Every unrolled element is represented by one segment with its start bin in the sampled
+    waveform, its length in bins, the time offset bin used for the rotating frame and the index of
+    the PulseBlockElement object in <elements>. Repetitions of a block refer to the same element
+    objects, so the table itself only contains integer arrays.
+    """
+    def __init__(self, ensemble, length_elements_bins, offset_bin=0):
+        """
+        @param ensemble: PulseBlockEnsemble object to compile
+        @param numpy.ndarray length_elements_bins: length in bins of each unrolled element as
+                                                   returned by _analyze_block_ensemble
+        @param int offset_bin: time offset bin of the first element (rotating frame)
+        """
+        self.elements = list()
+        element_index = list()
+        # (first segment, number of elements, number of repetitions incl. the first) of each block
+        self.block_ranges = list()
+        for block, reps in ensemble.block_list:
+            first_element = len(self.elements)
+            self.block_ranges.append((sum(indices.size for indices in element_index),
+                                      len(block.element_list), reps + 1))
+            self.elements.extend(block.element_list)
+            block_indices = np.arange(first_element, len(self.elements), dtype=np.int64)
+            element_index.append(np.tile(block_indices, reps + 1))
+
+        if element_index:
+            self.element_index = np.concatenate(element_index)
+        else:
+            self.element_index = np.array([], dtype=np.int64)
+        self.length_bins = np.asarray(length_elements_bins, dtype=np.int64)
+        if self.length_bins.size != self.element_index.size:
+            raise ValueError('Number of element lengths ({0}) does not match the number of '
+                             'unrolled elements ({1}) in PulseBlockEnsemble "{2}".'
+                             ''.format(self.length_bins.size, self.element_index.size,
+                                       ensemble.name))
+
+        self.start_bins = np.zeros(self.length_bins.size, dtype=np.int64)
+        np.cumsum(self.length_bins[:-1], out=self.start_bins[1:])
+        self.number_of_samples = int(np.sum(self.length_bins))
+
+        # time offset (in bins) of each element. Without rotating frame every element starts at
+        # the same offset.
+        if ensemble.rotating_frame:
+            self.offset_bins = offset_bin + self.start_bins
+            self.end_offset_bin = offset_bin + self.number_of_samples
+        else:
+            self.offset_bins = np.full(self.length_bins.size, offset_bin, dtype=np.int64)
+            self.end_offset_bin = offset_bin
+
+    def __len__(self):
+        return self.element_index.size
+
+    def samples_in_range(self, first, last):
+        """ Number of samples covered by the segments [first, last).
+
+        @param int first: index of the first segment
+        @param int last: index after the last segment
+
+        @return int: number of samples
+        """
+        return int(np.sum(self.length_bins[first:last]))
+
+    def element_digital_words(self, number_of_channels):
+        """ Packed digital channel states of each element in <elements>.
+
+        @param int number_of_channels: number of digital channels
+
+        @return numpy.ndarray: one word per element (see PackedDigitalSamples)
+        """
+        # explicit shape, so an ensemble without elements gives an empty array of the right shape
+        digital_high = np.zeros((len(self.elements), number_of_channels), dtype=bool)
+        for index, element in enumerate(self.elements):
+            states = element.digital_high[:number_of_channels]
+            digital_high[index, :len(states)] = states
+        return pack_digital_words(digital_high.T)
+
+    def digital_runs(self, number_of_channels):
+        """ Run-length representation of the digital channels without sampling them.
+
+        Consecutive segments with the same digital states are merged into one run, segments of
+        zero length are dropped. The cost only depends on the number of segments, not on the
+        number of samples.
+
+        @param int number_of_channels: number of digital channels
+
+        @return tuple: (run_lengths, run_states) with the length in bins of each run (int64
+                       array) and the digital states of each run (PackedDigitalSamples with one
+                       word per run)
+        """
+        words = self.element_digital_words(number_of_channels)[self.element_index]
+        non_empty = self.length_bins > 0
+        words = words[non_empty]
+        length_bins = self.length_bins[non_empty]
+        if words.size == 0:
+            return length_bins, PackedDigitalSamples(number_of_channels, words)
+        run_starts = np.concatenate(([0], np.flatnonzero(words[1:] != words[:-1]) + 1))
+        run_lengths = np.add.reduceat(length_bins, run_starts)
+        return run_lengths, PackedDigitalSamples(number_of_channels, words[run_starts])
+
+
+class SamplingEngine:
+    """
+    Evaluates the sampling functions of whole PulseBlockEnsembles in batched, vectorized passes.
+
+    For each analog channel the segments are grouped by sampling function and parameters.
+    Functions whose value at a time bin depends only on the time and the parameters (listed in
+    <vectorizable_func>) are evaluated for all segments of a group at once: the time arrays of the
+    segments are concatenated, the function is called once and the result is copied to the
+    positions of the segments. All other functions (e.g. the ones depending on the element start
+    and end time) are evaluated segment by segment.
+
+    The time array of each segment is computed from integer bins exactly like in the per-element
+    sampling and all functions are evaluated in float64 before being scaled and converted to
+    float32, so the result is bit-identical to sampling every element on its own.
+
+    Repetitions of a block producing bit-identical samples (same element lengths and time offset
+    bins as the first repetition) are only evaluated once if <deduplicate> is True and copied
+    afterwards. This is the case for repeated blocks in ensembles without rotating frame.
+
+    With <workers> > 1 large ensembles are split into contiguous segment ranges of similar sample
+    count. Every range and every channel is sampled by a separate task of a thread pool, writing
+    directly into its part of the output arrays. numpy releases the GIL during the evaluation of
+    the sampling functions, so the tasks run in parallel. Each segment is evaluated exactly like in
+    the serial case, so the result is bit-identical.
+    """
+    # mean segment length above which batch results are copied segment by segment instead of
+    # being scattered with an index array
+    _min_copy_length = 1024
+    # minimum number of samples per parallel task
+    _min_task_samples = 2**16
+
+    def __init__(self, math_func, vectorizable_func, max_batch_samples=2**22, deduplicate=True,
+                 workers=1):
+        """
+        @param dict math_func: sampling function names as keys and the functions as values
+        @param set vectorizable_func: names of the functions that can be evaluated elementwise
+        @param int max_batch_samples: maximum number of samples evaluated in a single batch (per
+                                      worker). Limits the size of the temporary float64 arrays.
+        @param bool deduplicate: evaluate repeated identical segments only once
+        @param int workers: number of worker threads used for sampling (1 for serial sampling)
+        """
+        self._math_func = math_func
+        self._vectorizable_func = vectorizable_func
+        self.max_batch_samples = max(1, int(max_batch_samples))
+        self.deduplicate = deduplicate
+        self._workers = max(1, int(workers))
+        self._executor = None
+
+    @property
+    def workers(self):
+        return self._workers
+
+    def shutdown(self):
+        """ Stop the worker threads. They are restarted on demand by the next parallel sampling.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        return
+
+    def sample(self, segments, sample_rate, amplitudes, analog_samples, digital_samples, first=0,
+               last=None):
+        """ Sample the segments [first, last) into the given arrays.
+
+        @param EnsembleSegments segments: compiled ensemble
+        @param float sample_rate: sample rate in Hz
+        @param list amplitudes: amplitude (normalization) for each analog channel
+        @param numpy.ndarray analog_samples: float32 array with shape (analog channels, samples)
+        @param PackedDigitalSamples digital_samples: packed digital samples of all channels
+        @param int first: index of the first segment to sample
+        @param int last: index after the last segment to sample (None for all remaining segments)
+
+        @return int: number of analog samples actually evaluated (summed over all channels). The
+                     rest was copied from repeated segments.
+        """
+        if last is None:
+            last = len(segments)
+        if last <= first:
+            return 0
+        number_of_samples = segments.samples_in_range(first, last)
+        if self._workers < 2 or number_of_samples < 2 * self._min_task_samples:
+            return self._sample_range(segments, sample_rate, amplitudes, analog_samples,
+                                      digital_samples, first, last,
+                                      range(analog_samples.shape[0]), True)
+
+        # split into contiguous segment ranges, one task per range and channel
+        task_samples = max(self._min_task_samples, -(-number_of_samples // self._workers))
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._workers,
+                                                thread_name_prefix='SamplingEngine')
+        futures = list()
+        range_start = segments.start_bins[first]
+        for range_first, range_last in split_segment_ranges(segments.length_bins[first:last],
+                                                            task_samples):
+            range_first += first
+            range_last += first
+            start = segments.start_bins[range_first] - range_start
+            stop = start + segments.samples_in_range(range_first, range_last)
+            analog_view = analog_samples[:, start:stop]
+            digital_view = digital_samples.view(start, stop)
+            for chnl in range(analog_samples.shape[0]):
+                futures.append(self._executor.submit(
+                    self._sample_range, segments, sample_rate, amplitudes, analog_view,
+                    digital_view, range_first, range_last, (chnl,), False))
+            if digital_samples.number_of_channels > 0:
+                futures.append(self._executor.submit(
+                    self._sample_range, segments, sample_rate, amplitudes, analog_view,
+                    digital_view, range_first, range_last, (), True))
+        # wait for all tasks before raising the first error (if any)
+        evaluated_samples = 0
+        errors = list()
+        for future in futures:
+            try:
+                evaluated_samples += future.result()
+            except Exception as e:
+                errors.append(e)
+        if errors:
+            raise errors[0]
+        return evaluated_samples
+
+    def _sample_range(self, segments, sample_rate, amplitudes, analog_samples, digital_samples,
+                      first, last, analog_channels, sample_digital):
+        """ Sample the segments [first, last) of the given channels.
+
+        @param iterable analog_channels: indices of the analog channels to sample
+        @param bool sample_digital: sample all digital channels
+
+        @return int: number of evaluated analog samples
+        """
+        element_index = segments.element_index[first:last]
+        length_bins = segments.length_bins[first:last]
+        start_bins = segments.start_bins[first:last] - segments.start_bins[first]
+        offset_bins = segments.offset_bins[first:last]
+
+        if sample_digital:
+            element_words = segments.element_digital_words(digital_samples.number_of_channels)
+            digital_samples.words[:] = np.repeat(element_words[element_index], length_bins)
+
+        if not analog_channels:
+            return 0
+        if self.deduplicate:
+            evaluate, copy_runs = self._find_repetitions(segments, first, last)
+        else:
+            evaluate, copy_runs = np.ones(last - first, dtype=bool), None
+
+        evaluated_samples = 0
+        for chnl in analog_channels:
+            self._sample_analog_channel(segments.elements, chnl, element_index[evaluate],
+                                        start_bins[evaluate], length_bins[evaluate],
+                                        offset_bins[evaluate], sample_rate, amplitudes[chnl],
+                                        analog_samples[chnl])
+            if copy_runs is not None:
+                self._copy_runs(*copy_runs, analog_samples[chnl])
+            evaluated_samples += int(np.sum(length_bins[evaluate]))
+        return evaluated_samples
+
+    @staticmethod
+    def _find_repetitions(segments, first, last):
+        """ Find block repetitions in the segments [first, last) with the same samples as the first
+        repetition of the block within this range.
+
+        All elements of a block are the same in every repetition, so a repetition has the same
+        samples if all element lengths and time offset bins match.
+
+        @return tuple: (evaluate, copy_runs) with a bool array marking the segments to evaluate and
+                       a tuple of arrays (destination start bins, source start bins, lengths) of
+                       the repetitions to copy or None
+        """
+        evaluate = np.ones(last - first, dtype=bool)
+        destination_starts = list()
+        source_starts = list()
+        lengths = list()
+        for block_first, block_elements, repetitions in segments.block_ranges:
+            if block_elements == 0 or repetitions < 2:
+                continue
+            # repetitions fully contained in [first, last)
+            first_rep = max(0, -((block_first - first) // block_elements))
+            last_rep = min(repetitions, (last - block_first) // block_elements)
+            if last_rep - first_rep < 2:
+                continue
+            rep_first = block_first + first_rep * block_elements
+            rep_last = block_first + last_rep * block_elements
+            rep_lengths = segments.length_bins[rep_first:rep_last].reshape(-1, block_elements)
+            rep_offsets = segments.offset_bins[rep_first:rep_last].reshape(-1, block_elements)
+            repeated = (np.all(rep_lengths == rep_lengths[0], axis=1) &
+                        np.all(rep_offsets == rep_offsets[0], axis=1))
+            repeated[0] = False
+            repeated_reps = np.flatnonzero(repeated)
+            if repeated_reps.size == 0:
+                continue
+            rep_starts = segments.start_bins[rep_first:rep_last:block_elements]
+            destination_starts.append(rep_starts[repeated_reps])
+            source_starts.append(np.full(repeated_reps.size, rep_starts[0]))
+            lengths.append(np.full(repeated_reps.size, np.sum(rep_lengths[0])))
+            evaluate[rep_first - first:rep_last - first].reshape(-1, block_elements)[
+                repeated_reps] = False
+        if not lengths:
+            return evaluate, None
+        range_start = segments.start_bins[first]
+        return evaluate, (np.concatenate(destination_starts) - range_start,
+                          np.concatenate(source_starts) - range_start,
+                          np.concatenate(lengths))
+
+    def _copy_runs(self, destination_starts, source_starts, lengths, samples):
+        """ Copy runs of samples within an array.
+
+        @param numpy.ndarray destination_starts: start bin of each run to write
+        @param numpy.ndarray source_starts: start bin of each run to copy from
+        @param numpy.ndarray lengths: length in bins of each run
+        @param numpy.ndarray samples: 1D sample array
+        """
+        if np.sum(lengths) >= self._min_copy_length * lengths.size:
+            # long runs: copy slice by slice
+            for destination, source, length in zip(destination_starts, source_starts, lengths):
+                samples[destination:destination + length] = samples[source:source + length]
+            return
+        # many short runs: gather and scatter with index arrays in batches
+        for batch_first, batch_last in split_segment_ranges(lengths, self.max_batch_samples):
+            batch_lengths = lengths[batch_first:batch_last]
+            batch_starts = np.zeros(batch_lengths.size, dtype=np.int64)
+            np.cumsum(batch_lengths[:-1], out=batch_starts[1:])
+            within_bins = np.arange(int(np.sum(batch_lengths)), dtype=np.int64)
+            within_bins -= np.repeat(batch_starts, batch_lengths)
+            samples[np.repeat(destination_starts[batch_first:batch_last], batch_lengths) +
+                    within_bins] = samples[np.repeat(source_starts[batch_first:batch_last],
+                                                     batch_lengths) + within_bins]
+        return
+
+    def _sample_analog_channel(self, elements, chnl, element_index, start_bins, length_bins,
+                               offset_bins, sample_rate, amplitude, samples):
+        """ Fill the samples of a single analog channel.
+
+        Segments are grouped by sampling function and parameters, so every group is evaluated with
+        the same scalar parameters the per-element sampling would use.
+        """
+        # Assign a group id to each element. Equal but distinct element objects share a group.
+        group_keys = dict()
+        element_groups = np.empty(len(elements), dtype=np.int64)
+        for index, element in enumerate(elements):
+            func_name = element.pulse_function[chnl]
+            parameters = element.parameters[chnl] if len(element.parameters) > chnl else dict()
+            try:
+                key = (func_name, tuple(sorted(parameters.items())))
+                hash(key)
+            except TypeError:
+                key = (func_name, index)
+            element_groups[index] = group_keys.setdefault(key, len(group_keys))
+
+        # segment indices sorted by group (chronological order within each group)
+        segment_groups = element_groups[element_index]
+        order = np.argsort(segment_groups, kind='stable')
+        group_bounds = np.flatnonzero(np.diff(segment_groups[order])) + 1
+        for selected in np.split(order, group_bounds):
+            if selected.size == 0:
+                continue
+            element = elements[element_index[selected[0]]]
+            func_name = element.pulse_function[chnl]
+            if func_name in self._vectorizable_func and selected.size > 1:
+                for batch_first, batch_last in split_segment_ranges(length_bins[selected],
+                                                                    self.max_batch_samples):
+                    self._sample_batch(element, chnl, func_name, selected[batch_first:batch_last],
+                                       start_bins, length_bins, offset_bins, sample_rate,
+                                       amplitude, samples)
+            else:
+                for segment in selected:
+                    self._sample_segment(element, chnl, func_name, start_bins[segment],
+                                         length_bins[segment], offset_bins[segment], sample_rate,
+                                         amplitude, samples)
+        return
+
+    def _sample_segment(self, element, chnl, func_name, start_bin, length_bin, offset_bin,
+                        sample_rate, amplitude, samples):
+        """ Evaluate the sampling function of a single segment. """
+        if length_bin == 0:
+            return
+        time_arr = (offset_bin + np.arange(length_bin, dtype='float64')) / sample_rate
+        samples[start_bin:start_bin + length_bin] = np.float32(
+            self._math_func[func_name](time_arr, element.parameters[chnl]) / amplitude)
+        return
+
+    def _sample_batch(self, element, chnl, func_name, segments, start_bins, length_bins,
+                      offset_bins, sample_rate, amplitude, samples):
+        """ Evaluate an elementwise sampling function for several segments sharing the same
+        parameters at once.
+        """
+        batch_lengths = length_bins[segments]
+        batch_size = int(np.sum(batch_lengths))
+        if batch_size == 0:
+            return
+        if segments.size == 1:
+            self._sample_segment(element, chnl, func_name, start_bins[segments[0]],
+                                 batch_lengths[0], offset_bins[segments[0]], sample_rate,
+                                 amplitude, samples)
+            return
+
+        # position of each segment within the concatenated batch
+        batch_starts = np.zeros(segments.size, dtype=np.int64)
+        np.cumsum(batch_lengths[:-1], out=batch_starts[1:])
+
+        # time array: offset_bin + bin index within the segment for each sample (exact integers)
+        time_bins = np.arange(batch_size, dtype=np.int64)
+        time_bins += np.repeat(offset_bins[segments] - batch_starts, batch_lengths)
+        time_arr = time_bins.astype('float64') / sample_rate
+        del time_bins
+
+        batch_samples = np.float32(
+            self._math_func[func_name](time_arr, element.parameters[chnl]) / amplitude)
+        del time_arr
+
+        # write the batch into the output
+        segment_starts = start_bins[segments]
+        if np.array_equal(segment_starts - segment_starts[0], batch_starts):
+            samples[segment_starts[0]:segment_starts[0] + batch_size] = batch_samples
+        elif batch_size >= self._min_copy_length * segments.size:
+            # long segments: copy slice by slice
+            for start, batch_start, length in zip(segment_starts, batch_starts, batch_lengths):
+                samples[start:start + length] = batch_samples[batch_start:batch_start + length]
+        else:
+            # many short segments: scatter all samples at once
+            sample_bins = np.arange(batch_size, dtype=np.int64)
+            sample_bins += np.repeat(segment_starts - batch_starts, batch_lengths)
+            samples[sample_bins] = batch_samples
+        return
@@ -46,6 +46,10 @@ class SamplingFunctions():
 
         self._math_func['Chirp'] = self._chirp
 
+        # Functions whose value at each time only depends on that time and the parameters (not on
+        # the start, middle or end of the element). The sampling engine evaluates them for many
+        # elements at once.
+        self._vectorizable_func = {'Idle', 'DC', 'Sin', 'Cos', 'DoubleSin', 'TripleSin'}
 
         # Definition of constraints for the parameters
         # --------------------------------------------
@@ -19,24 +19,27 @@ Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
 top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
 """
 
+from concurrent.futures import ThreadPoolExecutor
 from cycler import cycler
 import datetime
-import inspect
 import logging
 import matplotlib.pyplot as plt
 import numpy as np
 import os
 import sys
+import threading
 import time
 
 from collections import OrderedDict
 from core.module import ConfigOption
 from core.util import units
+from core.util.datacontainer import DataContainer
 from core.util.mutex import Mutex
 from logic.generic_logic import GenericLogic
 from matplotlib.backends.backend_pdf import PdfPages
 from PIL import Image
 from PIL import PngImagePlugin
+from qtpy import QtCore
 
 
 class DailyLogHandler(logging.FileHandler):
@@ -126,6 +129,19 @@ class SaveLogic(GenericLogic):
     _win_data_dir = ConfigOption('win_data_directory', 'C:/Data/')
     _unix_data_dir = ConfigOption('unix_data_directory', 'Data')
     log_into_daily_directory = ConfigOption('log_into_daily_directory', False, missing='warn')
+    # number of worker threads and maximum number of pending jobs for save_data_async
+    _save_worker_count = ConfigOption('save_worker_count', 2)
+    _save_queue_length = ConfigOption('save_queue_length', 8)
+    # strftime format of data filenames, '{0}' is replaced by the filelabel
+    _filename_template = '%Y%m%d-%H%M-%S_{0}'
+
+    # compression of datasets saved with filetype 'container': None (default, the datasets can be
+    # loaded memory-mapped) or 'zlib' (smaller files, but load_container has to read them into RAM)
+    _container_compression = ConfigOption('container_compression', None)
+
+    # emitted when a job of save_data_async has finished with the path of the saved data file and
+    # a flag indicating success
+    sigSaveFinished = QtCore.Signal(str, bool)
 
     # Matplotlib style definition for saving plots
     mpl_qd_style = {
@@ -187,6 +203,12 @@ class SaveLogic(GenericLogic):
 
         self._daily_loghandler = None
 
+        # cached directories: (date, daily directory), module directories of that day and
+        # custom directories known to exist
+        self._daily_directory = (None, None)
+        self._module_directories = dict()
+        self._known_directories = set()
+
     def on_activate(self):
         """ Definition, configuration and initialisation of the SaveLogic.
         """
@@ -202,7 +224,15 @@ class SaveLogic(GenericLogic):
         else:
             self._daily_loghandler = None
 
+        # worker pool for asynchronous saving
+        self._save_executor = ThreadPoolExecutor(max_workers=max(1, int(self._save_worker_count)))
+        self._save_job_slots = threading.BoundedSemaphore(max(1, int(self._save_queue_length)))
+        self._pending_save_jobs = 0
+
     def on_deactivate(self):
+        # wait for all pending asynchronous save jobs
+        self._save_executor.shutdown(wait=True)
+
         if self._daily_loghandler is not None:
             # removes the log handler logging into the daily directory
             logging.getLogger().removeHandler(self._daily_loghandler)
@@ -223,7 +253,8 @@ class SaveLogic(GenericLogic):
         self._daily_loghandler.setLevel(level)
 
     def save_data(self, data, filepath=None, parameters=None, filename=None, filelabel=None,
-                  timestamp=None, filetype='text', fmt='%.15e', delimiter='\t', plotfig=None):
+                  timestamp=None, filetype='text', fmt='%.15e', delimiter='\t', plotfig=None,
+                  module_name=None):
         """
         General save routine for data.
 
@@ -269,7 +300,11 @@ class SaveLogic(GenericLogic):
                                    filename and a timestamp, because then the timestamp will be
                                    ignored.
         @param string filetype: optional, the file format the data should be saved in. Valid inputs
-                                are 'text', 'xml' and 'npz'. Default is 'text'.
+                                are 'text', 'npz' and 'container'. Default is 'text'.
+                                'container' saves all data arrays as datasets of a chunked binary
+                                DataContainer (directory <filename>.qdc) with the parameters
+                                stored as metadata. See core.util.datacontainer and
+                                load_container.
         @param string or list of strings fmt: optional, format specifier for saved data. See python
                                               documentation for
                                               "Format Specification Mini-Language". If you want for
@@ -284,6 +319,11 @@ class SaveLogic(GenericLogic):
                                               behaviour or failure to save right away.
         @param string delimiter: optional, insert here the delimiter, like '\n' for new line, '\t'
                                  for tab, ',' for a comma ect.
+        @param string module_name: optional, name of the module the data belongs to. It is used in
+                                   the header, as default filelabel and for the default filepath.
+                                   If not passed, it is inferred from the calling module. Modules
+                                   saving often should use a SaveContext (see get_save_context),
+                                   which passes it.
 
         1D data
         =======
@@ -314,6 +354,131 @@ class SaveLogic(GenericLogic):
         YOU ARE RESPONSIBLE FOR THE IDENTIFIER! DO NOT FORGET THE UNITS FOR THE SAVED TIME
         TRACE/MATRIX.
         """
+        # try to trace back the functioncall to the class which was calling it.
+        module_name = self._get_calling_module_name(module_name)
+
+        save_job = self._prepare_save_job(data=data, module_name=module_name, filepath=filepath,
+                                          parameters=parameters, filename=filename,
+                                          filelabel=filelabel, timestamp=timestamp,
+                                          filetype=filetype, fmt=fmt, delimiter=delimiter,
+                                          plotfig=plotfig)
+        if save_job is None:
+            return -1
+        self._execute_save_job(save_job)
+        return
+
+    def save_data_async(self, data, filepath=None, parameters=None, filename=None, filelabel=None,
+                        timestamp=None, filetype='text', fmt='%.15e', delimiter='\t',
+                        plotfig=None, module_name=None):
+        """
+        Same as save_data, but the file writing and figure rendering is done by a pool of
+        background worker threads.
+
+        The data arrays and parameters are copied before this method returns, so the caller is free
+        to modify them afterwards. The passed figure is handed over to the worker and must not be
+        used by the caller anymore. If the maximum number of pending save jobs (config option
+        'save_queue_length') is reached, this method blocks until a job has finished.
+
+        See save_data for a description of the parameters.
+
+        @return concurrent.futures.Future: future of the save job. Its result is the full path of
+                                           the saved data file. -1 is returned immediately if the
+                                           data could not be prepared for saving.
+        """
+        module_name = self._get_calling_module_name(module_name)
+
+        # snapshot the data so the calling module can continue to work on its arrays
+        data_copy = OrderedDict()
+        for keyname in data:
+            try:
+                data_copy[keyname] = np.array(data[keyname], copy=True)
+            except:
+                self.log.error('Casting data array of type "{0}" into numpy.ndarray failed. '
+                               'Could not save data.'.format(type(data[keyname])))
+                return -1
+        if isinstance(parameters, dict):
+            parameters = OrderedDict(parameters)
+
+        save_job = self._prepare_save_job(data=data_copy, module_name=module_name,
+                                          filepath=filepath, parameters=parameters,
+                                          filename=filename, filelabel=filelabel,
+                                          timestamp=timestamp, filetype=filetype, fmt=fmt,
+                                          delimiter=delimiter, plotfig=plotfig)
+        if save_job is None:
+            return -1
+
+        if plotfig is not None:
+            # Detach the figure from pyplot in the calling thread. It can still be saved afterwards.
+            plt.close(plotfig)
+            save_job['close_figure'] = False
+
+        # backpressure: wait for a free slot if too many save jobs are pending
+        self._save_job_slots.acquire()
+        with self.lock:
+            self._pending_save_jobs += 1
+        try:
+            future = self._save_executor.submit(self._execute_save_job, save_job)
+        except:
+            with self.lock:
+                self._pending_save_jobs -= 1
+            self._save_job_slots.release()
+            raise
+        future.add_done_callback(self._save_job_done)
+        return future
+
+    def get_pending_save_jobs(self):
+        """ Number of save jobs submitted via save_data_async which have not finished yet.
+
+        @return int: number of pending save jobs
+        """
+        with self.lock:
+            return self._pending_save_jobs
+
+    def _save_job_done(self, future):
+        """ Callback of finished asynchronous save jobs. Runs in the worker thread.
+
+        @param concurrent.futures.Future future: the finished save job
+        """
+        self._save_job_slots.release()
+        with self.lock:
+            self._pending_save_jobs -= 1
+        exception = future.exception()
+        if exception is not None:
+            self.log.error('Saving data in background failed: {0}'.format(exception))
+            self.sigSaveFinished.emit('', False)
+        else:
+            self.sigSaveFinished.emit(future.result(), True)
+
+    def _get_calling_module_name(self, module_name=None):
+        """ Determine the name of the module which called the public save method.
+
+        Only the frame of the caller is looked at, which is much cheaper than inspect.stack().
+
+        @param str module_name: optional, module name passed by the caller. Returned as it is.
+
+        @return str: module name, 'UNSPECIFIED' if it can not be inferred.
+        """
+        if module_name is not None:
+            return module_name
+        try:
+            # 0 is this method, 1 the public save method and 2 the caller
+            frm = sys._getframe(2)
+            # that will extract the name of the module of the caller.
+            module_name = frm.f_globals['__name__'].split('.')[-1]
+        except:
+            # Sometimes it is not possible to get the object which called the save_data function
+            # (such as when calling this from the console).
+            module_name = 'UNSPECIFIED'
+        return module_name
+
+    def _prepare_save_job(self, data, module_name, filepath, parameters, filename, filelabel,
+                          timestamp, filetype, fmt, delimiter, plotfig):
+        """
+        Checks the data to save, determines path and filename and creates the file header.
+        This is the fast part of saving and always runs in the calling thread.
+
+        @return dict: save job to pass to _execute_save_job, None if the data can not be saved.
+        """
         start_time = time.time()
         # Create timestamp if none is present
         if timestamp is None:
@@ -336,7 +501,7 @@ class SaveLogic(GenericLogic):
                 except:
                     self.log.error('Casting data array of type "{0}" into numpy.ndarray failed. '
                                    'Could not save data.'.format(type(data[keyname])))
-                    return -1
+                    return None
 
             # determine dimensions
             if data[keyname].ndim < 3:
@@ -354,7 +519,7 @@ class SaveLogic(GenericLogic):
                     max_row_num += 1
             else:
                 self.log.error('Found data array with dimension >2. Unable to save data.')
-                return -1
+                return None
 
             # determine array data types
             if len(arr_dtype) > 0:
@@ -367,27 +532,13 @@ class SaveLogic(GenericLogic):
             self.log.error('Passed data dictionary contains 1D AND 2D arrays. This is not allowed. '
                            'Either fit all data arrays into a single 2D array or pass multiple 1D '
                            'arrays only. Saving data failed!')
-            return -1
-
-        # try to trace back the functioncall to the class which was calling it.
-        try:
-            frm = inspect.stack()[1]
-            # this will get the object, which called the save_data function.
-            mod = inspect.getmodule(frm[0])
-            # that will extract the name of the class.
-            module_name = mod.__name__.split('.')[-1]
-        except:
-            # Sometimes it is not possible to get the object which called the save_data function
-            # (such as when calling this from the console).
-            module_name = 'UNSPECIFIED'
+            return None
 
         # determine proper file path
         if filepath is None:
             filepath = self.get_path_for_module(module_name)
-        elif not os.path.exists(filepath):
-            os.makedirs(filepath)
-            self.log.info('Custom filepath does not exist. Created directory "{0}"'
-                          ''.format(filepath))
+        else:
+            self._make_directory(filepath)
 
         # create filelabel if none has been passed
         if filelabel is None:
@@ -397,16 +548,56 @@ class SaveLogic(GenericLogic):
 
         # determine proper unique filename to save if none has been passed
         if filename is None:
-            filename = timestamp.strftime('%Y%m%d-%H%M-%S' + '_' + filelabel + '.dat')
+            filename = self.get_filename(filelabel, timestamp)
 
         # Check format specifier.
         if not isinstance(fmt, str) and len(fmt) != len(data):
             self.log.error('Length of list of format specifiers and number of data items differs. '
                            'Saving not possible. Please pass exactly as many format specifiers as '
                            'data arrays.')
-            return -1
+            return None
+
+        # Check file type.
+        if filetype not in ('text', 'npz', 'container'):
+            self.log.error('Only saving of data as textfile, npz-file and container is implemented. '
+                           'Filetype "{0}" is not supported yet. Saving as textfile.'
+                           ''.format(filetype))
+            filetype = 'text'
 
         # Create header string for the file
+        header = self._create_header(module_name, timestamp, parameters)
+
+        save_job = dict()
+        save_job['start_time'] = start_time
+        save_job['data'] = data
+        save_job['module_name'] = module_name
+        save_job['filepath'] = filepath
+        save_job['filename'] = filename
+        save_job['timestamp'] = timestamp
+        save_job['filetype'] = filetype
+        save_job['fmt'] = fmt
+        save_job['delimiter'] = delimiter
+        save_job['header'] = header
+        save_job['parameters'] = parameters
+        save_job['plotfig'] = plotfig
+        save_job['close_figure'] = True
+        save_job['found_2d'] = found_2d
+        save_job['multiple_dtypes'] = multiple_dtypes
+        save_job['arr_dtype'] = arr_dtype
+        save_job['max_line_num'] = max_line_num
+        save_job['max_row_num'] = max_row_num
+        return save_job
+
+    def _create_header(self, module_name, timestamp, parameters):
+        """
+        Creates the header string with the parameters of a measurement.
+
+        @param str module_name: name of the module the data belongs to
+        @param datetime timestamp: time the data was saved
+        @param dict parameters: parameters to list in the header, can be None
+
+        @return str: the header
+        """
         header = 'Saved Data from the class {0} on {1}.\n' \
                  ''.format(module_name, timestamp.strftime('%d.%m.%Y at %Hh%Mm%Ss'))
         header += '\nParameters:\n===========\n\n'
@@ -428,16 +619,118 @@ class SaveLogic(GenericLogic):
                                'try to save the parameters nevertheless.')
                 header += 'not specified parameters: {0}\n'.format(parameters)
         header += '\nData:\n=====\n'
+        return header
+
+    def _set_container_metadata(self, container, module_name, timestamp, parameters, header):
+        """
+        Stores the measurement metadata as attributes of a DataContainer.
+        """
+        container.attrs['module'] = module_name
+        container.attrs['timestamp'] = timestamp.isoformat()
+        container.attrs['active_poi'] = self.active_poi_name
+        if isinstance(parameters, dict) or parameters is None:
+            container.attrs['parameters'] = parameters if parameters is not None else dict()
+        else:
+            container.attrs['parameters'] = str(parameters)
+        container.attrs['header'] = header
+        return
+
+    def create_container(self, filepath=None, parameters=None, filelabel=None, timestamp=None,
+                         module_name=None):
+        """
+        Creates an empty DataContainer to write large measurements to while they are running,
+        e.g. an image line by line. Path and name are chosen as in save_data.
+
+        Example:
+            container = savelogic.create_container(filepath, parameters, filelabel='xy_image')
+            image = container.create_dataset('counts', row_shape=(resolution,))
+            for line in scan:
+                image.append(line)
+            container.close()
+
+        @param string filepath: optional, directory to create the container in
+        @param dict parameters: optional, parameters stored as metadata of the container
+        @param string filelabel: optional, label used in the container name
+        @param datetime timestamp: optional, timestamp used in the container name
+        @param string module_name: optional, name of the module the data belongs to
+
+        @return DataContainer: container opened for writing. Call close() when done.
+        """
+        module_name = self._get_calling_module_name(module_name)
+        if timestamp is None:
+            timestamp = datetime.datetime.now()
+        if filepath is None:
+            filepath = self.get_path_for_module(module_name)
+        else:
+            self._make_directory(filepath)
+        if filelabel is None:
+            filelabel = module_name
+        if self.active_poi_name != '':
+            filelabel = self.active_poi_name.replace(' ', '_') + '_' + filelabel
+        filename = self.get_filename(filelabel, timestamp, extension='.qdc')
+
+        container = DataContainer(os.path.join(filepath, filename), mode='w')
+        header = self._create_header(module_name, timestamp, parameters)
+        self._set_container_metadata(container, module_name, timestamp, parameters, header)
+        container.flush()
+        return container
+
+    def open_container(self, path, mode='r'):
+        """
+        Opens a saved DataContainer. Datasets are read lazily, i.e. slicing a dataset only reads
+        the requested part from disk.
+
+        @param string path: path of the container (<filename>.qdc)
+        @param string mode: 'r' to read, 'a' to append to the datasets
+
+        @return DataContainer: the opened container
+        """
+        return DataContainer(path, mode=mode)
+
+    def load_container(self, path, mmap=True):
+        """
+        Loads all datasets and the metadata of a saved DataContainer.
+
+        @param string path: path of the container (<filename>.qdc)
+        @param bool mmap: return uncompressed datasets as read-only numpy.memmap instead of
+                          reading them into memory. Compressed datasets are always decompressed.
+
+        @return (OrderedDict, OrderedDict): dataset name: numpy.ndarray, container attributes
+        """
+        container = DataContainer(path, mode='r')
+        return container.load(mmap=mmap), container.attrs
+
+    def _execute_save_job(self, save_job):
+        """
+        Writes the data file and the figure of a save job created by _prepare_save_job.
+        This is the slow part of saving and runs either in the calling thread or in a worker.
+
+        @param dict save_job: save job as returned by _prepare_save_job
+
+        @return str: full path of the saved data file
+        """
+        data = save_job['data']
+        filepath = save_job['filepath']
+        filename = save_job['filename']
+        saved_filename = filename
+        timestamp = save_job['timestamp']
+        fmt = save_job['fmt']
+        delimiter = save_job['delimiter']
+        header = save_job['header']
+        arr_dtype = save_job['arr_dtype']
+        max_line_num = save_job['max_line_num']
+        max_row_num = save_job['max_row_num']
+        plotfig = save_job['plotfig']
 
         # write data to file
         # FIXME: Implement other file formats
         # write to textfile
-        if filetype == 'text':
+        if save_job['filetype'] == 'text':
             # Reshape data if multiple 1D arrays have been passed to this method.
             # If a 2D array has been passed, reformat the specifier
             if len(data) != 1:
                 identifier_str = ''
-                if multiple_dtypes:
+                if save_job['multiple_dtypes']:
                     field_dtypes = list(zip(['f{0:d}'.format(i) for i in range(len(arr_dtype))],
                                             arr_dtype))
                     new_array = np.empty(max_line_num, dtype=field_dtypes)
@@ -464,7 +757,7 @@ class SaveLogic(GenericLogic):
                                 new_array[length:, i] = np.nan
                 # discard old data array and use new one
                 data = {identifier_str: new_array}
-            elif found_2d:
+            elif save_job['found_2d']:
                 keyname = list(data.keys())[0]
                 identifier_str = keyname.replace(', ', delimiter).replace(',', delimiter)
                 data[identifier_str] = data.pop(keyname)
@@ -475,25 +768,28 @@ class SaveLogic(GenericLogic):
                                     fmt=fmt, header=header, delimiter=delimiter, comments='#',
                                     append=False)
         # write npz file and save parameters in textfile
-        elif filetype == 'npz':
+        elif save_job['filetype'] == 'npz':
             header += str(list(data.keys()))[1:-1]
             np.savez_compressed(filepath + '/' + filename[:-4], **data)
             self.save_array_as_text(data=[], filename=filename[:-4]+'_params.dat', filepath=filepath,
                                     fmt=fmt, header=header, delimiter=delimiter, comments='#',
                                     append=False)
-        else:
-            self.log.error('Only saving of data as textfile and npz-file is implemented. Filetype "{0}" is not '
-                           'supported yet. Saving as textfile.'.format(filetype))
-            self.save_array_as_text(data=data[identifier_str], filename=filename, filepath=filepath,
-                                    fmt=fmt, header=header, delimiter=delimiter, comments='#',
-                                    append=False)
+        # write chunked binary container with the parameters as metadata
+        elif save_job['filetype'] == 'container':
+            saved_filename = filename[:-4] + '.qdc'
+            with DataContainer(os.path.join(filepath, saved_filename), mode='w') as container:
+                self._set_container_metadata(container, save_job['module_name'], timestamp,
+                                             save_job['parameters'], header)
+                for keyname in data:
+                    container.create_dataset(keyname, data=data[keyname],
+                                             compression=self._container_compression)
 
         #--------------------------------------------------------------------------------------------
         # Save thumbnail figure of plot
         if plotfig is not None:
             # create Metadata
             metadata = dict()
-            metadata['Title'] = 'Image produced by qudi: ' + module_name
+            metadata['Title'] = 'Image produced by qudi: ' + save_job['module_name']
             metadata['Author'] = 'qudi - Software Suite'
             metadata['Subject'] = 'Find more information on: https://github.com/Ulm-IQO/qudi'
             metadata['Keywords'] = 'Python 3, Qt, experiment control, automation, measurement, software, framework, modular'
@@ -543,9 +839,12 @@ class SaveLogic(GenericLogic):
             png_image.save(fig_fname_image, "png", pnginfo=png_metadata)
 
             # close matplotlib figure
-            plt.close(plotfig)
-            self.log.debug('Time needed to save data: {0:.2f}s'.format(time.time()-start_time))
+            if save_job['close_figure']:
+                plt.close(plotfig)
+            self.log.debug('Time needed to save data: {0:.2f}s'
+                           ''.format(time.time() - save_job['start_time']))
             #----------------------------------------------------------------------------------
+        return os.path.join(filepath, saved_filename)
 
     def save_array_as_text(self, data, filename, filepath='', fmt='%.15e', header='',
                            delimiter='\t', comments='#', append=False):
@@ -565,6 +864,18 @@ class SaveLogic(GenericLogic):
         return
 
     def get_daily_directory(self):
+        """
+        Returns the daily directory. It is only looked up (and created) once per day.
+
+          @return string: path to the daily directory.
+        """
+        today = time.strftime('%Y%m%d')
+        if self._daily_directory[0] != today:
+            self._daily_directory = (today, self._create_daily_directory())
+            self._module_directories = dict()
+        return self._daily_directory[1]
+
+    def _create_daily_directory(self):
         """
         Creates the daily directory.
 
@@ -621,13 +932,141 @@ class SaveLogic(GenericLogic):
     def get_path_for_module(self, module_name):
         """
         Method that creates a path for 'module_name' where data are stored.
+        The path is only created once per day.
 
         @param string module_name: Specify the folder, which should be created in the daily
                                    directory. The module_name can be e.g. 'Confocal'.
         @return string: absolute path to the module name
         """
-        dir_path = os.path.join(self.get_daily_directory(), module_name)
+        daily_directory = self.get_daily_directory()
+        dir_path = self._module_directories.get(module_name)
+        if dir_path is None:
+            dir_path = os.path.join(daily_directory, module_name)
+            if not os.path.exists(dir_path):
+                os.makedirs(dir_path)
+            self._module_directories[module_name] = dir_path
+        return dir_path
+
+    def get_filename(self, filelabel, timestamp=None, extension='.dat',
+                     filename_template=None):
+        """
+        Creates the filename for a file saved at a certain time.
+
+        @param string filelabel: label to add to the filename
+        @param datetime timestamp: optional, time of saving. Default is now.
+        @param string extension: optional, file ending
+        @param string filename_template: optional, strftime format string with '{0}' as
+                                         placeholder for the filelabel
+
+        @return string: the filename
+        """
+        if timestamp is None:
+            timestamp = datetime.datetime.now()
+        if filename_template is None:
+            filename_template = self._filename_template
+        return timestamp.strftime(filename_template).format(filelabel) + extension
+
+    def get_save_context(self, module_name, filename_template=None):
+        """
+        Returns a SaveContext for a module. Logic modules should request it once (e.g. in
+        on_activate) and use it for all their saving.
+
+        @param string module_name: name of the module, e.g. 'Confocal'. Used as directory name in
+                                   the daily directory and in the file header.
+        @param string filename_template: optional, strftime format string with '{0}' as
+                                         placeholder for the filelabel
 
+        @return SaveContext: the save context for the module
+        """
+        return SaveContext(self, module_name, filename_template)
+
+    def _make_directory(self, dir_path):
+        """
+        Creates a custom directory if it does not exist. Known directories are not checked again.
+
+        @param string dir_path: the directory
+        """
+        if dir_path in self._known_directories:
+            return
         if not os.path.exists(dir_path):
             os.makedirs(dir_path)
-        return dir_path
+            self.log.info('Custom filepath does not exist. Created directory "{0}"'
+                          ''.format(dir_path))
+        self._known_directories.add(dir_path)
+        return
+
+
+class SaveContext:
+    """
+    Cached saving information of a single logic module. It holds the module name, the daily data
+    directory of the module and the filename template, so saving does not need to find out the
+    calling module or look up directories on every call.
+
+    Obtain it with SaveLogic.get_save_context and use its save methods like the ones of SaveLogic:
+
+        self._save_context = self._save_logic.get_save_context('Counter')
+        ...
+        self._save_context.save_data(data, parameters=parameters, filelabel='count_trace')
+    """
+
+    def __init__(self, savelogic, module_name, filename_template=None):
+        """
+        @param SaveLogic savelogic: the save logic to save with
+        @param string module_name: name of the module
+        @param string filename_template: optional, strftime format string with '{0}' as
+                                         placeholder for the filelabel
+        """
+        self._savelogic = savelogic
+        self.module_name = module_name
+        self.filename_template = filename_template
+
+    @property
+    def filepath(self):
+        """ Data directory of the module for today. The lookup is cached by the SaveLogic. """
+        return self._savelogic.get_path_for_module(self.module_name)
+
+    def get_filename(self, filelabel, timestamp=None, extension='.dat'):
+        """ See SaveLogic.get_filename. """
+        return self._savelogic.get_filename(filelabel, timestamp, extension,
+                                            filename_template=self.filename_template)
+
+    def get_labelled_filename(self, filelabel=None, timestamp=None, extension='.dat'):
+        """ Filename for <filelabel> as SaveLogic.save_data would create it, i.e. prefixed with
+        the name of the active POI.
+        """
+        if filelabel is None:
+            filelabel = self.module_name
+        if self._savelogic.active_poi_name != '':
+            filelabel = self._savelogic.active_poi_name.replace(' ', '_') + '_' + filelabel
+        return self.get_filename(filelabel, timestamp, extension)
+
+    def save_data(self, data, filepath=None, filename=None, filelabel=None, timestamp=None,
+                  **kwargs):
+        """ Same as SaveLogic.save_data, but using the cached module information. """
+        filepath, filename = self._resolve(filepath, filename, filelabel, timestamp)
+        return self._savelogic.save_data(data, filepath=filepath, filename=filename,
+                                         filelabel=filelabel, timestamp=timestamp,
+                                         module_name=self.module_name, **kwargs)
+
+    def save_data_async(self, data, filepath=None, filename=None, filelabel=None, timestamp=None,
+                        **kwargs):
+        """ Same as SaveLogic.save_data_async, but using the cached module information. """
+        filepath, filename = self._resolve(filepath, filename, filelabel, timestamp)
+        return self._savelogic.save_data_async(data, filepath=filepath, filename=filename,
+                                               filelabel=filelabel, timestamp=timestamp,
+                                               module_name=self.module_name, **kwargs)
+
+    def create_container(self, filepath=None, **kwargs):
+        """ Same as SaveLogic.create_container, but using the cached module information. """
+        if filepath is None:
+            filepath = self.filepath
+        return self._savelogic.create_container(filepath=filepath, module_name=self.module_name,
+                                                **kwargs)
+
+    def _resolve(self, filepath, filename, filelabel, timestamp):
+        """ Fill in the default filepath and, for custom templates, the filename. """
+        if filepath is None:
+            filepath = self.filepath
+        if filename is None and self.filename_template is not None:
+            filename = self.get_labelled_filename(filelabel, timestamp)
+        return filepath, filename
@@ -26,6 +26,7 @@ import numpy as np
 import os
 import pickle
 import sys
+import tempfile
 import time
 
 from qtpy import QtCore
@@ -34,13 +35,20 @@ from core.module import StatusVar, ConfigOption
 from core.util.modules import get_home_dir
 from core.util.modules import get_main_dir
 
+from logic.digital_samples import PackedDigitalSamples
+from logic.digital_samples import digital_word_dtype
 from logic.pulse_objects import PulseBlockElement
 from logic.pulse_objects import PulseBlock
 from logic.pulse_objects import PulseBlockEnsemble
 from logic.pulse_objects import PulseSequence
 from logic.generic_logic import GenericLogic
+from logic.sampling_engine import EnsembleSegments
+from logic.sampling_engine import SamplingEngine
+from logic.sampling_engine import split_segment_ranges
 from logic.sampling_functions import SamplingFunctions
 from logic.samples_write_methods import SamplesWriteMethods
+from logic.waveform_cache import WaveformCache
+from logic.waveform_cache import waveform_cache_key
 
 
 class SequenceGeneratorLogic(GenericLogic, SamplingFunctions, SamplesWriteMethods):
@@ -75,13 +83,22 @@ class SequenceGeneratorLogic(GenericLogic, SamplingFunctions, SamplesWriteMethod
     sample_rate = StatusVar('sample_rate', 25e9)
 
     _config_waveform_format = ConfigOption('default_waveform_format', default='wfmx')
+    # max. number of samples evaluated at once by the sampling engine (float64 temporary arrays)
+    _sampling_batch_samples = ConfigOption('sampling_batch_samples', default=2**22)
+    # number of threads sampling channels and element ranges in parallel (0: number of CPUs)
+    _sampling_workers = ConfigOption('sampling_workers', default=1)
+    # Sample arrays of at least this size (in bytes) are backed by memory-mapped files in
+    # temp_dir instead of RAM if chunkwise sampling is disabled. None: always use RAM.
+    _memmap_threshold_bytes = ConfigOption('memmap_threshold_bytes', default=None)
+    # Maximum size (in bytes) of the on-disk cache of sampled waveforms. None or 0: no caching.
+    _waveform_cache_bytes = ConfigOption('waveform_cache_bytes', default=None)
     waveform_format = StatusVar('waveform_format', None)
 
     # define signals
     sigBlockDictUpdated = QtCore.Signal(dict)
     sigEnsembleDictUpdated = QtCore.Signal(dict)
     sigSequenceDictUpdated = QtCore.Signal(dict)
-    sigSampleEnsembleComplete = QtCore.Signal(str, np.ndarray, np.ndarray)
+    sigSampleEnsembleComplete = QtCore.Signal(str, object, object)
     sigSampleSequenceComplete = QtCore.Signal(str, list)
     sigCurrentBlockUpdated = QtCore.Signal(object)
     sigCurrentEnsembleUpdated = QtCore.Signal(object)
@@ -103,6 +120,13 @@ class SequenceGeneratorLogic(GenericLogic, SamplingFunctions, SamplesWriteMethod
         SamplingFunctions.__init__(self)
         # Get all the attributes from the SamplesWriteMethods module:
         SamplesWriteMethods.__init__(self)
+        # Vectorized sampling engine evaluating the sampling functions of whole ensembles
+        sampling_workers = self._sampling_workers
+        if sampling_workers < 1:
+            sampling_workers = os.cpu_count() or 1
+        self._sampling_engine = SamplingEngine(self._math_func, self._vectorizable_func,
+                                               self._sampling_batch_samples,
+                                               workers=sampling_workers)
 
         # here the currently shown data objects of the editors should be stored
         self.current_block = None
@@ -160,6 +184,13 @@ class SequenceGeneratorLogic(GenericLogic, SamplingFunctions, SamplesWriteMethod
         self.sequence_dir = self._get_dir_for_name('sequence_objects')
         self.waveform_dir = self._get_dir_for_name('sampled_hardware_files')
         self.temp_dir = self._get_dir_for_name('temporary_files')
+        if self._waveform_cache_bytes:
+            self._waveform_cache = WaveformCache(self._get_dir_for_name('waveform_cache'),
+                                                 self._waveform_cache_bytes)
+        else:
+            self._waveform_cache = None
+        # memory-mapped sample buffer files which could not be removed yet (still mapped)
+        self._sample_buffer_files = list()
 
         # Information on used channel configuration for sequence generation
         # IMPORTANT: THIS CONFIG DOES NOT REPRESENT THE ACTUAL SETTINGS ON THE HARDWARE
@@ -191,6 +222,8 @@ class SequenceGeneratorLogic(GenericLogic, SamplingFunctions, SamplesWriteMethod
     def on_deactivate(self):
         """ Deinitialisation performed during deactivation of the module.
         """
+        self._sampling_engine.shutdown()
+        self._remove_sample_buffer_files()
         return
 
     def _attach_predefined_methods(self):
@@ -753,6 +786,163 @@ class SequenceGeneratorLogic(GenericLogic, SamplingFunctions, SamplesWriteMethod
 
         return number_of_samples, total_elements, elements_length_bins, digital_rising_bins
 
+    def _create_sample_buffer(self, shape, dtype):
+        """ Create a sample array of the given shape, either in RAM or backed by a memory-mapped
+        file in temp_dir (see config option "memmap_threshold_bytes").
+
+        @param tuple shape: shape of the array
+        @param dtype: numpy data type of the array
+
+        @return numpy.ndarray: the (uninitialized) array. numpy.memmap if memory-mapped.
+        """
+        nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        if self._memmap_threshold_bytes is None or nbytes < self._memmap_threshold_bytes \
+                or nbytes == 0:
+            return np.empty(shape, dtype=dtype)
+        fd, path = tempfile.mkstemp(suffix='.smp', dir=self.temp_dir)
+        os.close(fd)
+        buffer = np.memmap(path, dtype=dtype, mode='w+', shape=shape)
+        # The mapping stays valid after removing the file (except on Windows, where the file is
+        # removed later on).
+        self._sample_buffer_files.append(path)
+        self._remove_sample_buffer_files()
+        return buffer
+
+    def _remove_sample_buffer_files(self):
+        """ Remove all memory-mapped sample buffer files that are not in use anymore. """
+        remaining_files = list()
+        for path in self._sample_buffer_files:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                remaining_files.append(path)
+        self._sample_buffer_files = remaining_files
+        return
+
+    def _delete_sampled_files(self, filename):
+        """ Delete all sampled hardware files with the given name from the waveform directory.
+
+        @param str filename: name of the files (excluding the channel suffix, i.e. '_ch1')
+        """
+        # get sampled filenames on host PC referring to the same ensemble
+
+        # be careful, in contrast to linux os, windows os is in general case
+        # insensitive! Therefore one needs to check and remove all files
+        # matching the case insensitive case for windows os.
+
+        if 'win' in sys.platform:
+            # make it simple and make everything lowercase.
+            filename_list = [f for f in os.listdir(self.waveform_dir) if
+                             f.lower().startswith(filename.lower() + '_ch')]
+
+
+        else:
+            filename_list = [f for f in os.listdir(self.waveform_dir) if
+                             f.startswith(filename + '_ch')]
+        # delete all filenames in the list
+        for file in filename_list:
+            os.remove(os.path.join(self.waveform_dir, file))
+
+        if len(filename_list) != 0:
+            self.log.info('Found old sampled ensembles for name "{0}". Files deleted before '
+                          'sampling: {1}'.format(filename, filename_list))
+        return
+
+    @staticmethod
+    def _add_created_files(created_files, files):
+        """ Add the file names returned by a write_to_file method to a list (without duplicates).
+        """
+        if isinstance(files, list):
+            for file in files:
+                if file not in created_files:
+                    created_files.append(file)
+        return
+
+    def _get_waveform_cache_key(self, ensemble, write_to_file, offset_bin):
+        """ Content hash of an ensemble together with all settings the sampled waveform depends on.
+        """
+        return waveform_cache_key(
+            ensemble,
+            sample_rate=float(self.sample_rate),
+            activation_config=tuple(self.activation_config),
+            amplitude_dict=tuple(sorted(self.amplitude_dict.items())),
+            waveform_format=self.waveform_format if write_to_file else None,
+            offset_bin=int(offset_bin))
+
+    def _restore_from_waveform_cache(self, cache_key, cache_entry, ensemble_name, ensemble,
+                                     filename, write_to_file):
+        """ Provide the sampled waveform of an ensemble out of the waveform cache.
+
+        The analysis results are stored in the ensemble object like after sampling.
+
+        @return tuple: (analog_samples, digital_samples). Empty arrays if write_to_file is True.
+        """
+        info = cache_entry['info']
+        ensemble.length_bins = info['length_bins']
+        ensemble.length_elements_bins = info['length_elements_bins']
+        ensemble.number_of_elements = info['number_of_elements']
+        ensemble.digital_rising_bins = info['digital_rising_bins']
+        ensemble.sample_rate = self.sample_rate
+        ensemble.activation_config = self.activation_config
+        ensemble.amplitude_dict = self.amplitude_dict
+        self.save_ensemble(ensemble_name, ensemble)
+
+        if not write_to_file:
+            analog_samples, digital_samples = self._waveform_cache.load_arrays(cache_key)
+            self.log.info('Waveform cache hit for PulseBlockEnsemble "{0}". Sample arrays loaded '
+                          'from cache.'.format(ensemble_name))
+            return analog_samples, digital_samples
+
+        if cache_entry['type'] != 'files':
+            self.log.error('Waveform cache entry for PulseBlockEnsemble "{0}" contains no files.'
+                           ''.format(ensemble_name))
+        elif self._waveform_cache.is_placed(cache_entry, self.waveform_dir, filename):
+            self.log.info('Waveform cache hit for PulseBlockEnsemble "{0}". Files "{1}" are '
+                          'up to date.'.format(ensemble_name, filename))
+        else:
+            self._delete_sampled_files(filename)
+            restored_files = self._waveform_cache.restore_files(cache_key, self.waveform_dir,
+                                                                filename)
+            self.log.info('Waveform cache hit for PulseBlockEnsemble "{0}". Files restored from '
+                          'cache: {1}'.format(ensemble_name, restored_files))
+        return np.array([]), np.array([])
+
+    def _store_files_in_waveform_cache(self, cache_key, ensemble_name, filename, created_files,
+                                       cache_info):
+        """ Add the hardware files written for an ensemble to the waveform cache. """
+        if cache_key is None or not created_files:
+            return
+        try:
+            stored = self._waveform_cache.store_files(cache_key, ensemble_name, self.waveform_dir,
+                                                      filename, created_files, cache_info)
+        except OSError as e:
+            self.log.warning('Could not add sampled files of PulseBlockEnsemble "{0}" to the '
+                             'waveform cache: {1}'.format(ensemble_name, e))
+            return
+        if not stored:
+            self.log.debug('Sampled files of PulseBlockEnsemble "{0}" are too large for the '
+                           'waveform cache.'.format(ensemble_name))
+        return
+
+    def get_waveform_cache_entries(self):
+        """ Get a summary of all waveforms in the waveform cache.
+
+        @return list: list of dicts (one per cached waveform, least recently used first) with the
+                      keys 'key', 'ensemble', 'type', 'files', 'size' and 'last_used'
+        """
+        if self._waveform_cache is None:
+            return list()
+        return self._waveform_cache.get_entries()
+
+    def clear_waveform_cache(self):
+        """ Remove all waveforms from the waveform cache. """
+        if self._waveform_cache is not None:
+            self._waveform_cache.clear()
+            self.log.info('Waveform cache cleared.')
+        return
+
     def sample_pulse_block_ensemble(self, ensemble_name, write_to_file=True, offset_bin=0,
                                     name_tag=None):
         """ General sampling of a PulseBlockEnsemble object, which serves as the construction plan.
@@ -774,7 +964,8 @@ class SequenceGeneratorLogic(GenericLogic, SamplingFunctions, SamplesWriteMethod
                         analog_samples:
                             numpy arrays containing the sampled voltages
                         digital_samples:
-                            numpy arrays containing the sampled logic levels
+                            PackedDigitalSamples containing the sampled logic levels (one bit
+                            per channel and sample)
                         [<created_files>]:
                             list of strings, with the actual created files through the pulsing
                             device
@@ -783,22 +974,28 @@ class SequenceGeneratorLogic(GenericLogic, SamplingFunctions, SamplesWriteMethod
 
         This method is creating the actual samples (voltages and logic states) for each time step
         of the analog and digital channels specified in the PulseBlockEnsemble.
-        Therefore it iterates through all blocks, repetitions and elements of the ensemble and
-        calculates the exact voltages (float64) according to the specified math_function. The
-        samples are later on stored inside a float32 array.
+        Therefore the ensemble is compiled into a flat table of all elements including repetitions
+        (see logic.sampling_engine.EnsembleSegments) and the sampling engine calculates the exact
+        voltages (float64) according to the specified math_function. Elementwise functions are
+        evaluated for all elements using them in batched, vectorized passes. The samples are
+        later on stored inside a float32 array.
         So each element is calculated with high precision (float64) and then down-converted to
         float32 to be stored.
 
         To preserve the rotating frame, an offset counter is used to indicate the absolute time
         within the ensemble. All calculations are done with time bins (dtype=int) to avoid rounding
-        errors. Only in the last step when a single PulseBlockElement object is sampled  these
-        integer bin values are translated into a floating point time.
+        errors. Only in the last step when the samples are evaluated these integer bin values are
+        translated into a floating point time.
 
-        The chunkwise write mode is used to save memory usage at the expense of time. Here for each
-        PulseBlockElement the write_to_file method in the HW module is called to avoid large
-        arrays inside the memory. In other words: The whole sample arrays are never created at any
-        time. This results in more function calls and general overhead causing the much longer time
-        to complete.
+        The chunkwise write mode is used to save memory usage at the expense of time. Here groups
+        of consecutive PulseBlockElements fitting into the memory overhead ("overhead_bytes") are
+        sampled and passed to the write_to_file method one after another to avoid large arrays
+        inside the memory. In other words: The whole sample arrays are never created at any time.
+
+        File formats describing the digital channels as a list of events (see
+        _write_events_to_file, e.g. for the PulseStreamer) are not sampled at all. The consecutive
+        elements with equal digital states are merged into runs and written directly, so the
+        effort only depends on the number of elements and not on their length.
 
         In addition the pulse_block_ensemble gets analyzed and important parameters used during
         sampling get stored in the ensemble object itself. Those attributes are:
@@ -823,31 +1020,6 @@ class SequenceGeneratorLogic(GenericLogic, SamplingFunctions, SamplesWriteMethod
             filename = ensemble_name
         else:
             filename = name_tag
-        # check for old files associated with the new ensemble and delete them from host PC
-        if write_to_file:
-            # get sampled filenames on host PC referring to the same ensemble
-
-            # be careful, in contrast to linux os, windows os is in general case
-            # insensitive! Therefore one needs to check and remove all files
-            # matching the case insensitive case for windows os.
-
-            if 'win' in sys.platform:
-                # make it simple and make everything lowercase.
-                filename_list = [f for f in os.listdir(self.waveform_dir) if
-                                 f.lower().startswith(filename.lower() + '_ch')]
-
-
-            else:
-                filename_list = [f for f in os.listdir(self.waveform_dir) if
-                                 f.startswith(filename + '_ch')]
-            # delete all filenames in the list
-            for file in filename_list:
-                os.remove(os.path.join(self.waveform_dir, file))
-
-            if len(filename_list) != 0:
-                self.log.info('Found old sampled ensembles for name "{0}". Files deleted before '
-                              'sampling: {1}'.format(filename, filename_list))
-
         start_time = time.time()
         # get ensemble
         ensemble = self.saved_pulse_block_ensembles[ensemble_name]
@@ -864,6 +1036,23 @@ class SequenceGeneratorLogic(GenericLogic, SamplingFunctions, SamplesWriteMethod
                                      ana_channels, dig_channels))
             return np.array([]), np.array([]), -1
 
+        # reuse the samples if the same waveform has been sampled before
+        cache_key = None
+        if self._waveform_cache is not None:
+            cache_key = self._get_waveform_cache_key(ensemble, write_to_file, offset_bin)
+            cache_entry = self._waveform_cache.lookup(cache_key)
+            if cache_entry is not None:
+                analog_samples, digital_samples = self._restore_from_waveform_cache(
+                    cache_key, cache_entry, ensemble_name, ensemble, filename, write_to_file)
+                if not sequence_sampling_in_progress:
+                    self.module_state.unlock()
+                self.sigSampleEnsembleComplete.emit(filename, analog_samples, digital_samples)
+                return analog_samples, digital_samples, cache_entry['info']['end_offset_bin']
+
+        # check for old files associated with the new ensemble and delete them from host PC
+        if write_to_file:
+            self._delete_sampled_files(filename)
+
         # get important parameters from the ensemble and save some to the ensemble object
         number_of_samples, number_of_elements, length_elements_bins, digital_rising_bins = self._analyze_block_ensemble(ensemble)
         ensemble.length_bins = number_of_samples
@@ -875,88 +1064,88 @@ class SequenceGeneratorLogic(GenericLogic, SamplingFunctions, SamplesWriteMethod
         ensemble.amplitude_dict = self.amplitude_dict
         self.save_ensemble(ensemble_name, ensemble)
 
-        # The time bin offset for each element to be sampled to preserve rotating frame.
-        if chunkwise and write_to_file:
-            # Flags and counter for chunkwise writing
-            is_first_chunk = True
-            is_last_chunk = False
+        # compile the ensemble into a flat table of element segments
+        segments = EnsembleSegments(ensemble, length_elements_bins, offset_bin)
+        amplitudes = [self.amplitude_dict[chnl] for chnl in ana_chnl_names]
+        # names of the files created by the write_to_file method
+        created_files = list()
+        # number of analog samples evaluated by the sampling engine (not copied from repetitions)
+        evaluated_samples = 0
+
+        # Formats describing the digital channels by events (e.g. PulseStreamer) are written
+        # directly from the run-length representation of the ensemble without any sampling.
+        write_events = write_to_file and self.waveform_format in self._write_events_to_file
+        if write_events:
+            run_lengths, run_states = segments.digital_runs(dig_channels)
+            files = self._write_events_to_file[self.waveform_format](filename, run_lengths,
+                                                                     run_states)
+            self._add_created_files(created_files, files)
+            self.log.info('PulseBlockEnsemble "{0}" compiled to {1:d} digital events for {2:d} '
+                          'samples.'.format(ensemble_name, run_lengths.size, number_of_samples))
+        elif chunkwise and write_to_file:
+            # Sample and write groups of consecutive elements. Each group is as large as possible
+            # within the memory overhead (at least one element).
+            bytes_per_sample = 4 * ana_channels + digital_word_dtype(dig_channels).itemsize
+            max_chunk_samples = max(1, self.sampling_overhead_bytes // max(1, bytes_per_sample))
+            chunk_ranges = split_segment_ranges(segments.length_bins, max_chunk_samples)
+            for chunk_index, (first, last) in enumerate(chunk_ranges):
+                chunk_samples = segments.samples_in_range(first, last)
+                analog_samples = np.empty([ana_channels, chunk_samples], dtype='float32')
+                digital_samples = PackedDigitalSamples.empty(dig_channels, chunk_samples)
+                evaluated_samples += self._sampling_engine.sample(
+                    segments, self.sample_rate, amplitudes, analog_samples, digital_samples,
+                    first, last)
+                # write temporary sample array to file
+                files = self._write_to_file[self.waveform_format](
+                    filename, analog_samples, digital_samples, number_of_samples,
+                    chunk_index == 0, chunk_index == len(chunk_ranges) - 1)
+                self._add_created_files(created_files, files)
         else:
-            # Allocate huge sample arrays if chunkwise writing is disabled.
-            analog_samples = np.empty([ana_channels, number_of_samples], dtype='float32')
-            digital_samples = np.empty([dig_channels, number_of_samples], dtype=bool)
-            # Starting index for the sample array entrys
-            entry_ind = 0
-
-        element_count = 0
-        # Iterate over all blocks within the PulseBlockEnsemble object
-        for block, reps in ensemble.block_list:
-            # Iterate over all repertitions of the current block
-            for rep_no in range(reps+1):
-                # Iterate over the Block_Elements inside the current block
-                for elem_ind, block_element in enumerate(block.element_list):
-                    parameters = block_element.parameters
-                    digital_high = block_element.digital_high
-                    pulse_function = block_element.pulse_function
-                    element_length_bins = length_elements_bins[element_count]
-                    element_count += 1
-
-                    # create floating point time array for the current element inside rotating frame
-                    time_arr = (offset_bin + np.arange(element_length_bins, dtype='float64')) / self.sample_rate
-
-                    if chunkwise and write_to_file:
-                        # determine it the current element is the last one to be sampled.
-                        # Toggle the is_last_chunk flag accordingly.
-                        if element_count == number_of_elements:
-                            is_last_chunk = True
-
-                        # allocate temporary sample arrays to contain the current element
-                        analog_samples = np.empty([ana_channels, element_length_bins], dtype='float32')
-                        digital_samples = np.empty([dig_channels, element_length_bins], dtype=bool)
-
-                        # actually fill the allocated sample arrays with values.
-                        for i, state in enumerate(digital_high):
-                            digital_samples[i] = np.full(element_length_bins, state, dtype=bool)
-                        for i, func_name in enumerate(pulse_function):
-                            analog_samples[i] = np.float32(self._math_func[func_name](time_arr, parameters[i])/self.amplitude_dict[ana_chnl_names[i]])
-                        # write temporary sample array to file
-                        self._write_to_file[self.waveform_format](filename, analog_samples,
-                                                                  digital_samples,
-                                                                  number_of_samples, is_first_chunk,
-                                                                  is_last_chunk)
-                        # set flag to FALSE after first write
-                        is_first_chunk = False
-                    else:
-                        # if the ensemble should be sampled as a whole (chunkwise = False) fill the
-                        # entries in the huge sample arrays
-                        for i, state in enumerate(digital_high):
-                            digital_samples[i, entry_ind:entry_ind+element_length_bins] = np.full(element_length_bins, state, dtype=bool)
-                        for i, func_name in enumerate(pulse_function):
-                            analog_samples[i, entry_ind:entry_ind+element_length_bins] = np.float32(self._math_func[func_name](time_arr, parameters[i])/self.amplitude_dict[ana_chnl_names[i]])
-
-                        # increment the index offset of the overall sample array for the next
-                        # element
-                        entry_ind += element_length_bins
-
-                    # if the rotating frame should be preserved (default) increment the offset
-                    # counter for the time array.
-                    if ensemble.rotating_frame:
-                        offset_bin += element_length_bins
+            # Allocate huge sample arrays if chunkwise writing is disabled and sample the whole
+            # ensemble at once. Very large arrays are memory-mapped.
+            analog_samples = self._create_sample_buffer((ana_channels, number_of_samples),
+                                                        'float32')
+            digital_samples = PackedDigitalSamples(
+                dig_channels,
+                self._create_sample_buffer((number_of_samples,), digital_word_dtype(dig_channels)))
+            evaluated_samples = self._sampling_engine.sample(segments, self.sample_rate,
+                                                             amplitudes, analog_samples,
+                                                             digital_samples)
+        total_samples = number_of_samples * ana_channels
+        if not write_events and total_samples > evaluated_samples:
+            self.log.info('Repeated elements in PulseBlockEnsemble "{0}": {1:d} of {2:d} analog '
+                          'samples evaluated, {3:.1f}% reused.'
+                          ''.format(ensemble_name, evaluated_samples, total_samples,
+                                    100 * (1 - evaluated_samples / total_samples)))
+
+        # offset for the next ensemble to preserve the rotating frame
+        offset_bin = segments.end_offset_bin
+        cache_info = {'length_bins': number_of_samples,
+                      'length_elements_bins': length_elements_bins,
+                      'number_of_elements': number_of_elements,
+                      'digital_rising_bins': digital_rising_bins,
+                      'end_offset_bin': offset_bin}
 
         if not write_to_file:
             # return a status message with the time needed for sampling the entire ensemble as a
             # whole without writing to file.
             self.log.info('Time needed for sampling and writing PulseBlockEnsemble to file as a '
                           'whole: {0} sec.'.format(int(np.rint(time.time() - start_time))))
+            if cache_key is not None:
+                self._waveform_cache.store_arrays(cache_key, ensemble_name, analog_samples,
+                                                  digital_samples, cache_info)
             # return the sample arrays for write_to_file was set to FALSE
             if not sequence_sampling_in_progress:
                 self.module_state.unlock()
             self.sigSampleEnsembleComplete.emit(filename, analog_samples, digital_samples)
             return analog_samples, digital_samples, offset_bin
-        elif chunkwise:
+        elif chunkwise or write_events:
             # return a status message with the time needed for sampling and writing the ensemble
-            # chunkwise.
+            # chunkwise (or writing its digital events).
             self.log.info('Time needed for sampling and writing to file chunkwise: {0} sec'
                           ''.format(int(np.rint(time.time()-start_time))))
+            self._store_files_in_waveform_cache(cache_key, ensemble_name, filename, created_files,
+                                                cache_info)
             if not sequence_sampling_in_progress:
                 self.module_state.unlock()
             self.sigSampleEnsembleComplete.emit(filename, np.array([]), np.array([]))
@@ -966,13 +1155,19 @@ class SequenceGeneratorLogic(GenericLogic, SamplingFunctions, SamplesWriteMethod
             # write_to_file method only once with both flags set to TRUE
             is_first_chunk = True
             is_last_chunk = True
-            self._write_to_file[self.waveform_format](filename, analog_samples, digital_samples,
-                                                      number_of_samples, is_first_chunk,
-                                                      is_last_chunk)
+            files = self._write_to_file[self.waveform_format](filename, analog_samples,
+                                                              digital_samples, number_of_samples,
+                                                              is_first_chunk, is_last_chunk)
+            self._add_created_files(created_files, files)
+            # release memory-mapped sample buffers
+            del analog_samples, digital_samples
+            self._remove_sample_buffer_files()
             # return a status message with the time needed for sampling and writing the ensemble as
             # a whole.
             self.log.info('Time needed for sampling and writing PulseBlockEnsemble to file as a '
                           'whole: {0} sec'.format(int(np.rint(time.time()-start_time))))
+            self._store_files_in_waveform_cache(cache_key, ensemble_name, filename, created_files,
+                                                cache_info)
 
             if not sequence_sampling_in_progress:
                 self.module_state.unlock()
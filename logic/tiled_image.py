@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the tiled, multi-resolution image store of the confocal scans.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import numpy as np
+
+DEFAULT_TILE_SIZE = 256
+
+
+class TiledImage:
+    """
+    Confocal image which can be indexed like the dense image array of shape
+    (rows, columns, 3 + channels), where each pixel is [x, y, z, counts of each channel].
+
+    The x, y and z positions are stored as vectors along the rows or the columns of the image, the
+    counts in square tiles. Tiles which were never written are not stored and read as zero.
+    Downsampled versions of the tiles (the levels of the pyramid, each halving the size) are
+    computed when they are requested for an overview and are kept until the tile is written.
+    A copy shares all tiles with the original. A tile is only copied when it is written in one of
+    them (copy on write), so a copy of an image which is scanned further costs only the tiles
+    written after the copy.
+
+    Integer, slice and index array indices are supported for rows, columns and fields. Index arrays
+    select rows, columns and fields independently, like numpy.ix_.
+    """
+    def __init__(self, coordinates, channels, tile_size=DEFAULT_TILE_SIZE):
+        """
+        @param list coordinates: for x, y and z a tuple (dimension, values), with dimension 0 if the
+                                 position changes along the rows (values has one entry per row) or
+                                 1 if it changes along the columns (one entry per column)
+        @param int channels: number of count channels
+        @param int tile_size: number of rows and columns of a tile, a power of 2
+        """
+        if len(coordinates) != 3:
+            raise ValueError('The x, y and z coordinates of the image are needed.')
+        if tile_size < 1 or tile_size & (tile_size - 1) != 0:
+            raise ValueError('The tile size has to be a power of 2, not {0}.'.format(tile_size))
+        size = [None, None]
+        self._coordinates = list()
+        for dimension, values in coordinates:
+            values = np.array(values, dtype=float).ravel()
+            if size[dimension] is not None and size[dimension] != values.size:
+                raise ValueError('The coordinates along the same dimension differ in length.')
+            size[dimension] = values.size
+            self._coordinates.append((dimension, values))
+        if None in size:
+            raise ValueError('The coordinates do not define the number of rows and columns.')
+        self.rows, self.columns = size
+        self.channels = int(channels)
+        self.tile_size = int(tile_size)
+        self._tiles = dict()
+        # keys of the tiles and whether the coordinates are not shared with a copy
+        self._owned_tiles = set()
+        self._owns_coordinates = True
+        # downsampled tiles: {tile key: {level: array}}
+        self._pyramid = dict()
+
+    @classmethod
+    def from_array(cls, image, tile_size=DEFAULT_TILE_SIZE):
+        """ Tiled image of a dense image array.
+
+        @param numpy.ndarray image: array of shape (rows, columns, 3 + channels)
+
+        @return TiledImage: the image, ValueError if a position changes along both dimensions
+        """
+        image = np.asarray(image, dtype=float)
+        if image.ndim != 3 or image.shape[2] < 3:
+            raise ValueError('An image array has the shape (rows, columns, 3 + channels).')
+        coordinates = list()
+        for axis in range(3):
+            positions = image[:, :, axis]
+            if np.all(positions == positions[:, :1]):
+                coordinates.append((0, positions[:, 0]))
+            elif np.all(positions == positions[:1, :]):
+                coordinates.append((1, positions[0, :]))
+            else:
+                raise ValueError('Position {0} of the image changes along the rows and the '
+                                 'columns.'.format('xyz'[axis]))
+        tiled_image = cls(coordinates, image.shape[2] - 3, tile_size=tile_size)
+        tiled_image[:, :, 3:] = image[:, :, 3:]
+        return tiled_image
+
+    @property
+    def shape(self):
+        return self.rows, self.columns, 3 + self.channels
+
+    @property
+    def ndim(self):
+        return 3
+
+    @property
+    def dtype(self):
+        return np.dtype(float)
+
+    @property
+    def nbytes(self):
+        """ Memory of the counts and the coordinates, without the pyramid. """
+        return (sum(tile.nbytes for tile in self._tiles.values())
+                + sum(values.nbytes for dimension, values in self._coordinates))
+
+    def __len__(self):
+        return self.rows
+
+    def __array__(self, dtype=None, copy=None):
+        image = self[:, :, :]
+        return image if dtype is None else image.astype(dtype)
+
+    def copy(self):
+        """ Copy of the image which shares the tiles and coordinates until they are written.
+
+        @return TiledImage: the copy
+        """
+        image = TiledImage.__new__(TiledImage)
+        image.rows, image.columns = self.rows, self.columns
+        image.channels = self.channels
+        image.tile_size = self.tile_size
+        image._coordinates = list(self._coordinates)
+        image._tiles = dict(self._tiles)
+        image._pyramid = dict(self._pyramid)
+        image._owned_tiles = set()
+        image._owns_coordinates = False
+        self._owned_tiles = set()
+        self._owns_coordinates = False
+        return image
+
+    def coordinate(self, axis):
+        """ Positions of the pixels along one axis.
+
+        @param int axis: 0, 1 or 2 for x, y or z
+
+        @return tuple(int, numpy.ndarray): dimension (0: rows, 1: columns) along which the position
+                                           changes and a copy of the positions
+        """
+        dimension, values = self._coordinates[axis]
+        return dimension, values.copy()
+
+    def channel(self, channel, level=0):
+        """ Counts of one channel, downsampled for an overview.
+
+        @param int channel: index of the count channel
+        @param int level: level of the pyramid, each level halves the number of rows and columns
+                          by averaging 2x2 pixels of the level below
+
+        @return numpy.ndarray: counts of shape (ceil(rows / 2**level), ceil(columns / 2**level))
+        """
+        factor = 2 ** level
+        if factor > self.tile_size:
+            raise ValueError('The pyramid has {0:d} levels.'.format(
+                int(np.log2(self.tile_size)) + 1))
+        step = self.tile_size // factor
+        data = np.zeros((-(-self.rows // factor), -(-self.columns // factor)))
+        for (tile_row, tile_column), tile in self._tiles.items():
+            if level > 0:
+                tile = self._tile_level((tile_row, tile_column), level)
+            data[tile_row * step:tile_row * step + tile.shape[0],
+                 tile_column * step:tile_column * step + tile.shape[1]] = tile[:, :, channel]
+        return data
+
+    def overview_level(self, rows, columns):
+        """ Coarsest level of the pyramid with at least the given number of rows and columns.
+
+        @param int rows: number of rows needed, e.g. the height of the display in pixels
+        @param int columns: number of columns needed
+
+        @return int: the level for channel
+        """
+        level = 0
+        while (2 ** (level + 1) <= self.tile_size
+               and -(-self.rows // 2 ** (level + 1)) >= rows
+               and -(-self.columns // 2 ** (level + 1)) >= columns):
+            level += 1
+        return level
+
+    def __getitem__(self, key):
+        (rows, columns, fields), squeeze = self._indices(key)
+        data = np.zeros((rows.size, columns.size, fields.size))
+        for i, field in enumerate(fields):
+            if field < 3:
+                dimension, values = self._coordinates[field]
+                if dimension == 0:
+                    data[:, :, i] = values[rows, np.newaxis]
+                else:
+                    data[:, :, i] = values[np.newaxis, columns]
+
+        count_fields = np.flatnonzero(fields >= 3)
+        if count_fields.size > 0:
+            channels = fields[count_fields] - 3
+            for key, target, source in self._tile_selections(rows, columns):
+                tile = self._tiles.get(key)
+                if tile is not None:
+                    data[self._outer(*target, count_fields)] = tile[self._outer(*source, channels)]
+        return data[tuple(0 if single else slice(None) for single in squeeze)]
+
+    def __setitem__(self, key, value):
+        (rows, columns, fields), squeeze = self._indices(key)
+        shape = (rows.size, columns.size, fields.size)
+        value = np.broadcast_to(
+            np.asarray(value, dtype=float),
+            tuple(size for size, single in zip(shape, squeeze) if not single)).reshape(shape)
+
+        for i, field in enumerate(fields):
+            if field < 3 and value[:, :, i].size > 0:
+                self._set_coordinate(field, rows, columns, value[:, :, i])
+
+        count_fields = np.flatnonzero(fields >= 3)
+        if count_fields.size > 0:
+            channels = fields[count_fields] - 3
+            for key, target, source in self._tile_selections(rows, columns):
+                tile = self._writable_tile(key)
+                tile[self._outer(*source, channels)] = value[self._outer(*target, count_fields)]
+        return
+
+    def _indices(self, key):
+        """ Rows, columns and fields selected by an index, and whether each was a single integer.
+        """
+        if not isinstance(key, tuple):
+            key = (key,)
+        if len(key) > 3 or any(index is None or index is Ellipsis for index in key):
+            raise IndexError('A TiledImage is indexed with up to 3 indices (rows, columns, fields).')
+        key = key + (slice(None),) * (3 - len(key))
+        indices = list()
+        squeeze = list()
+        for index, size in zip(key, self.shape):
+            selection = np.arange(size)[index]
+            squeeze.append(np.ndim(selection) == 0)
+            indices.append(np.atleast_1d(selection))
+        return indices, squeeze
+
+    def _tile_selections(self, rows, columns):
+        """ Selections of the tiles covering the given rows and columns.
+
+        @return generator: tuples of the tile key, the rows and columns of the selected pixels in
+                           the selection and the rows and columns of the pixels in the tile
+        """
+        for tile_row, row_target, row_source in self._split(rows):
+            for tile_column, column_target, column_source in self._split(columns):
+                yield ((tile_row, tile_column), (row_target, column_target),
+                       (row_source, column_source))
+
+    @staticmethod
+    def _outer(rows, columns, fields):
+        """ Index of the fields of the given rows and columns, which are slices or index arrays. """
+        if isinstance(rows, slice) and isinstance(columns, slice):
+            return rows, columns, fields
+        return np.ix_(np.r_[rows], np.r_[columns], fields)
+
+    def _split(self, index):
+        """ Split an index of rows or columns into the tiles.
+
+        @return generator: tuples of the tile, the index in the selection and the index in the tile,
+                           the indices are slices if they are contiguous
+        """
+        tiles = index // self.tile_size
+        for tile in np.unique(tiles):
+            target = np.flatnonzero(tiles == tile)
+            source = index[target] - tile * self.tile_size
+            if np.all(np.diff(source) == 1) and np.all(np.diff(target) == 1):
+                yield (tile, slice(target[0], target[-1] + 1),
+                       slice(source[0], source[-1] + 1))
+            else:
+                yield tile, target, source
+
+    def _writable_tile(self, key):
+        """ Tile which can be written, copied first if it is shared with a copy of the image. """
+        tile = self._tiles.get(key)
+        if tile is None:
+            tile = np.zeros((min(self.tile_size, self.rows - key[0] * self.tile_size),
+                             min(self.tile_size, self.columns - key[1] * self.tile_size),
+                             self.channels))
+        elif key not in self._owned_tiles:
+            tile = tile.copy()
+        self._tiles[key] = tile
+        self._owned_tiles.add(key)
+        self._pyramid.pop(key, None)
+        return tile
+
+    def _set_coordinate(self, axis, rows, columns, values):
+        """ Set the positions of one axis, which may only change along its dimension. The positions
+        of a dimension can only be changed for all pixels across the other dimension.
+        """
+        dimension, coordinate = self._coordinates[axis]
+        if dimension == 0:
+            index, values, across = rows, values[:, 0], values
+            whole = np.unique(columns).size == self.columns
+        else:
+            index, values, across = columns, values[0, :], values.T
+            whole = np.unique(rows).size == self.rows
+        if np.any(across != values[:, np.newaxis]) or (
+                not whole and np.any(values != coordinate[index])):
+            raise ValueError('Position {0} of the image only changes from {1} to {1}.'.format(
+                'xyz'[axis], 'row' if dimension == 0 else 'column'))
+        if not self._owns_coordinates:
+            self._coordinates = [(dim, vals.copy()) for dim, vals in self._coordinates]
+            self._owns_coordinates = True
+            coordinate = self._coordinates[axis][1]
+        coordinate[index] = values
+        return
+
+    def _tile_level(self, key, level):
+        """ Tile downsampled by 2**level, averaging over the pixels of the tile. """
+        levels = self._pyramid.setdefault(key, dict())
+        if level not in levels:
+            tile = self._tiles[key]
+            factor = 2 ** level
+            row_starts = np.arange(0, tile.shape[0], factor)
+            column_starts = np.arange(0, tile.shape[1], factor)
+            summed = np.add.reduceat(np.add.reduceat(tile, row_starts, axis=0),
+                                     column_starts, axis=1)
+            # the blocks at the edge of the image can be smaller
+            row_sizes = np.diff(np.append(row_starts, tile.shape[0]))
+            column_sizes = np.diff(np.append(column_starts, tile.shape[1]))
+            levels[level] = summed / np.outer(row_sizes, column_sizes)[:, :, np.newaxis]
+        return levels[level]
@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+
+"""
+This file contains a persistent, size-bounded cache for sampled waveforms.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import hashlib
+import os
+import pickle
+import shutil
+import time
+import numpy as np
+from collections import OrderedDict
+
+from logic.digital_samples import PackedDigitalSamples
+
+# Version of the cache entries. It enters every cache key, so increase it whenever the format of
+# the entries or the sampling code changes the samples created for the same ensemble.
+WAVEFORM_CACHE_VERSION = 1
+
+
+def _canonical_parameters(parameters):
+    """ Sorted, hashable representation of a list of parameter dicts. """
+    return tuple(tuple(sorted(param_dict.items())) for param_dict in parameters)
+
+
+def waveform_cache_key(ensemble, **settings):
+    """ Content hash of a PulseBlockEnsemble definition and the settings used to sample it.
+
+    Only the construction plan of the ensemble (blocks, repetitions, elements and rotating frame)
+    enters the hash, not the names or the attributes stored in the ensemble after sampling.
+
+    @param ensemble: PulseBlockEnsemble object
+    @param settings: keyword arguments with all other settings the samples depend on
+                     (e.g. sample_rate, activation_config, amplitude_dict, waveform_format)
+
+    @return str: hexadecimal SHA1 digest
+    """
+    blocks = list()
+    for block, reps in ensemble.block_list:
+        elements = tuple((element.init_length_s,
+                          element.increment_s,
+                          tuple(element.pulse_function),
+                          tuple(element.digital_high),
+                          _canonical_parameters(element.parameters))
+                         for element in block.element_list)
+        blocks.append((int(reps), elements))
+    description = (WAVEFORM_CACHE_VERSION,
+                   tuple(blocks),
+                   bool(ensemble.rotating_frame),
+                   tuple(sorted(settings.items())))
+    return hashlib.sha1(repr(description).encode('utf-8')).hexdigest()
+
+
+class WaveformCache:
+    """
+    Least-recently-used cache of sampled waveforms stored on disk.
+
+    Every entry belongs to a content hash (see waveform_cache_key) and holds either the hardware
+    files written for an ensemble or the analog and digital sample arrays, together with the
+    analysis results of the ensemble. Cached files are hard-linked into the waveform directory if
+    possible (copied otherwise), so restoring an entry does not duplicate the data on disk.
+
+    The index of the cache is pickled into the cache directory, so the cache survives a restart.
+    If the total size of all entries exceeds <max_bytes>, the least recently used entries are
+    removed.
+    """
+    _index_filename = 'waveform_cache.idx'
+
+    def __init__(self, cache_dir, max_bytes):
+        """
+        @param str cache_dir: directory to store the cached waveforms in
+        @param int max_bytes: maximum total size of all cached waveforms in bytes
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_bytes)
+        self._entries = OrderedDict()
+        self._load_index()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    @property
+    def size_bytes(self):
+        """ Total size of all cached waveforms in bytes. """
+        return sum(entry['size'] for entry in self._entries.values())
+
+    def get_entries(self):
+        """ Summary of all cache entries, from least to most recently used.
+
+        @return list: list of dicts with the keys 'key', 'ensemble', 'type', 'files', 'size' and
+                      'last_used'
+        """
+        return [{'key': key,
+                 'ensemble': entry['ensemble'],
+                 'type': entry['type'],
+                 'files': list(entry['files']),
+                 'size': entry['size'],
+                 'last_used': entry['last_used']}
+                for key, entry in self._entries.items()]
+
+    def lookup(self, key):
+        """ Get a cache entry and mark it as most recently used.
+
+        Entries whose files have been removed from the cache directory are dropped.
+
+        @param str key: content hash of the waveform
+
+        @return dict: the cache entry or None if not cached
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        entry_dir = self._entry_dir(key)
+        if not all(os.path.isfile(os.path.join(entry_dir, file)) for file in entry['files']):
+            self.remove(key)
+            return None
+        entry['last_used'] = time.time()
+        self._entries.move_to_end(key)
+        self._save_index()
+        return entry
+
+    def store_files(self, key, ensemble_name, waveform_dir, filename, created_files, info):
+        """ Add the hardware files written for an ensemble to the cache.
+
+        @param str key: content hash of the waveform
+        @param str ensemble_name: name of the sampled ensemble (for information only)
+        @param str waveform_dir: directory containing the written files
+        @param str filename: name the files were written with (excluding channel suffix)
+        @param list created_files: names of the written files in waveform_dir
+        @param dict info: additional information to store with the entry (e.g. analysis results)
+
+        @return bool: True if the entry was added, False if it is too large for the cache
+        """
+        paths = [os.path.join(waveform_dir, file) for file in created_files]
+        size = sum(os.path.getsize(path) for path in paths)
+        if size > self.max_bytes:
+            return False
+        self.remove(key)
+        entry_dir = self._entry_dir(key)
+        os.makedirs(entry_dir, exist_ok=True)
+        # store the files by their suffix, so they can be restored under a different name
+        suffixes = [file[len(filename):] for file in created_files]
+        for path, suffix in zip(paths, suffixes):
+            self._link_or_copy(path, os.path.join(entry_dir, suffix))
+        entry = self._add_entry(key, ensemble_name, 'files', suffixes, size, info)
+        entry['placed'] = self._file_stats(waveform_dir, filename, suffixes)
+        self._save_index()
+        return True
+
+    def store_arrays(self, key, ensemble_name, analog_samples, digital_samples, info):
+        """ Add sample arrays of an ensemble to the cache.
+
+        @param str key: content hash of the waveform
+        @param str ensemble_name: name of the sampled ensemble (for information only)
+        @param numpy.ndarray analog_samples: sampled analog voltages
+        @param PackedDigitalSamples digital_samples: sampled digital logic levels
+        @param dict info: additional information to store with the entry (e.g. analysis results)
+
+        @return bool: True if the entry was added, False if it is too large for the cache
+        """
+        size = analog_samples.nbytes + digital_samples.nbytes
+        if size > self.max_bytes:
+            return False
+        self.remove(key)
+        entry_dir = self._entry_dir(key)
+        os.makedirs(entry_dir, exist_ok=True)
+        np.save(os.path.join(entry_dir, 'analog.npy'), analog_samples)
+        np.save(os.path.join(entry_dir, 'digital.npy'), digital_samples.words)
+        entry = self._add_entry(key, ensemble_name, 'arrays', ['analog.npy', 'digital.npy'], size,
+                                info)
+        entry['digital_channels'] = digital_samples.number_of_channels
+        self._save_index()
+        return True
+
+    def is_placed(self, entry, waveform_dir, filename):
+        """ Check if the files of an entry are still present unchanged in the waveform directory.
+
+        @param dict entry: cache entry of type 'files'
+        @param str waveform_dir: waveform directory
+        @param str filename: name the files should have (excluding channel suffix)
+
+        @return bool: True if restoring the entry is not necessary
+        """
+        placed = entry.get('placed')
+        if placed is None or placed[0] != filename:
+            return False
+        return placed == self._file_stats(waveform_dir, filename, entry['files'])
+
+    def restore_files(self, key, waveform_dir, filename):
+        """ Put the cached files of an entry into the waveform directory.
+
+        Existing files with the same names are replaced.
+
+        @param str key: content hash of the waveform
+        @param str waveform_dir: waveform directory
+        @param str filename: name of the files (excluding channel suffix)
+
+        @return list: names of the restored files
+        """
+        entry = self._entries[key]
+        entry_dir = self._entry_dir(key)
+        restored_files = list()
+        for suffix in entry['files']:
+            path = os.path.join(waveform_dir, filename + suffix)
+            if os.path.exists(path):
+                os.remove(path)
+            self._link_or_copy(os.path.join(entry_dir, suffix), path)
+            restored_files.append(filename + suffix)
+        entry['placed'] = self._file_stats(waveform_dir, filename, entry['files'])
+        self._save_index()
+        return restored_files
+
+    def load_arrays(self, key):
+        """ Load the sample arrays of a cache entry.
+
+        @param str key: content hash of the waveform
+
+        @return tuple: (analog_samples, digital_samples) with digital_samples being a
+                       PackedDigitalSamples object
+        """
+        entry_dir = self._entry_dir(key)
+        analog_samples = np.load(os.path.join(entry_dir, 'analog.npy'))
+        digital_samples = PackedDigitalSamples(self._entries[key]['digital_channels'],
+                                               np.load(os.path.join(entry_dir, 'digital.npy')))
+        return analog_samples, digital_samples
+
+    def remove(self, key):
+        """ Remove an entry and its files from the cache.
+
+        @param str key: content hash of the waveform
+        """
+        if key in self._entries:
+            del self._entries[key]
+            self._save_index()
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+        return
+
+    def clear(self):
+        """ Remove all entries and files from the cache. """
+        for key in list(self._entries):
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+        self._entries.clear()
+        self._save_index()
+        return
+
+    def _add_entry(self, key, ensemble_name, entry_type, files, size, info):
+        entry = {'ensemble': ensemble_name,
+                 'type': entry_type,
+                 'files': files,
+                 'size': size,
+                 'last_used': time.time(),
+                 'info': info}
+        self._entries[key] = entry
+        # evict least recently used entries
+        while self.size_bytes > self.max_bytes and len(self._entries) > 1:
+            self.remove(next(iter(self._entries)))
+        return entry
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    @staticmethod
+    def _link_or_copy(source, destination):
+        try:
+            os.link(source, destination)
+        except (OSError, AttributeError):
+            shutil.copyfile(source, destination)
+        return
+
+    @staticmethod
+    def _file_stats(waveform_dir, filename, suffixes):
+        """ Identify files by name, size, modification time and inode. """
+        stats = list()
+        for suffix in suffixes:
+            try:
+                stat = os.stat(os.path.join(waveform_dir, filename + suffix))
+            except OSError:
+                return None
+            stats.append((suffix, stat.st_size, stat.st_mtime_ns, stat.st_ino))
+        return [filename, stats]
+
+    def _load_index(self):
+        path = os.path.join(self.cache_dir, self._index_filename)
+        if not os.path.isfile(path):
+            return
+        try:
+            with open(path, 'rb') as infile:
+                self._entries = pickle.load(infile)
+        except Exception:
+            # an unreadable index makes all cached files unreachable
+            self._entries = OrderedDict()
+            for name in os.listdir(self.cache_dir):
+                if os.path.isdir(os.path.join(self.cache_dir, name)):
+                    shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+        return
+
+    def _save_index(self):
+        path = os.path.join(self.cache_dir, self._index_filename)
+        with open(path + '.tmp', 'wb') as outfile:
+            pickle.dump(self._entries, outfile)
+        os.replace(path + '.tmp', path)
+        return
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the ungated pulse extraction (ungated_conv_deriv) against the previous
+implementation, which searched the whole convolved trace for every laser pulse.
+
+Run from the qudi main directory:
+    python tools/pulse_extraction_benchmark.py [number_of_lasers] [laser_period_bins]
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import logging
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from logic.pulse_extraction_methods import basic_extraction_methods
+
+
+class ExtractionStandIn:
+    """ Provides the attributes of PulseExtractionLogic used by the extraction methods. """
+    _convolve_derive = basic_extraction_methods._convolve_derive
+    _block_extremum_indices = basic_extraction_methods._block_extremum_indices
+    _update_block_extremum_indices = basic_extraction_methods._update_block_extremum_indices
+    ungated_conv_deriv = basic_extraction_methods.ungated_conv_deriv
+
+    def __init__(self, number_of_lasers, conv_std_dev):
+        self.log = logging.getLogger(__name__)
+        self.number_of_lasers = number_of_lasers
+        self.extraction_settings = {'conv_std_dev': conv_std_dev}
+
+
+def reference_edges(extraction, count_data):
+    """ Rising and falling edges found by searching the whole trace for each laser pulse. """
+    std_dev = extraction.extraction_settings['conv_std_dev']
+    conv_deriv = extraction._convolve_derive(count_data.astype(float), std_dev)
+    conv_deriv_ref = extraction._convolve_derive(count_data, 10)
+    rising_ind = np.empty([extraction.number_of_lasers], 'int64')
+    falling_ind = np.empty([extraction.number_of_lasers], 'int64')
+    for i in range(extraction.number_of_lasers):
+        for edges, find in ((rising_ind, np.argmax), (falling_ind, np.argmin)):
+            edges[i] = find(conv_deriv)
+            start_ind = max(int(edges[i] - std_dev), 0)
+            stop_ind = min(int(edges[i] + std_dev), len(conv_deriv))
+            if start_ind == stop_ind:
+                stop_ind = start_ind + 1
+            edges[i] = start_ind + find(conv_deriv_ref[start_ind:stop_ind])
+            if edges[i] < 2 * std_dev:
+                del_ind_start = 0
+            else:
+                del_ind_start = edges[i] - int(2 * std_dev)
+            if (conv_deriv.size - edges[i]) < 2 * std_dev:
+                del_ind_stop = conv_deriv.size - 1
+            else:
+                del_ind_stop = edges[i] + int(2 * std_dev)
+                conv_deriv[del_ind_start:del_ind_stop] = 0
+            if edges is falling_ind:
+                conv_deriv[del_ind_start:del_ind_stop] = 0
+    rising_ind.sort()
+    falling_ind.sort()
+    return rising_ind, falling_ind
+
+
+def simulated_timetrace(number_of_lasers, laser_period_bins, laser_length_bins, seed=0):
+    """ Poissonian ungated timetrace with one laser pulse per period. """
+    rng = np.random.RandomState(seed)
+    rate = np.full(number_of_lasers * laser_period_bins, 0.05)
+    for laser in range(number_of_lasers):
+        start = laser * laser_period_bins + laser_period_bins // 4
+        rate[start:start + laser_length_bins] = 2.0
+    return rng.poisson(rate).astype('int64')
+
+
+if __name__ == '__main__':
+    number_of_lasers = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    laser_period_bins = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    count_data = simulated_timetrace(number_of_lasers, laser_period_bins, laser_period_bins // 3)
+    extraction = ExtractionStandIn(number_of_lasers, conv_std_dev=20)
+
+    start = time.perf_counter()
+    rising_ref, falling_ref = reference_edges(extraction, count_data)
+    time_ref = time.perf_counter() - start
+
+    start = time.perf_counter()
+    return_dict = extraction.ungated_conv_deriv(count_data)
+    time_new = time.perf_counter() - start
+
+    # both implementations smooth the trace in the same way
+    start = time.perf_counter()
+    extraction._convolve_derive(count_data.astype(float), 20)
+    extraction._convolve_derive(count_data, 10)
+    time_conv = time.perf_counter() - start
+
+    identical = (np.array_equal(rising_ref, return_dict['laser_indices_rising']) and
+                 np.array_equal(falling_ref, return_dict['laser_indices_falling']))
+    print('{0:d} lasers, {1:d} bins, identical edges: {2}'.format(number_of_lasers,
+                                                                   count_data.size, identical))
+    print('total:       previous {0:.3f} s, ungated_conv_deriv {1:.3f} s'.format(time_ref,
+                                                                                 time_new))
+    print('convolution: {0:.3f} s'.format(time_conv))
+    print('edge search: previous {0:.3f} s, ungated_conv_deriv {1:.3f} s'
+          ''.format(time_ref - time_conv, time_new - time_conv))
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+Checks the vectorized PicoHarp300 TTTR decoder and histogrammer (hardware/picoquant/tttr.py)
+against a record by record decoder on synthetic T2 and T3 record streams and measures the
+decoding rate.
+
+Run from the qudi main directory:
+    python tools/tttr_histogram_benchmark.py [number_of_sync_pulses]
+
+A recorded stream of raw uint32 records (e.g. the FIFO contents written with numpy.tofile) can
+be histogrammed as well:
+    python tools/tttr_histogram_benchmark.py --file records_file mode [resolution_ps]
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from hardware.picoquant import tttr
+
+# size of a FIFO readout of the PicoHarp300
+TTREADMAX = 131072
+
+
+def _with_overflows(true_time, records, wraparound):
+    """ Insert the overflow records into time ordered records. """
+    wraps = true_time // wraparound
+    number_of_wraps = int(wraps[-1]) if true_time.size > 0 else 0
+    overflow_records = np.full(number_of_wraps, tttr.SPECIAL_CHANNEL << 28, dtype=np.uint32)
+    # each overflow record precedes the first record after the wraparound
+    positions = np.searchsorted(wraps, np.arange(1, number_of_wraps + 1))
+    return np.insert(records, positions, overflow_records)
+
+
+def simulated_t3_records(number_of_syncs, number_of_gates=0, resolution_ps=512, rate=0.05,
+                         seed=0):
+    """ T3 records of photons arriving on 4 channels after each sync pulse. In a gated stream
+    marker 1 is set at the first sync of each sequence of number_of_gates sync pulses.
+    """
+    rng = np.random.RandomState(seed)
+    photons_per_sync = rng.poisson(rate, number_of_syncs)
+    nsync = np.repeat(np.arange(number_of_syncs, dtype='int64'), photons_per_sync)
+    dtime = np.minimum(rng.exponential(800, nsync.size) + 100, 4095).astype('int64')
+    channel = rng.randint(1, 5, nsync.size).astype(np.uint32)
+    photon_records = ((channel << np.uint32(28)) | (dtime.astype(np.uint32) << np.uint32(16)) |
+                      (nsync % tttr.T3_WRAPAROUND).astype(np.uint32))
+    if number_of_gates > 0:
+        marker_nsync = np.arange(0, number_of_syncs, number_of_gates, dtype='int64')
+        marker_records = (np.uint32(tttr.SPECIAL_CHANNEL << 28) | np.uint32(1 << 16) |
+                          (marker_nsync % tttr.T3_WRAPAROUND).astype(np.uint32))
+        # markers precede the photons of their sync period
+        positions = np.searchsorted(nsync, marker_nsync)
+        nsync = np.insert(nsync, positions, marker_nsync)
+        photon_records = np.insert(photon_records, positions, marker_records)
+    return _with_overflows(nsync, photon_records, tttr.T3_WRAPAROUND)
+
+
+def simulated_t2_records(number_of_syncs, sync_period_ps=200000, rate=0.05, seed=0):
+    """ T2 records of sync pulses (channel 0) and photons on 4 channels. """
+    rng = np.random.RandomState(seed)
+    period = sync_period_ps // tttr.T2_RESOLUTION_PS
+    sync_time = np.arange(number_of_syncs, dtype='int64') * period
+    photons_per_sync = rng.poisson(rate, number_of_syncs)
+    photon_time = np.repeat(sync_time, photons_per_sync)
+    photon_time += np.minimum(rng.exponential(period / 10, photon_time.size),
+                              period - 1).astype('int64')
+    channel = np.concatenate((np.zeros(number_of_syncs, dtype=np.uint32),
+                              rng.randint(1, 5, photon_time.size).astype(np.uint32)))
+    true_time = np.concatenate((sync_time, photon_time))
+    order = np.argsort(true_time, kind='stable')
+    true_time = true_time[order]
+    records = ((channel[order] << np.uint32(28)) |
+               (true_time % tttr.T2_WRAPAROUND).astype(np.uint32))
+    return _with_overflows(true_time, records, tttr.T2_WRAPAROUND)
+
+
+def reference_histogram(records, mode, bin_width_ps, number_of_bins, number_of_gates=0,
+                        resolution_ps=tttr.T2_RESOLUTION_PS):
+    """ Histogram of the records decoded one by one. """
+    if number_of_gates > 0:
+        counts = np.zeros((number_of_gates, number_of_bins), dtype='int64')
+    else:
+        counts = np.zeros(number_of_bins, dtype='int64')
+    overflow_time = 0
+    last_sync = None
+    last_marker = None
+    for record in records.tolist():
+        channel = record >> 28
+        if mode == tttr.MODE_T3:
+            nsync = record & 0xFFFF
+            dtime = (record >> 16) & 0xFFF
+            if channel == tttr.SPECIAL_CHANNEL:
+                if dtime & 0xF == 0:
+                    overflow_time += tttr.T3_WRAPAROUND
+                else:
+                    last_marker = overflow_time + nsync
+                continue
+            if not 1 <= channel <= 4:
+                continue
+            delay_ps = dtime * resolution_ps
+            gate = None
+            if number_of_gates > 0:
+                if last_marker is None:
+                    continue
+                gate = overflow_time + nsync - last_marker
+                if gate >= number_of_gates:
+                    continue
+        else:
+            time_tag = record & 0x0FFFFFFF
+            if channel == tttr.SPECIAL_CHANNEL:
+                if time_tag & 0xF == 0:
+                    overflow_time += tttr.T2_WRAPAROUND
+                continue
+            if channel == 0:
+                last_sync = overflow_time + time_tag
+                continue
+            if channel > 4 or last_sync is None:
+                continue
+            delay_ps = (overflow_time + time_tag - last_sync) * tttr.T2_RESOLUTION_PS
+            gate = None
+        time_bin = int(delay_ps / bin_width_ps)
+        if time_bin < number_of_bins:
+            if gate is None:
+                counts[time_bin] += 1
+            else:
+                counts[gate, time_bin] += 1
+    return counts
+
+
+def streamed_histogram(histogram, records):
+    """ Feed the records to the histogram in chunks of one FIFO readout. """
+    start = time.perf_counter()
+    for chunk_start in range(0, records.size, TTREADMAX):
+        histogram.add_records(records[chunk_start:chunk_start + TTREADMAX])
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--file':
+        mode = int(sys.argv[3])
+        resolution_ps = float(sys.argv[4]) if len(sys.argv) > 4 else 4
+        records = np.fromfile(sys.argv[2], dtype=np.uint32)
+        histogram = tttr.TTTRHistogram(mode, bin_width_ps=1000, number_of_bins=4096,
+                                       resolution_ps=resolution_ps)
+        duration = streamed_histogram(histogram, records)
+        print('{0:d} records in {1:.3f} s ({2:.1f} Mrecords/s), {3:d} photons histogrammed, '
+              '{4:d} invalid records'.format(records.size, duration, records.size / duration / 1e6,
+                                             int(histogram.counts.sum()),
+                                             histogram.decoder.invalid_records))
+        sys.exit()
+
+    number_of_syncs = int(sys.argv[1]) if len(sys.argv) > 1 else 20000000
+    streams = (
+        ('T3 ungated', simulated_t3_records(number_of_syncs),
+         dict(mode=tttr.MODE_T3, bin_width_ps=1000, number_of_bins=2000, resolution_ps=512)),
+        ('T3 gated', simulated_t3_records(number_of_syncs, number_of_gates=100),
+         dict(mode=tttr.MODE_T3, bin_width_ps=2000, number_of_bins=1000, number_of_gates=100,
+              resolution_ps=512)),
+        ('T2 ungated', simulated_t2_records(number_of_syncs // 4),
+         dict(mode=tttr.MODE_T2, bin_width_ps=1000, number_of_bins=200)),
+    )
+    for name, records, settings in streams:
+        histogram = tttr.TTTRHistogram(**settings)
+        duration = streamed_histogram(histogram, records)
+        # the record by record reference is slow, compare on the first part of the stream
+        part = records[:1000000]
+        histogram_part = tttr.TTTRHistogram(**settings)
+        streamed_histogram(histogram_part, part)
+        reference = reference_histogram(part, **settings)
+        print('{0}: {1:d} records in {2:.3f} s ({3:.1f} Mrecords/s), identical to record by '
+              'record decoding: {4}'.format(name, records.size, duration,
+                                            records.size / duration / 1e6,
+                                            np.array_equal(reference, histogram_part.counts)))